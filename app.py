@@ -7,9 +7,15 @@ import plotly.graph_objects as go
 import time
 import os
 import json
-import copy
+import uuid
 import firebase_admin
 from firebase_admin import credentials, firestore
+from thermal_engine import compute_key_results, run_main_pipeline, ThermalModel, ResultCache, H_STATUS, H_STATUS_MAX_ITER
+from monte_carlo import run_monte_carlo
+from rru_3d import LOD_FIN_THRESHOLD, build_rru_figure, fin_offsets, lod_fin_indices
+from component_library import FirestoreBackend, LibraryCache, empty_library
+from local_store import DEFAULT_DB_PATH as LOCAL_DB_PATH, LibraryMirror, SqliteBackend
+from perf_trace import DEFAULT_LOG_PATH, RerunProfiler, get_timing_logger
 
 # ==============================================================================
 # 版本：v4.29 (Tab4 3D Full Upgrade)
@@ -285,32 +291,95 @@ if 'firebase_initialized' not in st.session_state:
         st.session_state['firebase_initialized'] = True
         st.session_state['db'] = firestore.client()
     except Exception as e:
-        st.warning(f"⚠️ Firebase 初始化失敗（將使用本地空資料庫）: {e}")
+        st.warning(f"⚠️ Firebase 初始化失敗（將使用本機離線資料庫）: {e}")
         st.session_state['firebase_initialized'] = False
         st.session_state['db'] = None
 
 # 載入元件資料庫（從 Firestore 讀取）
-if 'component_library' not in st.session_state:
-    if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
-        try:
-            db = st.session_state['db']
-
-            # 讀取三個 Collection
-            rf_docs = db.collection('rf_library').stream()
-            digital_docs = db.collection('digital_library').stream()
-            pwr_docs = db.collection('pwr_library').stream()
-
-            st.session_state['component_library'] = {
-                "rf_library": [doc.to_dict() for doc in rf_docs],
-                "digital_library": [doc.to_dict() for doc in digital_docs],
-                "pwr_library": [doc.to_dict() for doc in pwr_docs]
-            }
-        except Exception as e:
-            st.warning(f"Firestore 讀取失敗，使用空資料庫: {e}")
-            st.session_state['component_library'] = {"rf_library": [], "digital_library": [], "pwr_library": []}
+# [Perf] 行程共用快取：所有 session 共用一份，TTL 到期後只增量讀取變更的文件；
+# 每次 rerun 取最新的不可變快照，因此也看得到其他使用者新增 / 修改的元件
+@st.cache_resource
+def get_library_cache(_db):
+    """所有 session 共用的元件庫快取（LibraryCache，以 updated_at 增量同步 Firestore，寫入批次 write-behind）"""
+    return LibraryCache(FirestoreBackend(_db))
+
+# 本 session 的寫入識別：版本衝突（其他使用者已先修改）只回報給發起的 session
+if 'library_owner' not in st.session_state:
+    st.session_state['library_owner'] = uuid.uuid4().hex[:8]
+
+# 本機離線資料庫（SQLite）：Firebase 無法使用時的元件庫 + 本機專案儲存；
+# 介面同 FirestoreBackend，離線時快選 / 索引 / 存入 / 刪除的行為與線上相同，寫入記入同步日誌待日後推送
+@st.cache_resource
+def get_local_store():
+    """本機 SQLite 資料庫（環境變數 RRU_LOCAL_DB 可改路徑）"""
+    return SqliteBackend(os.environ.get("RRU_LOCAL_DB", LOCAL_DB_PATH))
+
+@st.cache_resource
+def get_offline_library_cache():
+    """離線元件庫快取（本機寫入無網路延遲，不需 write-behind）"""
+    return LibraryCache(get_local_store(), write_delay=None)
+
+@st.cache_resource
+def get_library_mirror(_db):
+    """線上時於背景定期把 Firestore 元件庫拉取至本機資料庫，斷線時離線元件庫即為最新"""
+    return LibraryMirror(get_local_store(), FirestoreBackend(_db))
+
+def active_library_cache():
+    """目前使用的元件庫快取：Firestore 可用時為線上快取，否則為本機離線快取"""
+    return get_library_cache(st.session_state['db']) if library_online else get_offline_library_cache()
+
+# 樂觀版本檢查：記錄本 session 看到的元件版本（➕ 新增時載入的版本、刪除 / 覆蓋確認時快照中的版本），
+# 寫入時作為 expected；其他使用者在此之後修改過的元件不會被覆蓋
+if 'library_seen' not in st.session_state:
+    st.session_state['library_seen'] = {}
+
+def library_seen_version(collection, name, index):
+    """本 session 看到的元件版本：載入時記錄的版本，否則為目前快照中的版本"""
+    return st.session_state['library_seen'].get((collection, name), index.version(name))
+
+def library_write(collection, name, record=None, expected=None):
+    """
+    存入（record 給定）或刪除元件，帶 expected 版本；版本衝突時丟出 RuntimeError（由呼叫端顯示）
+    成功時記錄寫入後的版本，同一 session 之後再覆蓋不會誤判為衝突
+    """
+    cache = active_library_cache()
+    owner = st.session_state['library_owner']
+    if record is None:
+        version = cache.delete(collection, name, owner=owner, expected=expected)
     else:
-        # Fallback：Firebase 失敗時使用空資料庫
-        st.session_state['component_library'] = {"rf_library": [], "digital_library": [], "pwr_library": []}
+        version = cache.put(collection, name, record, owner=owner, expected=expected)
+    if version is None:
+        cache.pop_conflicts(owner)
+        raise RuntimeError(f"'{name}' 已被其他使用者修改或刪除，未寫入；請重新載入資料庫版本後再操作")
+    st.session_state['library_seen'][(collection, name)] = version
+
+library_online = bool(st.session_state.get('firebase_initialized') and st.session_state.get('db')
+                      and not st.session_state.get('library_load_failed'))
+library_cache_ready = False
+if library_online:
+    try:
+        st.session_state['component_library'] = get_library_cache(st.session_state['db']).snapshot()
+        library_cache_ready = True
+        if not st.session_state.get('local_library_failed'):
+            try:
+                get_library_mirror(st.session_state['db']).maybe_sync()   # 背景執行，不阻塞 rerun
+            except Exception:
+                pass  # 本機資料庫無法使用時不影響線上模式
+    except Exception as e:
+        st.warning(f"Firestore 讀取失敗，改用本機離線資料庫: {e}")
+        st.session_state['library_load_failed'] = True   # 本 session 不再重試
+        library_online = False
+if not library_online and not st.session_state.get('local_library_failed'):
+    try:
+        st.session_state['component_library'] = get_offline_library_cache().snapshot()
+        library_cache_ready = True
+    except Exception as e:
+        st.warning(f"本機離線資料庫無法開啟，使用空資料庫: {e}")
+        st.session_state['local_library_failed'] = True
+if not library_cache_ready:
+    # Fallback：Firebase 與本機資料庫皆無法使用時使用空資料庫
+    st.session_state['component_library'] = empty_library()
+library_write_note = "背景批次寫入 Firestore" if library_online else "離線：已存入本機資料庫，連線後可同步至 Firestore"
 
 if 'last_loaded_file' not in st.session_state:
     st.session_state['last_loaded_file'] = None
@@ -330,6 +399,17 @@ for _flag in ['rf_confirm_overwrite', 'rf_confirm_delete',
 def reset_download_state():
     pass  # 保留供各 widget on_change 使用
 
+# [Perf] Rerun 分段計時：每個 session 一個 RerunProfiler，計時日誌由所有 session 共用
+@st.cache_resource
+def get_perf_logger():
+    """rerun 計時輪替日誌（環境變數 RRU_PERF_LOG 可改路徑，空字串停用）"""
+    return get_timing_logger(os.environ.get("RRU_PERF_LOG", DEFAULT_LOG_PATH))
+
+def get_perf():
+    if "_perf" not in st.session_state:
+        st.session_state["_perf"] = RerunProfiler(logger=get_perf_logger())
+    return st.session_state["_perf"]
+
 def get_current_state_json():
     saved_params = {k: st.session_state[k] for k in DEFAULT_GLOBALS if k in st.session_state}
     export_data = {
@@ -341,6 +421,21 @@ def get_current_state_json():
     }
     return json.dumps(export_data, indent=4)
 
+def apply_project_data(data, project_name):
+    """將專案內容（「儲存專案」的 JSON 結構）套用至 session_state（檔案上傳與本機專案共用）"""
+    if 'global_params' in data:
+        for k, v in data['global_params'].items():
+            st.session_state[k] = v
+    if 'rf_data' in data:
+        st.session_state['df_rf'] = pd.DataFrame(data['rf_data'])
+    if 'digital_data' in data:
+        st.session_state['df_digital'] = pd.DataFrame(data['digital_data'])
+    if 'pwr_data' in data:
+        st.session_state['df_pwr'] = pd.DataFrame(data['pwr_data'])
+    st.session_state['editor_key'] += 1
+    st.session_state['current_project_name'] = project_name
+    st.session_state['project_meta'] = data.get('meta', None)
+
 def _sync_editor_state(editor_prefix, df_key, row_defaults):
     """Callback for data_editor: apply edits directly to session_state to avoid feedback loop."""
     ek = st.session_state['editor_key']
@@ -373,13 +468,16 @@ def _sync_editor_state(editor_prefix, df_key, row_defaults):
     reset_download_state()
 
 def _on_rf_edit():
-    _sync_editor_state("editor_rf", "df_rf", RF_ROW_DEFAULT)
+    with get_perf().stage("_sync_editor_state (RF)"):
+        _sync_editor_state("editor_rf", "df_rf", RF_ROW_DEFAULT)
 
 def _on_digital_edit():
-    _sync_editor_state("editor_digital", "df_digital", DIGITAL_ROW_DEFAULT)
+    with get_perf().stage("_sync_editor_state (Digital)"):
+        _sync_editor_state("editor_digital", "df_digital", DIGITAL_ROW_DEFAULT)
 
 def _on_pwr_edit():
-    _sync_editor_state("editor_pwr", "df_pwr", PWR_ROW_DEFAULT)
+    with get_perf().stage("_sync_editor_state (PWR)"):
+        _sync_editor_state("editor_pwr", "df_pwr", PWR_ROW_DEFAULT)
 
 # ==================================================
 # 🔐 密碼保護
@@ -482,6 +580,9 @@ if "welcome_shown" not in st.session_state:
     st.toast(f'🎉 登入成功！歡迎回到熱流運算引擎 ({APP_VERSION})', icon="✅")
     st.session_state["welcome_shown"] = True
 
+# [Perf] rerun 計時開始（callback 的計時已在此之前記錄，併入本次 rerun）
+get_perf().begin(profile=st.session_state.get("perf_debug", False) and st.session_state.get("perf_cprofile", False))
+
 # ==================================================
 # 👇 主程式開始 - Header 區塊
 # ==================================================
@@ -648,22 +749,9 @@ with col_header_R:
         if uploaded_proj is not None:
             if uploaded_proj != st.session_state['last_loaded_file']:
                 try:
-                    data = json.load(uploaded_proj)
-                    if 'global_params' in data:
-                        for k, v in data['global_params'].items():
-                            st.session_state[k] = v
-                    if 'rf_data' in data:
-                        st.session_state['df_rf'] = pd.DataFrame(data['rf_data'])
-                    if 'digital_data' in data:
-                        st.session_state['df_digital'] = pd.DataFrame(data['digital_data'])
-                    if 'pwr_data' in data:
-                        st.session_state['df_pwr'] = pd.DataFrame(data['pwr_data'])
-                    st.session_state['editor_key'] += 1
-                    
+                    apply_project_data(json.load(uploaded_proj), uploaded_proj.name)
                     st.session_state['last_loaded_file'] = uploaded_proj
-                    st.session_state['current_project_name'] = uploaded_proj.name
-                    st.session_state['project_meta'] = data.get('meta', None)
-                    
+
                     st.toast("✅ 專案載入成功！", icon="📂")
                     time.sleep(0.5)
                     st.rerun()
@@ -681,6 +769,7 @@ st.markdown("<hr style='margin-top: 5px; margin-bottom: 20px;'>", unsafe_allow_h
 # ==================================================
 # 1. 側邊欄 (參數設定)
 # ==================================================
+get_perf().checkpoint("Header / 專案載入")
 st.sidebar.header("🛠️ 參數控制台")
 
 # --- 參數設定區 (綁定 on_change=reset_download_state + 讀取 value) ---
@@ -779,6 +868,13 @@ with st.sidebar.expander("3. 材料參數 (含 Via K值)", expanded=False):
     t_Solder = c10.number_input("t (錫片)", key="t_Solder", value=st.session_state['t_Solder'], on_change=reset_download_state)
     Voiding = st.number_input("錫片空洞率 (Voiding)", key="Voiding", value=st.session_state['Voiding'], on_change=reset_download_state)
 
+with st.sidebar.expander("🐞 效能除錯", expanded=False):
+    st.toggle("顯示 rerun 分段計時", key="perf_debug")
+    st.checkbox("cProfile 逐段分析（較慢）", key="perf_cprofile",
+                disabled=not st.session_state.get("perf_debug", False))
+
+get_perf().checkpoint("側邊欄參數")
+
 # ==================================================
 # 3. 分頁與邏輯
 # ==================================================
@@ -810,23 +906,85 @@ with tab_input:
         "Limit(C)": st.column_config.NumberColumn("限溫 (°C)", help="元件允許最高運作溫度", format="%.2f")
     }
 
+    if library_cache_ready:
+        _lib_cache = active_library_cache()
+        # [Perf] 存入 / 覆蓋 / 刪除為 write-behind：先更新本地快照，數秒內合併為一次批次交易寫入 Firestore
+        for _conflict in _lib_cache.pop_conflicts(st.session_state['library_owner']):
+            st.error(
+                f"⚠️ '{_conflict['name']}'（{_conflict['collection']}）已被其他使用者"
+                f"{'刪除' if _conflict['deleted'] else '修改'}，您的{'刪除' if _conflict['action'] == 'delete' else '存入 / 覆蓋'}"
+                f"未寫入；已改為顯示資料庫目前版本，請確認後再操作。"
+            )
+        _lib_stats = _lib_cache.stats()
+        lib_cap_col, lib_flush_col = st.columns([4, 1])
+        with lib_cap_col:
+            st.caption(
+                f"📚 元件資料庫快取：快照 v{_lib_stats['snapshot_version']} · {_lib_stats['age_s'] or 0:.0f}s 前同步 · "
+                f"{'Firestore' if library_online else '本機 SQLite（離線）'} 讀取 {_lib_stats['doc_reads']} 筆 / "
+                f"{_lib_stats['queries']} 次查詢 · "
+                f"平均同步 {_lib_stats['mean_sync_ms'] or 0:.0f} ms · 寫入 {_lib_stats['writes']} 筆 / "
+                f"{_lib_stats['commits']} 次批次 · 待寫入 {_lib_stats['pending_writes']} 筆（所有使用者共用）"
+            )
+        with lib_flush_col:
+            if _lib_stats['pending_writes'] and st.button("⏫ 立即寫入", key="lib_flush", use_container_width=True):
+                _lib_cache.flush()
+                st.rerun()
+
+    # 本機離線資料庫：離線時的修改記於同步日誌；連線時可推送（版本檢查）並拉取 Firestore 最新資料供下次離線使用
+    if not st.session_state.get('local_library_failed'):
+        try:
+            _local_store = get_local_store()
+            _local_pending = _local_store.pending()
+        except Exception:
+            _local_store = None
+        if _local_store is not None and library_online:
+            sync_cap_col, sync_btn_col = st.columns([4, 1])
+            with sync_cap_col:
+                _mirror = get_library_mirror(st.session_state['db'])
+                st.caption(f"🗄️ 本機離線資料庫（自動鏡像 Firestore）：{sum(_local_store.counts().values())} 筆元件 · "
+                           f"待推送 {_local_pending} 筆離線修改"
+                           + (f" · 鏡像失敗：{_mirror.last_error}" if _mirror.last_error else ""))
+            with sync_btn_col:
+                if st.button("🔄 同步本機", key="local_lib_sync", use_container_width=True):
+                    try:
+                        with st.spinner("同步本機離線資料庫..."):
+                            # 手動同步為全量重讀：補上遠端硬刪除、以較舊時間戳記寫入等增量同步看不到的變更
+                            _sync_result = _local_store.reconcile(FirestoreBackend(st.session_state['db']), full=True)
+                            get_offline_library_cache().sync(full=True)
+                            get_library_cache(st.session_state['db']).sync()   # 線上快取立即看到推送的修改
+                        st.toast(f"✅ 推送 {_sync_result['pushed']} 筆、拉取 {_sync_result['pulled']} 筆、"
+                                 f"移除 {_sync_result['removed']} 筆", icon="🗄️")
+                        for _conflict in _sync_result['conflicts']:
+                            st.warning(f"⚠️ 離線修改 '{_conflict['name']}'（{_conflict['collection']}）"
+                                       f"已被其他使用者先行修改，未推送；本機已改為 Firestore 目前版本。")
+                    except Exception as e:
+                        st.error(f"同步失敗: {e}")
+        elif _local_store is not None and _local_pending:
+            st.caption(f"🗄️ 離線模式：{_local_pending} 筆修改記於本機同步日誌，連線後於此按「🔄 同步本機」推送至 Firestore")
+
     sub_rf, sub_digital, sub_pwr = st.tabs(["📡 RF Component", "💻 Digital Component", "⚡ PWR Component"])
 
     with sub_rf:
         # === 快選區 ===
         rf_lib = st.session_state['component_library']['rf_library']
+        # [Perf] 索引建立於共用快照上（名稱 dict / 前綴搜尋 / 快選字串），跨 rerun 重用
+        rf_index = st.session_state['component_library'].index('rf_library')
         if rf_lib:
-            rf_options = ["（請選擇）"] + [f"{item['Component']} ({item['Power(W)']}W)" for item in rf_lib]
             col_select, col_btn = st.columns([3, 1])
             with col_select:
+                rf_query = st.text_input("🔎 名稱搜尋", key="rf_lib_query", placeholder="輸入名稱開頭篩選快選清單",
+                                          label_visibility="collapsed")
+                rf_options = ["（請選擇）"] + (rf_index.prefix_options(rf_query) if rf_query else list(rf_index.options))
                 selected_rf = st.selectbox("📚 從 RF 資料庫快選", rf_options, key="rf_selector")
             with col_btn:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if selected_rf != "（請選擇）" and st.button("➕ 新增", key="add_rf", use_container_width=True):
-                    comp_name = selected_rf.split(" (")[0]
-                    matched = [item for item in rf_lib if item['Component'] == comp_name]
+                    comp_name = rf_index.option_names.get(selected_rf, selected_rf.split(" (")[0])
+                    # [Perf] 快選清單只含 Component / Power(W)，完整元件資料於選取時才讀取
+                    matched, matched_version = active_library_cache().record('rf_library', comp_name, with_version=True)
                     if matched:
-                        new_row = pd.DataFrame([matched[0]])
+                        st.session_state['library_seen'][('rf_library', comp_name)] = matched_version
+                        new_row = pd.DataFrame([matched])
                         st.session_state['df_rf'] = pd.concat([st.session_state['df_rf'], new_row], ignore_index=True)
                         st.rerun()
         else:
@@ -872,23 +1030,20 @@ with tab_input:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("💾 存入", key="save_rf", use_container_width=True):
                     matched_row = df_rf_edited[df_rf_edited['Component'] == row_to_save].iloc[0].to_dict()
-                    existing = [item for item in rf_lib if item['Component'] == row_to_save]
-                    if existing:
+                    if row_to_save in rf_index:
                         st.session_state['rf_confirm_overwrite'] = row_to_save
+                        st.session_state['library_seen'].setdefault(('rf_library', row_to_save), rf_index.version(row_to_save))
                     else:
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = row_to_save.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('rf_library').document(doc_id).set(matched_row)
-                                st.session_state['component_library']['rf_library'].append(matched_row)
-                                st.success(f"✅ '{row_to_save}' 已存入 RF 資料庫！")
+                                library_write('rf_library', row_to_save, matched_row, expected=None)
+                                st.success(f"✅ '{row_to_save}' 已存入 RF 資料庫（{library_write_note}）！")
                                 time.sleep(1)
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"存入失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法存入資料庫")
+                            st.error("⚠️ 元件資料庫無法使用，無法存入資料庫")
 
             if st.session_state.get('rf_confirm_overwrite'):
                 comp_ow = st.session_state['rf_confirm_overwrite']
@@ -896,16 +1051,10 @@ with tab_input:
                 ow_col1, ow_col2 = st.columns(2)
                 with ow_col1:
                     if st.button("✅ 確認覆蓋", key="rf_ow_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
                                 matched_row = df_rf_edited[df_rf_edited['Component'] == comp_ow].iloc[0].to_dict()
-                                doc_id = comp_ow.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('rf_library').document(doc_id).set(matched_row)
-                                lib = st.session_state['component_library']['rf_library']
-                                st.session_state['component_library']['rf_library'] = [
-                                    matched_row if item['Component'] == comp_ow else item for item in lib
-                                ]
+                                library_write('rf_library', comp_ow, matched_row, expected=library_seen_version('rf_library', comp_ow, rf_index))
                                 st.session_state['rf_confirm_overwrite'] = None
                                 st.success(f"✅ '{comp_ow}' 已覆蓋更新！")
                                 time.sleep(1)
@@ -913,7 +1062,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"覆蓋失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法覆蓋")
+                            st.error("⚠️ 元件資料庫無法使用，無法覆蓋")
                 with ow_col2:
                     if st.button("❌ 取消", key="rf_ow_cancel", use_container_width=True):
                         st.session_state['rf_confirm_overwrite'] = None
@@ -924,12 +1073,13 @@ with tab_input:
             st.markdown("---")
             del_col1, del_col2 = st.columns([3, 1])
             with del_col1:
-                rf_del_options = [item['Component'] for item in rf_lib]
+                rf_del_options = rf_index.names
                 row_to_delete = st.selectbox("選擇要從資料庫刪除的元件", rf_del_options, key="del_rf_selector")
             with del_col2:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("🗑️ 刪除", key="del_rf", use_container_width=True):
                     st.session_state['rf_confirm_delete'] = row_to_delete
+                    st.session_state['library_seen'][('rf_library', row_to_delete)] = rf_index.version(row_to_delete)
 
             if st.session_state.get('rf_confirm_delete'):
                 comp_del = st.session_state['rf_confirm_delete']
@@ -937,14 +1087,9 @@ with tab_input:
                 dc1, dc2 = st.columns(2)
                 with dc1:
                     if st.button("✅ 確認刪除", key="rf_del_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = comp_del.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('rf_library').document(doc_id).delete()
-                                st.session_state['component_library']['rf_library'] = [
-                                    item for item in rf_lib if item['Component'] != comp_del
-                                ]
+                                library_write('rf_library', comp_del, expected=library_seen_version('rf_library', comp_del, rf_index))
                                 st.session_state['rf_confirm_delete'] = None
                                 st.success(f"🗑️ '{comp_del}' 已從 RF 資料庫刪除！")
                                 time.sleep(1)
@@ -952,7 +1097,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"刪除失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法刪除")
+                            st.error("⚠️ 元件資料庫無法使用，無法刪除")
                 with dc2:
                     if st.button("❌ 取消", key="rf_del_cancel", use_container_width=True):
                         st.session_state['rf_confirm_delete'] = None
@@ -961,18 +1106,24 @@ with tab_input:
     with sub_digital:
         # === 快選區 ===
         digital_lib = st.session_state['component_library']['digital_library']
+        # [Perf] 索引建立於共用快照上（名稱 dict / 前綴搜尋 / 快選字串），跨 rerun 重用
+        digital_index = st.session_state['component_library'].index('digital_library')
         if digital_lib:
-            digital_options = ["（請選擇）"] + [f"{item['Component']} ({item['Power(W)']}W)" for item in digital_lib]
             col_select, col_btn = st.columns([3, 1])
             with col_select:
+                digital_query = st.text_input("🔎 名稱搜尋", key="digital_lib_query", placeholder="輸入名稱開頭篩選快選清單",
+                                          label_visibility="collapsed")
+                digital_options = ["（請選擇）"] + (digital_index.prefix_options(digital_query) if digital_query else list(digital_index.options))
                 selected_digital = st.selectbox("📚 從 Digital 資料庫快選", digital_options, key="digital_selector")
             with col_btn:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if selected_digital != "（請選擇）" and st.button("➕ 新增", key="add_digital", use_container_width=True):
-                    comp_name = selected_digital.split(" (")[0]
-                    matched = [item for item in digital_lib if item['Component'] == comp_name]
+                    comp_name = digital_index.option_names.get(selected_digital, selected_digital.split(" (")[0])
+                    # [Perf] 快選清單只含 Component / Power(W)，完整元件資料於選取時才讀取
+                    matched, matched_version = active_library_cache().record('digital_library', comp_name, with_version=True)
                     if matched:
-                        new_row = pd.DataFrame([matched[0]])
+                        st.session_state['library_seen'][('digital_library', comp_name)] = matched_version
+                        new_row = pd.DataFrame([matched])
                         st.session_state['df_digital'] = pd.concat([st.session_state['df_digital'], new_row], ignore_index=True)
                         st.rerun()
         else:
@@ -1017,23 +1168,20 @@ with tab_input:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("💾 存入", key="save_digital", use_container_width=True):
                     matched_row = df_digital_edited[df_digital_edited['Component'] == row_to_save].iloc[0].to_dict()
-                    existing = [item for item in digital_lib if item['Component'] == row_to_save]
-                    if existing:
+                    if row_to_save in digital_index:
                         st.session_state['digital_confirm_overwrite'] = row_to_save
+                        st.session_state['library_seen'].setdefault(('digital_library', row_to_save), digital_index.version(row_to_save))
                     else:
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = row_to_save.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('digital_library').document(doc_id).set(matched_row)
-                                st.session_state['component_library']['digital_library'].append(matched_row)
-                                st.success(f"✅ '{row_to_save}' 已存入 Digital 資料庫！")
+                                library_write('digital_library', row_to_save, matched_row, expected=None)
+                                st.success(f"✅ '{row_to_save}' 已存入 Digital 資料庫（{library_write_note}）！")
                                 time.sleep(1)
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"存入失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法存入資料庫")
+                            st.error("⚠️ 元件資料庫無法使用，無法存入資料庫")
 
             if st.session_state.get('digital_confirm_overwrite'):
                 comp_ow = st.session_state['digital_confirm_overwrite']
@@ -1041,16 +1189,10 @@ with tab_input:
                 ow_col1, ow_col2 = st.columns(2)
                 with ow_col1:
                     if st.button("✅ 確認覆蓋", key="digital_ow_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
                                 matched_row = df_digital_edited[df_digital_edited['Component'] == comp_ow].iloc[0].to_dict()
-                                doc_id = comp_ow.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('digital_library').document(doc_id).set(matched_row)
-                                lib = st.session_state['component_library']['digital_library']
-                                st.session_state['component_library']['digital_library'] = [
-                                    matched_row if item['Component'] == comp_ow else item for item in lib
-                                ]
+                                library_write('digital_library', comp_ow, matched_row, expected=library_seen_version('digital_library', comp_ow, digital_index))
                                 st.session_state['digital_confirm_overwrite'] = None
                                 st.success(f"✅ '{comp_ow}' 已覆蓋更新！")
                                 time.sleep(1)
@@ -1058,7 +1200,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"覆蓋失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法覆蓋")
+                            st.error("⚠️ 元件資料庫無法使用，無法覆蓋")
                 with ow_col2:
                     if st.button("❌ 取消", key="digital_ow_cancel", use_container_width=True):
                         st.session_state['digital_confirm_overwrite'] = None
@@ -1069,12 +1211,13 @@ with tab_input:
             st.markdown("---")
             del_col1, del_col2 = st.columns([3, 1])
             with del_col1:
-                digital_del_options = [item['Component'] for item in digital_lib]
+                digital_del_options = digital_index.names
                 row_to_delete = st.selectbox("選擇要從資料庫刪除的元件", digital_del_options, key="del_digital_selector")
             with del_col2:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("🗑️ 刪除", key="del_digital", use_container_width=True):
                     st.session_state['digital_confirm_delete'] = row_to_delete
+                    st.session_state['library_seen'][('digital_library', row_to_delete)] = digital_index.version(row_to_delete)
 
             if st.session_state.get('digital_confirm_delete'):
                 comp_del = st.session_state['digital_confirm_delete']
@@ -1082,14 +1225,9 @@ with tab_input:
                 dc1, dc2 = st.columns(2)
                 with dc1:
                     if st.button("✅ 確認刪除", key="digital_del_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = comp_del.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('digital_library').document(doc_id).delete()
-                                st.session_state['component_library']['digital_library'] = [
-                                    item for item in digital_lib if item['Component'] != comp_del
-                                ]
+                                library_write('digital_library', comp_del, expected=library_seen_version('digital_library', comp_del, digital_index))
                                 st.session_state['digital_confirm_delete'] = None
                                 st.success(f"🗑️ '{comp_del}' 已從 Digital 資料庫刪除！")
                                 time.sleep(1)
@@ -1097,7 +1235,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"刪除失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法刪除")
+                            st.error("⚠️ 元件資料庫無法使用，無法刪除")
                 with dc2:
                     if st.button("❌ 取消", key="digital_del_cancel", use_container_width=True):
                         st.session_state['digital_confirm_delete'] = None
@@ -1106,18 +1244,24 @@ with tab_input:
     with sub_pwr:
         # === 快選區 ===
         pwr_lib = st.session_state['component_library']['pwr_library']
+        # [Perf] 索引建立於共用快照上（名稱 dict / 前綴搜尋 / 快選字串），跨 rerun 重用
+        pwr_index = st.session_state['component_library'].index('pwr_library')
         if pwr_lib:
-            pwr_options = ["（請選擇）"] + [f"{item['Component']} ({item['Power(W)']}W)" for item in pwr_lib]
             col_select, col_btn = st.columns([3, 1])
             with col_select:
+                pwr_query = st.text_input("🔎 名稱搜尋", key="pwr_lib_query", placeholder="輸入名稱開頭篩選快選清單",
+                                          label_visibility="collapsed")
+                pwr_options = ["（請選擇）"] + (pwr_index.prefix_options(pwr_query) if pwr_query else list(pwr_index.options))
                 selected_pwr = st.selectbox("📚 從 PWR 資料庫快選", pwr_options, key="pwr_selector")
             with col_btn:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if selected_pwr != "（請選擇）" and st.button("➕ 新增", key="add_pwr", use_container_width=True):
-                    comp_name = selected_pwr.split(" (")[0]
-                    matched = [item for item in pwr_lib if item['Component'] == comp_name]
+                    comp_name = pwr_index.option_names.get(selected_pwr, selected_pwr.split(" (")[0])
+                    # [Perf] 快選清單只含 Component / Power(W)，完整元件資料於選取時才讀取
+                    matched, matched_version = active_library_cache().record('pwr_library', comp_name, with_version=True)
                     if matched:
-                        new_row = pd.DataFrame([matched[0]])
+                        st.session_state['library_seen'][('pwr_library', comp_name)] = matched_version
+                        new_row = pd.DataFrame([matched])
                         st.session_state['df_pwr'] = pd.concat([st.session_state['df_pwr'], new_row], ignore_index=True)
                         st.rerun()
         else:
@@ -1162,23 +1306,20 @@ with tab_input:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("💾 存入", key="save_pwr", use_container_width=True):
                     matched_row = df_pwr_edited[df_pwr_edited['Component'] == row_to_save].iloc[0].to_dict()
-                    existing = [item for item in pwr_lib if item['Component'] == row_to_save]
-                    if existing:
+                    if row_to_save in pwr_index:
                         st.session_state['pwr_confirm_overwrite'] = row_to_save
+                        st.session_state['library_seen'].setdefault(('pwr_library', row_to_save), pwr_index.version(row_to_save))
                     else:
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = row_to_save.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('pwr_library').document(doc_id).set(matched_row)
-                                st.session_state['component_library']['pwr_library'].append(matched_row)
-                                st.success(f"✅ '{row_to_save}' 已存入 PWR 資料庫！")
+                                library_write('pwr_library', row_to_save, matched_row, expected=None)
+                                st.success(f"✅ '{row_to_save}' 已存入 PWR 資料庫（{library_write_note}）！")
                                 time.sleep(1)
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"存入失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法存入資料庫")
+                            st.error("⚠️ 元件資料庫無法使用，無法存入資料庫")
 
             if st.session_state.get('pwr_confirm_overwrite'):
                 comp_ow = st.session_state['pwr_confirm_overwrite']
@@ -1186,16 +1327,10 @@ with tab_input:
                 ow_col1, ow_col2 = st.columns(2)
                 with ow_col1:
                     if st.button("✅ 確認覆蓋", key="pwr_ow_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
                                 matched_row = df_pwr_edited[df_pwr_edited['Component'] == comp_ow].iloc[0].to_dict()
-                                doc_id = comp_ow.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('pwr_library').document(doc_id).set(matched_row)
-                                lib = st.session_state['component_library']['pwr_library']
-                                st.session_state['component_library']['pwr_library'] = [
-                                    matched_row if item['Component'] == comp_ow else item for item in lib
-                                ]
+                                library_write('pwr_library', comp_ow, matched_row, expected=library_seen_version('pwr_library', comp_ow, pwr_index))
                                 st.session_state['pwr_confirm_overwrite'] = None
                                 st.success(f"✅ '{comp_ow}' 已覆蓋更新！")
                                 time.sleep(1)
@@ -1203,7 +1338,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"覆蓋失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法覆蓋")
+                            st.error("⚠️ 元件資料庫無法使用，無法覆蓋")
                 with ow_col2:
                     if st.button("❌ 取消", key="pwr_ow_cancel", use_container_width=True):
                         st.session_state['pwr_confirm_overwrite'] = None
@@ -1214,12 +1349,13 @@ with tab_input:
             st.markdown("---")
             del_col1, del_col2 = st.columns([3, 1])
             with del_col1:
-                pwr_del_options = [item['Component'] for item in pwr_lib]
+                pwr_del_options = pwr_index.names
                 row_to_delete = st.selectbox("選擇要從資料庫刪除的元件", pwr_del_options, key="del_pwr_selector")
             with del_col2:
                 st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
                 if st.button("🗑️ 刪除", key="del_pwr", use_container_width=True):
                     st.session_state['pwr_confirm_delete'] = row_to_delete
+                    st.session_state['library_seen'][('pwr_library', row_to_delete)] = pwr_index.version(row_to_delete)
 
             if st.session_state.get('pwr_confirm_delete'):
                 comp_del = st.session_state['pwr_confirm_delete']
@@ -1227,14 +1363,9 @@ with tab_input:
                 dc1, dc2 = st.columns(2)
                 with dc1:
                     if st.button("✅ 確認刪除", key="pwr_del_confirm", use_container_width=True):
-                        if st.session_state.get('firebase_initialized') and st.session_state.get('db'):
+                        if library_cache_ready:
                             try:
-                                db = st.session_state['db']
-                                doc_id = comp_del.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
-                                db.collection('pwr_library').document(doc_id).delete()
-                                st.session_state['component_library']['pwr_library'] = [
-                                    item for item in pwr_lib if item['Component'] != comp_del
-                                ]
+                                library_write('pwr_library', comp_del, expected=library_seen_version('pwr_library', comp_del, pwr_index))
                                 st.session_state['pwr_confirm_delete'] = None
                                 st.success(f"🗑️ '{comp_del}' 已從 PWR 資料庫刪除！")
                                 time.sleep(1)
@@ -1242,7 +1373,7 @@ with tab_input:
                             except Exception as e:
                                 st.error(f"刪除失敗: {e}")
                         else:
-                            st.error("⚠️ Firebase 未連線，無法刪除")
+                            st.error("⚠️ 元件資料庫無法使用，無法刪除")
                 with dc2:
                     if st.button("❌ 取消", key="pwr_del_cancel", use_container_width=True):
                         st.session_state['pwr_confirm_delete'] = None
@@ -1260,219 +1391,30 @@ with tab_input:
     st.markdown("---")
     st.info(f"⚡ **整機總功耗（未含 Margin）：{total_input_power:.1f} W** | RF：{rf_power:.1f}W　Digital：{digital_power:.1f}W　Power：{pwr_power:.1f}W")
 
+get_perf().checkpoint("Tab1 元件編輯器")
+
 # ==================================================
 # # 核心計算函數 (Refactored for Maintainability)
 # ==================================================
-def calc_h_value(Gap):
-    """計算 h_conv, h_rad, h_value"""
-    h_conv = 6.4 * np.tanh(Gap / 7.0)
-    if Gap >= 10.0:
-        rad_factor = 1.0
-    else:
-        rad_factor = np.sqrt(Gap / 10.0)
-    h_rad = 2.4 * rad_factor
-    h_value = h_conv + h_rad
-    return h_value, h_conv, h_rad
-
-def calc_fin_count(W_hsk, Gap, Fin_t):
-    """植樹原理計算最大鰭片數"""
-    if Gap + Fin_t > 0:
-        num_fins_float = (W_hsk + Gap) / (Gap + Fin_t)
-        num_fins_int = int(num_fins_float)
-        if num_fins_int > 0:
-            total_width = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
-            # 【關鍵修復】加入 0.001 mm 容差，避免因浮點精度誤差導致 total_width 在邊界（如 273.999999 vs 274.000001）誤判而減片
-            while total_width > W_hsk + 0.001 and num_fins_int > 0:
-                num_fins_int -= 1
-                total_width = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
-    else:
-        num_fins_int = 0
-    return num_fins_int
-
-def calc_thermal_resistance(row, g):
-    """單行元件熱阻計算 (取代原本 apply_excel_formulas)"""
-    # 從 g (globals_dict) 取出需要的全域變數
-    if row['Component'] == "Final PA":
-        base_l, base_w = g['Coin_L_Setting'], g['Coin_W_Setting']
-    elif row['Power(W)'] == 0 or row['Thick(mm)'] == 0:
-        base_l, base_w = 0.0, 0.0
-    else:
-        base_l, base_w = row['Pad_L'] + row['Thick(mm)'], row['Pad_W'] + row['Thick(mm)']
-        
-    loc_amb = g['T_amb'] + (row['Height(mm)'] * g['Slope'])
-    
-    if row['Board_Type'] == "Copper Coin":
-        k_board = 380.0
-    elif row['Board_Type'] == "Thermal Via":
-        k_board = g['K_Via']
-    else:
-        k_board = 0.0
+# calc_h_value / calc_fin_count / calc_thermal_resistance / compute_key_results、重量模型、DRC 規則
+# 與主熱流程 run_main_pipeline 位於 thermal_engine（不依賴 Streamlit，可供批次腳本與 worker 行程直接 import）
 
-    pad_area = (row['Pad_L'] * row['Pad_W']) / 1e6
-    base_area = (base_l * base_w) / 1e6
-    
-    if k_board > 0 and pad_area > 0:
-        eff_area = np.sqrt(pad_area * base_area) if base_area > 0 else pad_area
-        r_int_val = (row['Thick(mm)']/1000) / (k_board * eff_area)
-        if row['Component'] == "Final PA":
-            r_int = r_int_val + ((g['t_Solder']/1000) / (g['K_Solder'] * pad_area * g['Voiding']))
-        elif row['Board_Type'] == "Thermal Via":
-            r_int = r_int_val / g['Via_Eff']
-        else:
-            r_int = r_int_val
-    else:
-        r_int = 0
-        
-    tim = g['tim_props'].get(row['TIM_Type'], {"k":1, "t":0})
-    target_area = base_area if base_area > 0 else pad_area
-    if target_area > 0 and tim['t'] > 0:
-        r_tim = (tim['t']/1000) / (tim['k'] * target_area)
-    else:
-        r_tim = 0
-        
-    total_w = row['Qty'] * row['Power(W)']
-    drop = row['Power(W)'] * (row['R_jc'] + r_int + r_tim)
-    allowed_dt = row['Limit(C)'] - drop - loc_amb
-    return pd.Series([base_l, base_w, loc_amb, r_int, r_tim, total_w, drop, allowed_dt])
+@st.cache_resource
+def get_result_cache():
+    """跨 rerun / session 共用的結果快取（LRU，內容雜湊 key）"""
+    return ResultCache(max_size=20000, version=APP_VERSION)
 
-# [v4.11 Core] 新增 compute_key_results 函數，供敏感度分析使用
-def compute_key_results(global_params, df_components, Area_fixed_m2=None):
+# [Perf] 結果快取：Tab 5 逐點掃描（sa_cache.evaluate）與基準點 compute_key_results 記憶化共用；引擎版本變更時清空
+get_result_cache().set_version(APP_VERSION)
+compute_key_results_cached = get_result_cache().memoize(compute_key_results)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def run_main_pipeline_cached(edited_df, main_params):
     """
-    獨立計算核心結果，不依賴 Streamlit session_state
-    返回 dict 包含關鍵 KPI
+    主熱流程（thermal_engine.run_main_pipeline）
+    [Perf] st.cache_data 以實際輸入為 key；切換分頁、展開 expander 等未改變熱輸入的 rerun 直接取回結果
     """
-    # 複製參數，避免修改原始
-    p = global_params.copy()
-    df = df_components.copy()
-    
-    # 準備 globals_dict 給 calc_thermal_resistance 使用
-    g_for_calc = p.copy()
-    g_for_calc['tim_props'] = {
-        "Solder": {"k": p["K_Solder"], "t": p["t_Solder"]},
-        "Grease": {"k": p["K_Grease"], "t": p["t_Grease"]},
-        "Pad": {"k": p["K_Pad"], "t": p["t_Pad"]},
-        "Pad2": {"k": p["K_Pad2"], "t": p["t_Pad2"]},
-        "Putty": {"k": p["K_Putty"], "t": p["t_Putty"]},
-        "None": {"k": 1, "t": 0}
-    }
-    
-    # === 熱阻與溫降計算 ===
-    if not df.empty:
-        calc_results = df.apply(lambda row: calc_thermal_resistance(row, g_for_calc), axis=1)
-        calc_results.columns = ['Base_L', 'Base_W', 'Loc_Amb', 'R_int', 'R_TIM', 'Total_W', 'Drop', 'Allowed_dT']
-        df = pd.concat([df, calc_results], axis=1)
-        
-        df["Allowed_dT"] = df["Allowed_dT"].clip(lower=0)
-        Total_Power = (df["Power(W)"] * df["Qty"]).sum() * p["Margin"]
-        
-        # [Fix v4.19] 邏輯對齊：計算瓶頸時，僅考慮總功耗 > 0 的元件 (排除不發熱元件)
-        valid_rows = df[df['Total_W'] > 0]
-        if not valid_rows.empty:
-            Min_dT_Allowed = valid_rows["Allowed_dT"].min()
-            if not pd.isna(valid_rows["Allowed_dT"].idxmin()):
-                Bottleneck_Name = valid_rows.loc[valid_rows["Allowed_dT"].idxmin(), "Component"]
-            else:
-                Bottleneck_Name = "None"
-        else:
-            Min_dT_Allowed = 50 # 預設安全值
-            Bottleneck_Name = "None"
-            
-    else:
-        Total_Power = 0
-        Min_dT_Allowed = 50
-        Bottleneck_Name = "None"
-
-    # === h 值 ===
-    h_value, h_conv, h_rad = calc_h_value(p["Gap"])
-        
-    # === 鰭片高度與尺寸 ===
-    L_hsk = p["L_pcb"] + p["Left"] + p["Right"]
-    W_hsk = p["W_pcb"] + p["Top"] + p["Btm"]
-    base_area_m2 = (L_hsk * W_hsk) / 1e6
-    
-    num_fins_int = calc_fin_count(W_hsk, p["Gap"], p["Fin_t"])
-    
-    # === 所需面積 ===
-    eff = 0.95 if "Embedded" in p["fin_tech_selector_v2"] else 0.90
-    
-    if Total_Power > 0 and Min_dT_Allowed > 0:
-        Area_req = 1 / (h_value * (Min_dT_Allowed / Total_Power) * eff)
-        try:
-             Fin_Height = ((Area_req - base_area_m2) * 1e6) / (2 * num_fins_int * L_hsk)
-        except:
-             Fin_Height = 0
-    else:
-        Area_req = 0
-        Fin_Height = 0
-        
-    # === 體積與重量 (Detailed Logic) ===
-    RRU_Height = p["H_shield"] + p["H_filter"] + p["t_base"] + Fin_Height
-    # 【關鍵修復】先計算未 round 的原始體積，再 round 至小數點後 2 位，與 Tab 3 計算邏輯完全一致（避免 round 順序導致微差）
-    volume_raw = L_hsk * W_hsk * RRU_Height / 1e6
-    Volume_L = round(volume_raw, 2)
-    
-    # 重量計算
-    base_vol_cm3 = L_hsk * W_hsk * p["t_base"] / 1000
-    fins_vol_cm3 = num_fins_int * p["Fin_t"] * Fin_Height * L_hsk / 1000
-    hs_weight_kg = (base_vol_cm3 + fins_vol_cm3) * p["al_density"] / 1000
-    
-    shield_outer_vol_cm3 = L_hsk * W_hsk * p["H_shield"] / 1000
-    shield_inner_vol_cm3 = p["L_pcb"] * p["W_pcb"] * p["H_shield"] / 1000
-    shield_vol_cm3 = max(shield_outer_vol_cm3 - shield_inner_vol_cm3, 0)
-    shield_weight_kg = shield_vol_cm3 * p["al_density"] / 1000
-    
-    filter_vol_cm3 = L_hsk * W_hsk * p["H_filter"] / 1000
-    filter_weight_kg = filter_vol_cm3 * p["filter_density"] / 1000
-    
-    shielding_height_cm = 1.2
-    shielding_area_cm2 = p["L_pcb"] * p["W_pcb"] / 100
-    shielding_vol_cm3 = shielding_area_cm2 * shielding_height_cm
-    shielding_weight_kg = shielding_vol_cm3 * p["shielding_density"] / 1000
-    
-    pcb_area_cm2 = p["L_pcb"] * p["W_pcb"] / 100
-    pcb_weight_kg = pcb_area_cm2 * p["pcb_surface_density"] / 1000
-    
-    cavity_weight_kg = filter_weight_kg + shield_weight_kg + shielding_weight_kg + pcb_weight_kg
-    total_weight_kg = hs_weight_kg + cavity_weight_kg
-
-    # === Bottleneck Tj_Margin 計算 (供敏感度分析使用) ===
-    # 若提供 Area_fixed_m2 (Fixed-Design)：以固定散熱面積反算 T_hsk，
-    # 這樣改變 T_amb / Power / Gap 時 Tj_Margin 才能正確反映差異。
-    # 若未提供 (一般計算)：散熱器重新 sizing，Tj_Margin = D × (1 - 1/Margin)。
-    Bottleneck_Tj_Margin = 0.0
-    if not df.empty and Bottleneck_Name != "None" and 'R_int' in df.columns:
-        _slope = p.get('Slope', 0.03)
-        if Area_fixed_m2 is not None and Area_fixed_m2 > 0:
-            _T_hsk_base = p['T_amb'] + Total_Power / (h_value * Area_fixed_m2 * eff)
-        else:
-            _T_hsk_base = p['T_amb'] + Min_dT_Allowed / p['Margin']
-        df['_T_hsk_eff'] = _T_hsk_base + df['Height(mm)'] * _slope
-        df['_Tc'] = df['_T_hsk_eff'] + df['Power(W)'] * (df['R_int'] + df['R_TIM'])
-        df['_Tj'] = df['_Tc'] + df['Power(W)'] * df['R_jc']
-        _tc_lim = df['Component'].str.contains('DDR', case=False, na=False)
-        if '_src' in df.columns:
-            _tc_lim = _tc_lim | (df['_src'] == 'PWR')
-        df['_T_ref'] = df['_Tj']
-        df.loc[_tc_lim, '_T_ref'] = df.loc[_tc_lim, '_Tc']
-        df['_Tj_Margin'] = df['Limit(C)'] - df['_T_ref']
-        _valid_tj = df[df['Total_W'] > 0]
-        if not _valid_tj.empty:
-            _bt_idx = _valid_tj['Allowed_dT'].idxmin()
-            if not pd.isna(_bt_idx):
-                Bottleneck_Tj_Margin = round(_valid_tj.loc[_bt_idx, '_Tj_Margin'], 1)
-
-    return {
-        "Total_Power": Total_Power,
-        "Min_dT_Allowed": Min_dT_Allowed,
-        "Bottleneck_Name": Bottleneck_Name,
-        "Area_req": Area_req,
-        "Fin_Height": Fin_Height,
-        "Volume_L": volume_raw,
-        "total_weight_kg": total_weight_kg,
-        "h_value": h_value,
-        "Bottleneck_Tj_Margin": Bottleneck_Tj_Margin,
-        "Fin_Count": num_fins_int,
-    }
+    return run_main_pipeline(edited_df, main_params)
 
 # --- 後台運算 (Refactored) ---
 globals_dict = {
@@ -1491,112 +1433,44 @@ tim_props = {
 }
 globals_dict['tim_props'] = tim_props
 
-# 元件熱阻計算
-if not edited_df.empty:
-    calc_results = edited_df.apply(lambda row: calc_thermal_resistance(row, globals_dict), axis=1)
-    calc_results.columns = ['Base_L', 'Base_W', 'Loc_Amb', 'R_int', 'R_TIM', 'Total_W', 'Drop', 'Allowed_dT']
-    final_df = pd.concat([edited_df, calc_results], axis=1)
-else:
-    final_df = pd.DataFrame()
-
-# 總功耗與瓶頸
-valid_rows = final_df[final_df['Total_W'] > 0].copy()
-if not valid_rows.empty:
-    Total_Watts_Sum = valid_rows['Total_W'].sum()
-    Min_dT_Allowed = valid_rows['Allowed_dT'].min()
-    Bottleneck_Name = valid_rows.loc[valid_rows['Allowed_dT'].idxmin()]['Component'] if not pd.isna(valid_rows['Allowed_dT'].idxmin()) else "None"
-else:
-    Total_Watts_Sum = 0; Min_dT_Allowed = 50; Bottleneck_Name = "None"
-
-Bottleneck_Tj_Margin = 0  # 預設值，稍後在 Tj_Margin 計算完成後更新
-
-# [New] 反向推算 Tc / Tj
-# T_hsk_base = 散熱器基部溫度（h=0），由瓶頸裕度反推
-# T_hsk_eff  = 各元件高度處的散熱器有效溫度（含高度梯度修正）
-# [Fix v4.31] 散熱器實際設計容量 = nominal_power × Margin，
-# 故實際運作時基部溫升為 Min_dT_Allowed / Margin，Margin > 1 時元件自然有正裕度
-T_hsk_base = T_amb + Min_dT_Allowed / Margin
-if not final_df.empty:
-    final_df['T_hsk_eff'] = T_hsk_base + final_df['Height(mm)'] * Slope
-    final_df['Tc'] = final_df['T_hsk_eff'] + final_df['Power(W)'] * (final_df['R_int'] + final_df['R_TIM'])
-    final_df['Tj'] = final_df['Tc'] + final_df['Power(W)'] * final_df['R_jc']
-
-    # Tc 限溫元件：PWR 類 + 名稱含 DDR 的 Digital 類（限溫規格指 Tc，非 Tj）
-    tc_limited = (final_df.get('_src', '') == 'PWR') | \
-                 (final_df['Component'].str.contains('DDR', case=False, na=False))
-    final_df['T_ref'] = final_df['Tj']
-    final_df.loc[tc_limited, 'T_ref'] = final_df.loc[tc_limited, 'Tc']
-    final_df['Temp_Label'] = 'Tj'
-    final_df.loc[tc_limited, 'Temp_Label'] = 'Tc'
-    final_df['Tj_Margin'] = final_df['Limit(C)'] - final_df['T_ref']
-
-    # [Update] 更新 valid_rows 以包含 Tj/Tc/Tj_Margin 欄位（供 Tab 3 圖表使用）
-    valid_rows = final_df[final_df['Total_W'] > 0].copy()
-    if not valid_rows.empty and 'Tj_Margin' in valid_rows.columns and Bottleneck_Name != "None":
-        bt_idx = valid_rows.loc[valid_rows['Allowed_dT'].idxmin()].name
-        Bottleneck_Tj_Margin = round(valid_rows.loc[bt_idx, 'Tj_Margin'], 1)
-
-L_hsk, W_hsk = L_pcb + Top + Btm, W_pcb + Left + Right
-
-# 核心計算呼叫
-h_value, h_conv, h_rad = calc_h_value(Gap)
-num_fins_int = calc_fin_count(W_hsk, Gap, Fin_t)
-Fin_Count = num_fins_int
-
-Total_Power = Total_Watts_Sum * Margin
-if Total_Power > 0 and Min_dT_Allowed > 0:
-    R_sa = Min_dT_Allowed / Total_Power
-    Area_req = 1 / (h_value * R_sa * Eff)
-    Base_Area_m2 = (L_hsk * W_hsk) / 1e6
-    try:
-        Fin_Height = ((Area_req - Base_Area_m2) * 1e6) / (2 * Fin_Count * L_hsk)
-    except:
-        Fin_Height = 0
-    RRU_Height = t_base + Fin_Height + H_shield + H_filter
-    Volume_L = (L_hsk * W_hsk * RRU_Height) / 1e6
-    
-    # [v3.84] 重量計算
-    base_vol_cm3 = L_hsk * W_hsk * t_base / 1000
-    fins_vol_cm3 = num_fins_int * Fin_t * Fin_Height * L_hsk / 1000
-    hs_weight_kg = (base_vol_cm3 + fins_vol_cm3) * al_density / 1000
-    
-    shield_outer_vol_cm3 = L_hsk * W_hsk * H_shield / 1000
-    shield_inner_vol_cm3 = L_pcb * W_pcb * H_shield / 1000
-    shield_vol_cm3 = max(shield_outer_vol_cm3 - shield_inner_vol_cm3, 0)
-    shield_weight_kg = shield_vol_cm3 * al_density / 1000
-    
-    filter_vol_cm3 = L_hsk * W_hsk * H_filter / 1000
-    filter_weight_kg = filter_vol_cm3 * filter_density / 1000
-    
-    shielding_height_cm = 1.2
-    shielding_area_cm2 = L_pcb * W_pcb / 100
-    shielding_vol_cm3 = shielding_area_cm2 * shielding_height_cm
-    shielding_weight_kg = shielding_vol_cm3 * shielding_density / 1000
-    
-    pcb_area_cm2 = L_pcb * W_pcb / 100
-    pcb_weight_kg = pcb_area_cm2 * pcb_surface_density / 1000
-    
-    cavity_weight_kg = filter_weight_kg + shield_weight_kg + shielding_weight_kg + pcb_weight_kg
-    total_weight_kg = hs_weight_kg + cavity_weight_kg
-
-else:
-    R_sa = 0; Area_req = 0; Fin_Height = 0; RRU_Height = 0; Volume_L = 0
-    # [Fix NameError] 必須初始化重量變數
-    total_weight_kg = 0; hs_weight_kg = 0; shield_weight_kg = 0
-    filter_weight_kg = 0; shielding_weight_kg = 0; pcb_weight_kg = 0
-
-# ==================================================
-# [DRC] 設計規則檢查
-# ==================================================
-drc_failed = False
-drc_msg = ""
-drc_warn_msg = ""
-
-# 計算流阻比 (Aspect Ratio)
-if Gap > 0 and Fin_Height > 0:
-    aspect_ratio = Fin_Height / Gap
-else:
-    aspect_ratio = 0
+# [Perf] 主熱流程（跨 rerun 快取）
+_main = run_main_pipeline_cached(edited_df, dict(
+    globals_dict, Margin=Margin, L_pcb=L_pcb, W_pcb=W_pcb, Top=Top, Btm=Btm, Left=Left, Right=Right,
+    Gap=Gap, Fin_t=Fin_t, fin_tech_selector_v2=fin_tech, t_base=t_base, H_shield=H_shield, H_filter=H_filter,
+    al_density=al_density, filter_density=filter_density, shielding_density=shielding_density,
+    pcb_surface_density=pcb_surface_density,
+))
+final_df = _main['final_df']
+valid_rows = _main['valid_rows']
+Total_Watts_Sum = _main['Total_Watts_Sum']
+Min_dT_Allowed = _main['Min_dT_Allowed']
+Bottleneck_Name = _main['Bottleneck_Name']
+Bottleneck_Tj_Margin = _main['Bottleneck_Tj_Margin']
+T_hsk_base = _main['T_hsk_base']
+L_hsk = _main['L_hsk']
+W_hsk = _main['W_hsk']
+h_value = _main['h_value']
+h_conv = _main['h_conv']
+h_rad = _main['h_rad']
+num_fins_int = _main['num_fins_int']
+Fin_Count = _main['Fin_Count']
+Total_Power = _main['Total_Power']
+R_sa = _main['R_sa']
+Area_req = _main['Area_req']
+Fin_Height = _main['Fin_Height']
+RRU_Height = _main['RRU_Height']
+Volume_L = _main['Volume_L']
+total_weight_kg = _main['total_weight_kg']
+hs_weight_kg = _main['hs_weight_kg']
+shield_weight_kg = _main['shield_weight_kg']
+filter_weight_kg = _main['filter_weight_kg']
+shielding_weight_kg = _main['shielding_weight_kg']
+pcb_weight_kg = _main['pcb_weight_kg']
+aspect_ratio = _main['aspect_ratio']
+drc_failed = _main['drc_failed']
+drc_msg = _main['drc_msg']
+drc_warn_msg = _main['drc_warn_msg']
+get_perf().checkpoint("主熱流程")
 
 # [UI] 更新側邊欄的 Aspect Ratio 資訊 (回填)
 # 修正建議值為 4.5 ~ 6.5
@@ -1623,33 +1497,7 @@ if Fin_Height > 0:
 else:
     ar_status_box.info("等待計算 Aspect Ratio...")
 
-if aspect_ratio > 12.0:
-    drc_failed = True
-    drc_msg = f"⛔ **設計無效 (Choked Flow)：** 流阻比 (高/寬) 達 {aspect_ratio:.1f} (上限 12)。\n鰭片太深且太密，空氣滯留無法流動，請降低高度或增大間距。"
-elif h_conv < 4.0:
-    drc_failed = True
-    drc_msg = f"⛔ **設計無效 (Step 3 - Poor Convection)：** 有效對流係數 h_conv 僅 {h_conv:.2f} (目標 >= 4.0)。\nGap 過小導致風阻過大，散熱效率極低。請增大 Air Gap。"
-elif Gap < 4.0:
-    drc_failed = True
-    drc_msg = f"⛔ **設計無效 (Gap Too Small)：** 鰭片間距 {Gap}mm 小於物理極限 (4mm)。\n邊界層完全重疊，自然對流失效。"
-elif "Embedded" in fin_tech and Fin_Height > 100.0:
-    drc_failed = True
-    drc_msg = f"⛔ **製程限制 (Process Limit)：** Embedded Fin (埋入式鰭片) 製程高度限制需 < 100mm (目前計算值: {Fin_Height:.1f}mm)。\n此高度已超過製程極限，建議增加設備的X/Y方向面積來讓Z方向面積增加。"
-elif "Die-casting" in fin_tech:
-    _fin_ratio = Fin_Height / Fin_t if Fin_t > 0 else float('inf')
-    if Fin_t < 3.0:
-        drc_failed = True
-        drc_msg = (f"⛔ **製程限制 (Fin_t Too Thin)：** 壓鑄鰭片平均厚度 {Fin_t}mm < 最小值 3.0mm。\n"
-                   f"壓鑄錐形鰭片平均厚度需 ≥ 3.0mm（參考：Huawei RRU 量測值，頭部 1.5mm / 根部 4.5mm，均值 3.0mm）。")
-    elif _fin_ratio > 30.0:
-        drc_failed = True
-        drc_msg = (f"⛔ **製程限制 (Fin Height/Thickness Ratio)：** 壓鑄鰭片高厚比 {_fin_ratio:.1f} > 30 (上限)。\n"
-                   f"(Fin_Height={Fin_Height:.1f}mm ÷ Fin_t={Fin_t}mm)\n"
-                   f"金屬液無法在凝固前完整充填鰭片腔體，將導致缺料或成型不良。請增加 Fin_t 或降低 Fin_Height。\n"
-                   f"參考案例：Huawei RRU H=80mm / Fin_t=3.0mm → 高厚比 26.7 ✓")
-    elif _fin_ratio > 25.0:
-        drc_warn_msg = (f"⚠️ **壓鑄製程警告 (Near Limit)：** 鰭片高厚比 {_fin_ratio:.1f}（介於 25～30，接近製程上限）。\n"
-                        f"(Fin_Height={Fin_Height:.1f}mm ÷ Fin_t={Fin_t}mm)　建議與壓鑄廠確認充填可行性。")
+get_perf().checkpoint("側邊欄 Aspect Ratio")
 
 # --- Tab 2: 詳細數據 (表二) ---
 with tab_data:
@@ -1793,6 +1641,8 @@ with tab_data:
         * 🟥 **紅色 (數值低)**：代表散熱裕度極低，該元件是系統的熱瓶頸。
         """)
 
+get_perf().checkpoint("Tab2 詳細分析 (Styler)")
+
 # --- Tab 3: 視覺化報告 ---
 with tab_viz:
     st.subheader("📊 VISUAL REPORT (視覺化報告)")
@@ -1940,96 +1790,31 @@ with tab_viz:
         </div>
         """, unsafe_allow_html=True)
 
+get_perf().checkpoint("Tab3 視覺化圖表")
+
 # --- Tab 4: 3D 模擬視圖 ---
 with tab_3d:
     st.subheader("🧊 3D SIMULATION (3D 模擬視圖)")
     st.caption("模型展示：底部電子艙 + 頂部散熱鰭片，鰭片數量與間距皆為真實比例。鰭片含底部→頂部熱梯度配色。")
 
     if not drc_failed and L_hsk > 0 and W_hsk > 0 and RRU_Height > 0 and Fin_Height > 0:
-
-        LIGHTING_METAL = dict(ambient=0.5, diffuse=0.8, specular=0.5, roughness=0.1)
-        LIGHTING_MATTE = dict(ambient=0.6, diffuse=0.8, specular=0.1, roughness=0.8)
-        IJK = dict(
-            i=[7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2],
-            j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
-            k=[0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6]
-        )
-
-        h_body       = H_shield + H_filter
-        z_base_start = h_body
-        z_base_end   = h_body + t_base
-        z_fin_start  = z_base_end
-        z_fin_end    = z_base_end + Fin_Height
-
-        fig_3d = go.Figure()
-
-        # 1. 機殼 (實心深藍灰)
-        fig_3d.add_trace(go.Mesh3d(
-            x=[0, L_hsk, L_hsk, 0, 0, L_hsk, L_hsk, 0],
-            y=[0, 0, W_hsk, W_hsk, 0, 0, W_hsk, W_hsk],
-            z=[0, 0, 0, 0, h_body, h_body, h_body, h_body],
-            **IJK,
-            color='#5D6D7E', opacity=1.0,
-            lighting=LIGHTING_MATTE, flatshading=True,
-            name='Electronics Body', showscale=False
-        ))
-
-        # 2. 散熱器基座 (銀灰)
-        fig_3d.add_trace(go.Mesh3d(
-            x=[0, L_hsk, L_hsk, 0, 0, L_hsk, L_hsk, 0],
-            y=[0, 0, W_hsk, W_hsk, 0, 0, W_hsk, W_hsk],
-            z=[z_base_start]*4 + [z_base_end]*4,
-            **IJK,
-            color='#BDC3C7', opacity=1.0,
-            lighting=LIGHTING_METAL, flatshading=True,
-            name='Heatsink Base', showscale=False
-        ))
-
-        # 3. 散熱鰭片 (底部暖色→頂部冷色熱梯度)
-        if num_fins_int > 0:
-            total_fin_w = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
-            y_off = (W_hsk - total_fin_w) / 2
-            fi = [7,0,0,0,4,4,6,6,4,0,3,2]
-            fj = [3,4,1,2,5,6,5,2,0,1,6,3]
-            fk = [0,7,2,3,6,7,1,1,5,5,7,6]
-            for idx in range(num_fins_int):
-                fy0 = y_off + idx * (Fin_t + Gap)
-                fy1 = fy0 + Fin_t
-                if fy1 > W_hsk:
-                    break
-                fig_3d.add_trace(go.Mesh3d(
-                    x=[0, L_hsk, L_hsk, 0, 0, L_hsk, L_hsk, 0],
-                    y=[fy0, fy0, fy1, fy1, fy0, fy0, fy1, fy1],
-                    z=[z_fin_start]*4 + [z_fin_end]*4,
-                    i=fi, j=fj, k=fk,
-                    intensity=[0,0,0,0,1,1,1,1], cmin=0, cmax=1,
-                    colorscale=[[0,'#E67E22'],[0.45,'#BDC3C7'],[1,'#D6EAF8']],
-                    showscale=False,
-                    lighting=LIGHTING_METAL, flatshading=True,
-                    name='Fins' if idx == 0 else '',
-                    showlegend=(idx == 0)
-                ))
-
-        # 4. 外框線
-        xl = [0,L_hsk,L_hsk,0,0,None,0,L_hsk,L_hsk,0,0,None,0,0,None,L_hsk,L_hsk,None,L_hsk,L_hsk,None,0,0]
-        yl = [0,0,W_hsk,W_hsk,0,None,0,0,W_hsk,W_hsk,0,None,0,0,None,0,0,None,W_hsk,W_hsk,None,W_hsk,W_hsk]
-        zl = [0,0,0,0,0,None,RRU_Height,RRU_Height,RRU_Height,RRU_Height,RRU_Height,None,0,RRU_Height,None,0,RRU_Height,None,0,RRU_Height,None,0,RRU_Height]
-        fig_3d.add_trace(go.Scatter3d(x=xl, y=yl, z=zl, mode='lines',
-                                      line=dict(color='#2C3E50', width=2), showlegend=False))
-
-        max_dim = max(L_hsk, W_hsk, RRU_Height) * 1.1
-        fig_3d.update_layout(
-            scene=dict(
-                xaxis=dict(title='Length', range=[0, max_dim], dtick=50),
-                yaxis=dict(title='Width',  range=[0, max_dim], dtick=50),
-                zaxis=dict(title='Height', range=[0, max_dim], dtick=50),
-                aspectmode='manual', aspectratio=dict(x=1, y=1, z=1),
-                camera=dict(projection=dict(type="orthographic"), eye=dict(x=1.2, y=1.2, z=1.2)),
-                bgcolor='white'
-            ),
-            margin=dict(l=0, r=0, b=0, t=0), height=600
-        )
+        # [Perf] LOD：鰭片數超過門檻時中段以代表片繪製，頂點數固定上限（外形尺寸與高度配色不變）
+        c_lod1, c_lod2 = st.columns([1, 2])
+        lod_on = c_lod1.toggle("⚡ LOD 簡化顯示", value=True, key="lod_3d",
+                               help="鰭片很密時，兩側鰭片完整顯示、中段以等距代表片取代，降低瀏覽器負擔")
+        lod_threshold = c_lod2.number_input("LOD 啟用門檻（鰭片數）", min_value=10, max_value=1000,
+                                            value=LOD_FIN_THRESHOLD, step=10, key="lod_3d_threshold",
+                                            disabled=not lod_on)
+        lod_fin_threshold = int(lod_threshold) if lod_on else None
+        with get_perf().stage("3D Mesh3d 建圖"):
+            fig_3d = build_rru_figure(L_hsk, W_hsk, RRU_Height, H_shield, H_filter, t_base,
+                                      Fin_Height, Fin_t, Gap, num_fins_int, lod_fin_threshold=lod_fin_threshold)
         st.plotly_chart(fig_3d, use_container_width=True)
+        n_fins_fit = len(fin_offsets(W_hsk, Gap, Fin_t, num_fins_int))
+        n_fins_shown = len(lod_fin_indices(n_fins_fit, lod_fin_threshold))
+        if n_fins_shown < n_fins_fit:
+            st.caption(f"⚡ LOD：顯示 {n_fins_shown} / {n_fins_fit} 片鰭片（兩側完整、中段等距代表片）；"
+                       f"外形尺寸與鰭片高度配色為實際值。")
         c1, c2 = st.columns(2)
         c1.info(f"📐 **外觀尺寸：** 長 {L_hsk:.1f} x 寬 {W_hsk:.1f} x 高 {RRU_Height:.1f} mm")
         c2.success(f"⚡ **鰭片規格：** 數量 {num_fins_int} pcs | 高度 {Fin_Height:.1f} mm | 厚度 {Fin_t} mm | 間距 {Gap} mm")
@@ -2091,6 +1876,8 @@ with tab_3d:
         st.markdown("#### Step 4. 執行 AI 生成")
         st.success("""1. 開啟 **Gemini** 對話視窗。\n2. 確認模型設定為 **思考型 (Thinking) + Nano Banana (Imagen 3)**。\n3. 依序上傳兩張圖片 (3D 模擬圖 + 寫實參考圖)。\n4. 貼上提示詞並送出。""")
 
+get_perf().checkpoint("Tab4 3D 模擬")
+
 # --- Tab 5: 敏感度分析 (v4.33) ---
 # [v4.33] 全面升級：A1 變數選擇器 + A2 Tj_Margin 輸出 + A3 Tornado Chart
 with tab_sensitivity:
@@ -2099,9 +1886,13 @@ with tab_sensitivity:
     # 模式切換
     mode = st.radio(
         "分析模式",
-        ["🔬 單變數掃描", "🌪️ Tornado Chart (全局敏感度)"],
+        ["🔬 單變數掃描", "🌪️ Tornado Chart (全局敏感度)", "🎲 Monte Carlo 公差分析"],
         horizontal=True, label_visibility="collapsed"
     )
+    sa_dynamic_h = st.toggle(
+        "動態 h(FH) + η_fin 修正", value=False,
+        help="h 隨鰭片高度衰減並計入鰭片效率，所有掃描點同時迭代求 FH（與網頁版相同模型）；各點由固定起點獨立求解（逐點快取不支援 warm_start）；關閉時為常數 h 模型"
+    )
     st.markdown("---")
 
     # 共用：取得基礎參數與元件表
@@ -2116,15 +1907,27 @@ with tab_sensitivity:
         "Power Scale (功耗縮放)":    {"key": "power_scale", "unit": "×",  "label": "功耗縮放係數"},
     }
 
-    def _sa_calc(p_dict, d_df, vk, x_val, Area_fixed_m2=None):
-        """單點計算封裝：修改變數後呼叫 compute_key_results"""
-        p = copy.deepcopy(p_dict)
-        d = d_df.copy()
+    # [Perf] 預編譯熱模型：元件熱阻只算一次，各掃描點只重算 T_amb / 功耗 / 幾何相依項
+    sa_model = ThermalModel(base_params_sa, base_df_sa)
+    # 動態 h：各點由固定起點獨立迭代（不用 warm_start），逐點快取的結果才與快取狀態無關
+    sa_h_kw = {"h_model": "dynamic"} if sa_dynamic_h else {}
+    # [Perf] 逐點結果快取（跨 rerun 保留）：重複 / 重疊的掃描點與 Tornado 基準點免重算
+    sa_cache = get_result_cache()
+
+    def _sa_eval(vk, x_vals, Area_fixed_m2=None):
+        """多點計算封裝：以 sa_model 一次評估變數 vk 的所有值（常數 h 時結果同逐點 compute_key_results）"""
         if vk == "power_scale":
-            d['Power(W)'] = d['Power(W)'] * x_val
-        else:
-            p[vk] = x_val
-        return compute_key_results(p, d, Area_fixed_m2=Area_fixed_m2)
+            return sa_cache.evaluate(sa_model, power_scale=x_vals, Area_fixed_m2=Area_fixed_m2, **sa_h_kw)
+        return sa_cache.evaluate(sa_model, {vk: x_vals}, Area_fixed_m2=Area_fixed_m2, **sa_h_kw)
+
+    def _sa_base_area():
+        """
+        Fixed-Design 基準散熱面積（基準點 = 目前參數）
+        常數 h：經 compute_key_results_cached，單變數掃描與 Tornado 共用同一筆；動態 h：走逐點快取
+        """
+        if sa_dynamic_h:
+            return float(_sa_eval("Gap", [base_params_sa["Gap"]])["Area_req"][0])
+        return float(compute_key_results_cached(base_params_sa, base_df_sa)["Area_req"])
 
     # =====================================================
     # 模式 A：單變數掃描
@@ -2181,16 +1984,18 @@ with tab_sensitivity:
                 main_volume_rounded = round(Volume_L, 2)
 
                 # Fixed-Design：先算基準散熱面積，後續掃描用固定面積算 Tj_Margin
-                _base_res = _sa_calc(base_params_sa, base_df_sa, var_key, base_val)
-                _area_base = _base_res.get("Area_req", 0)
+                _area_base = _sa_base_area()
+
+                # 全部掃描點一次評估
+                _batch = _sa_eval(var_key, x_values, Area_fixed_m2=_area_base)
 
                 results = []
                 for i, x in enumerate(x_values):
-                    res = _sa_calc(base_params_sa, base_df_sa, var_key, x, Area_fixed_m2=_area_base)
+                    res = sa_model.result_at(_batch, i)
                     gap_now = base_params_sa["Gap"] if var_key != "Gap" else x
                     ar = res["Fin_Height"] / gap_now if gap_now > 0 else 0
                     vol_r = round(res["Volume_L"], 2)
-                    if i == closest_idx:
+                    if i == closest_idx and not sa_dynamic_h:
                         vol_r = main_volume_rounded
 
                     results.append({
@@ -2204,6 +2009,19 @@ with tab_sensitivity:
                     })
 
                 df_res = pd.DataFrame(results)
+                if sa_dynamic_h:
+                    # 動態 h 求解狀態：未收斂的點數值僅供參考（未寫入結果快取），於詳細數據標示
+                    df_res["h_status"] = [H_STATUS[int(s)] for s in _batch["h_status"]]
+
+                # ── T_amb / Power Scale：解析解（下包絡線）取得精確曲線與瓶頸切換點 ──
+                _analytic = None
+                _analytic_err = None
+                if var_key in ("T_amb", "power_scale") and not sa_dynamic_h:
+                    try:
+                        _analytic = sa_model.analytic_sweep(var_key, x_values.min(), x_values.max(), Area_fixed_m2=_area_base)
+                    except ValueError as e:
+                        # 解析解前提不成立（如元件功耗/熱阻為負）→ 改以取樣點曲線呈現
+                        _analytic_err = str(e)
 
                 # ── Power Scale：計算對應實際整機瓦數（含安全係數 Margin）──
                 _base_total_power = (base_df_sa['Power(W)'] * base_df_sa['Qty']).sum() * base_params_sa.get('Margin', 1.0)
@@ -2324,12 +2142,27 @@ with tab_sensitivity:
                 with col_right:
                     st.markdown(f"**熱流/幾何性能 — {perf_name}**")
                     fig_perf = go.Figure()
+                    if _analytic is not None:
+                        # 精確曲線：每段內 Tj_Margin 為線性，直接連接各段端點
+                        _vx, _vy, _ = _analytic.vertices()
+                        fig_perf.add_trace(go.Scatter(
+                            x=_vx, y=_vy, name=f"{perf_name}（解析解）", mode="lines",
+                            line=dict(color=perf_color, width=3), hoverinfo="skip"
+                        ))
+                        perf_mode = "markers"
                     fig_perf.add_trace(go.Scatter(
                         x=df_res["x"], y=perf_y, name=perf_name,
                         mode=perf_mode,
                         line=dict(color=perf_color, width=3, shape=perf_shape),
                         marker=dict(size=8, symbol=perf_symbol)
                     ))
+                    if _analytic is not None:
+                        for _sx, _from, _to in _analytic.switches():
+                            fig_perf.add_vline(
+                                x=_sx, line_width=1, line_dash="dot", line_color="#8e44ad",
+                                annotation_text=f"瓶頸 → {_to}", annotation_position="top left",
+                                annotation_font=dict(color="#8e44ad", size=10),
+                            )
                     if add_zero:
                         fig_perf.add_hline(
                             y=0, line_width=2, line_dash="dot", line_color="red",
@@ -2353,6 +2186,24 @@ with tab_sensitivity:
                         fig_perf.update_layout(xaxis=dict(tickvals=_tvals, ticktext=_ttexts))
                     st.plotly_chart(fig_perf, use_container_width=True)
 
+                if _analytic is not None:
+                    _sw = _analytic.switches()
+                    if _sw:
+                        st.caption("🔀 **瓶頸元件切換點（解析解）：** " + "　".join(
+                            f"{var_info['label']} = {_sx:.3f} {var_unit}：{_from} → {_to}" for _sx, _from, _to in _sw))
+                    else:
+                        st.caption(f"🔀 掃描範圍內瓶頸元件不變（解析解）：{_analytic.segments['bottleneck_name'].iloc[0]}")
+                elif _analytic_err:
+                    st.caption(f"ℹ️ 無法使用解析解（{_analytic_err}），曲線與瓶頸切換改以取樣點呈現")
+
+                _cs = sa_cache.stats()
+                st.caption(f"🗄️ 結果快取：命中 {_cs['hits']:,} / 未命中 {_cs['misses']:,}（{_cs['size']:,} 筆）")
+                if sa_dynamic_h:
+                    _n_nc = int((_batch["h_status"] == H_STATUS_MAX_ITER).sum())
+                    st.caption(f"🔁 動態 h 迭代：平均 {_batch['h_iterations'].mean():.1f} 次 / 點，"
+                               f"η_fin {_batch['eta_fin'].min():.3f} ~ {_batch['eta_fin'].max():.3f}"
+                               + (f"，⚠️ {_n_nc} 點未收斂（見詳細數據「動態 h 狀態」欄，不寫入快取）" if _n_nc else ""))
+
                 with st.expander("查看詳細數據"):
                     col_rename = {
                         "x": f"{var_info['label']} ({var_unit})",
@@ -2360,7 +2211,7 @@ with tab_sensitivity:
                         "AR": "流阻比", "Fin_Count": "鰭片數",
                         "Tj_Margin": "Bottleneck Tj_Margin (°C)",
                         "Fin_Height": "Fin 高度 (mm)", "DRC_fail": "DRC超限",
-                        "Total_Power_W": "整機功耗 (W)",
+                        "Total_Power_W": "整機功耗 (W)", "h_status": "動態 h 狀態",
                     }
                     st.dataframe(
                         df_res.rename(columns=col_rename).style.background_gradient(cmap="Blues"),
@@ -2377,7 +2228,7 @@ with tab_sensitivity:
     # =====================================================
     # 模式 B：Tornado Chart
     # =====================================================
-    else:
+    elif mode == "🌪️ Tornado Chart (全局敏感度)":
         with st.container(border=True):
             st.markdown("##### ⚙️ Tornado Chart 設定")
             tc1, tc2, tc3 = st.columns([2, 2, 2])
@@ -2405,8 +2256,7 @@ with tab_sensitivity:
 
                 tornado_rows = []
                 # Fixed-Design：先以 Gap 基準算出散熱面積，後續所有變數掃描共用此面積算 Tj_Margin
-                _tornado_base_res = _sa_calc(base_params_sa, base_df_sa, "Gap", base_params_sa["Gap"])
-                _tornado_area_base = _tornado_base_res.get("Area_req", 0)
+                _tornado_area_base = _sa_base_area()
 
                 for tv in tornado_vars:
                     vk = tv["key"]
@@ -2414,9 +2264,8 @@ with tab_sensitivity:
                     v_low  = max(bv * (1 - tornado_pct / 100), 0.1)
                     v_high = bv * (1 + tornado_pct / 100)
 
-                    r_low  = _sa_calc(base_params_sa, base_df_sa, vk, v_low,  Area_fixed_m2=_tornado_area_base)
-                    r_base = _sa_calc(base_params_sa, base_df_sa, vk, bv,     Area_fixed_m2=_tornado_area_base)
-                    r_high = _sa_calc(base_params_sa, base_df_sa, vk, v_high, Area_fixed_m2=_tornado_area_base)
+                    _r = _sa_eval(vk, [v_low, bv, v_high], Area_fixed_m2=_tornado_area_base)
+                    r_low, r_base, r_high = (sa_model.result_at(_r, i) for i in range(3))
 
                     tornado_rows.append({
                         "label":    VAR_MAP[tv["choice"]]["label"],
@@ -2618,6 +2467,107 @@ D_base + P_瓶頸 × R_total = (1 + pct) × T_amb_base
             </div>
             """, unsafe_allow_html=True)
 
+    # =====================================================
+    # 模式 C：Monte Carlo 公差分析
+    # =====================================================
+    else:
+        with st.container(border=True):
+            st.markdown("##### ⚙️ Monte Carlo 公差設定")
+            mc1, mc2, mc3 = st.columns(3)
+            with mc1:
+                mc_n = st.selectbox("樣本數", [10_000, 100_000, 1_000_000], index=1, format_func=lambda n: f"{n:,}")
+                mc_seed = st.number_input("亂數種子 (Seed)", min_value=0, value=0, step=1,
+                                          help="相同種子與樣本數可重現完全相同的結果")
+            with mc2:
+                mc_tamb_sd = st.number_input("T_amb 標準差 (°C)", min_value=0.0, value=1.5, step=0.5)
+                mc_pwr_sd = st.number_input("元件功耗 標準差 (%)", min_value=0.0, value=5.0, step=1.0,
+                                            help="每顆元件、每個樣本獨立抽樣（常態分佈）")
+                mc_rjc_tol = st.number_input("R_jc 公差 (±%)", min_value=0.0, value=10.0, step=1.0,
+                                             help="均勻分佈")
+            with mc3:
+                mc_tim_sd = st.number_input("TIM 厚度 標準差 (%)", min_value=0.0, value=10.0, step=1.0,
+                                            help="t_Grease / t_Pad / t_Putty（常態分佈）")
+                mc_void = st.slider("Voiding 範圍", min_value=0.3, max_value=1.0, value=(0.65, 0.85), step=0.05,
+                                    help="均勻分佈")
+            mc_fixed = st.toggle("Fixed-Design（散熱器固定為目前設計）", value=True,
+                                 help="開啟：以目前散熱面積評估各樣本的 Tj_Margin；關閉：每個樣本重新定尺寸（瓶頸元件 Tj_Margin 恆由 Margin 決定）")
+            run_mc = st.button("🎲 執行 Monte Carlo", type="primary", use_container_width=True)
+
+        if run_mc:
+            _tim_tol = {"dist": "normal", "rel_sd": mc_tim_sd / 100}
+            _bar = st.progress(0.0, text="Monte Carlo 抽樣計算中...")
+            _t0 = time.time()
+            mc_res = run_monte_carlo(
+                base_params_sa, base_df_sa,
+                global_tol={
+                    "T_amb": {"dist": "normal", "sd": mc_tamb_sd},
+                    "Voiding": {"dist": "uniform", "low": mc_void[0], "high": mc_void[1]},
+                    "t_Grease": _tim_tol, "t_Pad": _tim_tol, "t_Putty": _tim_tol,
+                },
+                component_tol={
+                    "Power(W)": {"dist": "normal", "rel_sd": mc_pwr_sd / 100},
+                    "R_jc": {"dist": "uniform", "rel_tol": mc_rjc_tol / 100},
+                },
+                n_samples=int(mc_n), seed=int(mc_seed), fixed_design=mc_fixed,
+                progress=lambda done, total: _bar.progress(done / total, text=f"Monte Carlo：{done:,} / {total:,}"),
+            )
+            _bar.empty()
+            st.caption(f"⏱️ {mc_n:,} 樣本，耗時 {time.time() - _t0:.2f} 秒")
+
+            df_mc = mc_res.summary()
+            df_mc = df_mc[base_df_sa['Power(W)'].values * base_df_sa['Qty'].values > 0].reset_index(drop=True)
+
+            col_a, col_b = st.columns(2)
+            with col_a:
+                st.markdown("**瓶頸元件機率**")
+                _p_bt = df_mc[df_mc["P_bottleneck"] > 0].sort_values("P_bottleneck")
+                fig_bt = go.Figure(go.Bar(
+                    x=_p_bt["P_bottleneck"] * 100, y=_p_bt["Component"], orientation='h',
+                    marker_color="rgba(155,89,182,0.75)",
+                    hovertemplate="<b>%{y}</b><br>%{x:.2f}%<extra></extra>"
+                ))
+                fig_bt.update_layout(xaxis=dict(title="成為瓶頸的機率 (%)"), height=340,
+                                     margin=dict(l=20, r=20, t=20, b=40))
+                st.plotly_chart(fig_bt, use_container_width=True)
+            with col_b:
+                st.markdown("**體積分佈 (L)**")
+                _vol = mc_res.volume[np.isfinite(mc_res.volume)]
+                _cnt, _edges = np.histogram(_vol, bins=60)
+                fig_vol = go.Figure(go.Bar(
+                    x=0.5 * (_edges[:-1] + _edges[1:]), y=_cnt / max(len(_vol), 1) * 100,
+                    marker_color="rgba(52,152,219,0.75)",
+                    hovertemplate="%{x:.2f} L<br>%{y:.2f}%<extra></extra>"
+                ))
+                for _q, _v in mc_res.volume_percentiles([5, 50, 95]).items():
+                    fig_vol.add_vline(x=_v, line_dash="dot", line_color="gray", annotation_text=_q)
+                fig_vol.update_layout(xaxis=dict(title="體積 (L)"), yaxis=dict(title="比例 (%)"),
+                                      height=340, margin=dict(l=20, r=20, t=20, b=40), bargap=0.02)
+                st.plotly_chart(fig_vol, use_container_width=True)
+
+            st.markdown("**各元件 Tj_Margin 百分位 (°C)**")
+            _pct_cols = [c for c in df_mc.columns if c.startswith("P") and c not in ("P_bottleneck", "P_margin_lt_0")]
+            df_show_mc = df_mc.copy()
+            df_show_mc["P_bottleneck"] = (df_show_mc["P_bottleneck"] * 100).round(2)
+            df_show_mc["P_margin_lt_0"] = (df_show_mc["P_margin_lt_0"] * 100).round(2)
+            df_show_mc = df_show_mc.rename(columns={"Component": "元件", "P_bottleneck": "瓶頸機率 (%)",
+                                                    "P_margin_lt_0": "超溫機率 (%)"})
+            st.dataframe(
+                df_show_mc.style
+                    .format({c: "{:.2f}" for c in _pct_cols})
+                    .background_gradient(cmap="RdYlGn", subset=_pct_cols),
+                use_container_width=True
+            )
+        else:
+            st.markdown("""
+            <div style="text-align: center; color: #aaa; padding: 60px; border: 2px dashed #eee; border-radius: 10px; background-color: #fcfcfc; margin-top: 20px;">
+                <h3 style="margin-bottom: 10px;">👈 請設定公差並點擊「執行 Monte Carlo」</h3>
+                <p>系統將對 <b>元件功耗 / R_jc / TIM 厚度 / Voiding / T_amb</b> 依分佈抽樣，<br>
+                統計各元件 <b>Tj_Margin 百分位</b>、<b>瓶頸機率</b> 與 <b>體積分佈</b>。</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+get_perf().checkpoint("Tab5 敏感度分析")
+
 # --- [Project I/O - Save Logic] 底部渲染至頂部 placeholder ---
 with project_io_save_placeholder.container():
     _json_data  = get_current_state_json()
@@ -2629,3 +2579,56 @@ with project_io_save_placeholder.container():
         mime="application/json",
         use_container_width=True,
     )
+    # 本機專案（SQLite）：離線或不想管理下載檔時，直接存於本機資料庫並可再載入
+    if not st.session_state.get('local_library_failed'):
+        with st.expander("🗄️ 本機專案", expanded=False):
+            try:
+                _local_store = get_local_store()
+                _local_projects = _local_store.list_projects()
+                _proj_name = st.text_input("專案名稱", value=st.session_state.get('current_project_name') or "",
+                                           key="local_project_name", placeholder="輸入名稱後存至本機")
+                if st.button("💾 存至本機", key="local_project_save", use_container_width=True,
+                             disabled=not _proj_name.strip()):
+                    _local_store.save_project(_proj_name.strip(), _json_data)
+                    st.session_state['current_project_name'] = _proj_name.strip()
+                    st.session_state['project_meta'] = json.loads(_json_data)['meta']
+                    st.toast(f"✅ 已存至本機：{_proj_name.strip()}", icon="🗄️")
+                    st.rerun()
+                if _local_projects:
+                    _proj_labels = {f"{p['name']} · {time.strftime('%Y-%m-%d %H:%M', time.localtime(p['updated_at']))}": p['name']
+                                    for p in _local_projects}
+                    _proj_sel = st.selectbox("本機專案", list(_proj_labels), key="local_project_selector")
+                    if st.button("📂 載入本機專案", key="local_project_load", use_container_width=True):
+                        apply_project_data(_local_store.load_project(_proj_labels[_proj_sel]), _proj_labels[_proj_sel])
+                        st.toast("✅ 專案載入成功！", icon="📂")
+                        st.rerun()
+            except Exception as e:
+                st.error(f"本機專案無法使用: {e}")
+
+get_perf().checkpoint("專案存檔 (JSON)")
+
+# --- [Perf] Rerun 分段計時面板（側邊欄「🐞 效能除錯」開啟時顯示）---
+_perf = get_perf()
+_perf_record = _perf.finish()
+if st.session_state.get("perf_debug", False) and _perf_record is not None:
+    with st.sidebar.expander("⏱️ Rerun 分段計時", expanded=True):
+        _perf_log = os.environ.get("RRU_PERF_LOG", DEFAULT_LOG_PATH) or "停用"
+        st.caption(f"本次 rerun：**{_perf_record['total_ms']:.0f} ms**（session {_perf.session}，日誌：{_perf_log}）")
+        _perf_rows = pd.DataFrame([{"項目": e["name"], "類型": "區段" if e["kind"] == "section" else "細項",
+                                    "ms": round(e["ms"], 1)} for e in _perf_record["entries"]])
+        if not _perf_rows.empty:
+            _sec_total = _perf_rows.loc[_perf_rows["類型"] == "區段", "ms"].sum()
+            _perf_rows["%"] = (_perf_rows["ms"] / max(_sec_total, 1e-9) * 100).round(1)
+            st.dataframe(_perf_rows, hide_index=True, use_container_width=True)
+
+        st.markdown(f"**近 {len(_perf.history)} 次 rerun 區段統計**")
+        _perf_sum = _perf.summary("section")
+        if _perf_sum:
+            st.dataframe(pd.DataFrame([{"區段": k, "次數": v["count"], "平均 ms": round(v["mean_ms"], 1),
+                                        "最大 ms": round(v["max_ms"], 1)} for k, v in _perf_sum.items()]),
+                         hide_index=True, use_container_width=True)
+
+        _perf_prof = {e["name"]: e["profile"] for e in _perf_record["entries"] if e["profile"]}
+        if _perf_prof:
+            _perf_pick = st.selectbox("cProfile 報表", list(_perf_prof), key="perf_profile_pick")
+            st.code(_perf_prof[_perf_pick], language="text")
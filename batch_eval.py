@@ -0,0 +1,243 @@
+import argparse
+import csv
+import glob
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from thermal_engine import DRC_RULES, drc_check_vec, run_main_pipeline
+
+# ==============================================================================
+# 5G RRU Batch Evaluator - 專案 JSON 批次評估 (headless)
+#
+# 讀取 get_current_state_json 存出的專案檔（meta / global_params / rf_data / digital_data / pwr_data），
+# 以 worker 行程平行執行主頁熱流程，每完成一個專案即寫出一列結果至 CSV / Parquet。
+# 用法：python batch_eval.py projects/ "archive/**/*.json" -o results.csv --workers 8
+# ==============================================================================
+
+# 專案檔元件區段 → _src 標記（同主頁合併三類元件的方式）
+COMPONENT_SECTIONS = (("rf_data", "RF"), ("digital_data", "Digital"), ("pwr_data", "PWR"))
+
+RESULT_COLUMNS = ["project", "version", "Volume_L", "total_weight_kg", "Fin_Height", "Fin_Count",
+                  "Bottleneck", "Tj_Margin", "Total_Power", "DRC_status", "DRC_rule", "error"]
+# Parquet 欄位型別（固定 schema：錯誤列的數值欄為 null，不可由第一個 row group 推斷）
+RESULT_TYPES = {"project": "string", "version": "string", "Volume_L": "double", "total_weight_kg": "double",
+                "Fin_Height": "double", "Fin_Count": "int64", "Bottleneck": "string", "Tj_Margin": "double",
+                "Total_Power": "double", "DRC_status": "string", "DRC_rule": "string", "error": "string"}
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_config.json")
+
+FILES_PER_TASK = 16          # 每個任務處理的檔案數（攤平派送成本）
+PENDING_TASKS_PER_WORKER = 4 # 每個 worker 最多排隊的任務數（限制記憶體，結果即時寫出）
+PARQUET_ROW_GROUP = 1024     # Parquet 每個 row group 的列數
+
+
+def load_default_params(path=DEFAULT_CONFIG_PATH):
+    """專案檔缺少的全域參數以 default_config.json 補齊（同 app 啟動預設）；檔案不存在時回傳空 dict"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return dict(json.load(f).get("global_params", {}))
+
+
+def expand_inputs(inputs, recursive=False):
+    """目錄 / glob / 檔案路徑 → 排序後的專案檔清單（去除重複）"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*.json") if recursive else os.path.join(item, "*.json")
+            paths.extend(sorted(glob.glob(pattern, recursive=recursive)))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            paths.append(item)
+    return list(dict.fromkeys(paths))
+
+
+def project_frame(data):
+    """專案 dict → 三類元件合併表（含 _src 標記）"""
+    import pandas as pd
+    frames = []
+    for key, src in COMPONENT_SECTIONS:
+        if data.get(key):
+            df = pd.DataFrame(data[key])
+            df["_src"] = src
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def evaluate_project(data, defaults=None):
+    """評估單一專案 dict，回傳結果列（RESULT_COLUMNS，不含 project / error）"""
+    params = dict(defaults or {})
+    params.update(data.get("global_params", {}))
+    res = run_main_pipeline(project_frame(data), params)
+    if res["drc_failed"]:
+        status = "FAIL"
+    elif res["drc_warn_msg"]:
+        status = "WARN"
+    else:
+        status = "PASS"
+    code = int(drc_check_vec(params["fin_tech_selector_v2"], params["Gap"], params["Fin_t"], res["Fin_Height"]))
+    return {
+        "version": (data.get("meta") or {}).get("version", ""),
+        "Volume_L": float(res["Volume_L"]),
+        "total_weight_kg": float(res["total_weight_kg"]),
+        "Fin_Height": float(res["Fin_Height"]),
+        "Fin_Count": int(res["Fin_Count"]),
+        "Bottleneck": res["Bottleneck_Name"],
+        "Tj_Margin": float(res["Bottleneck_Tj_Margin"]),
+        "Total_Power": float(res["Total_Power"]),
+        "DRC_status": status,
+        "DRC_rule": DRC_RULES[code],
+    }
+
+
+def evaluate_project_file(path, defaults=None):
+    """評估單一專案檔；讀檔或計算失敗時回傳含 error 欄位的列，不中斷整批"""
+    row = dict.fromkeys(RESULT_COLUMNS)
+    row["project"] = path
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        row.update(evaluate_project(data, defaults))
+        row["error"] = ""
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _evaluate_files(paths, defaults):
+    return [evaluate_project_file(p, defaults) for p in paths]
+
+
+def iter_batch_results(paths, workers=None, defaults=None, files_per_task=FILES_PER_TASK):
+    """
+    依完成順序逐列產生結果 dict（非輸入順序，以 project 欄位對應）
+    workers <= 1 時在本行程依序計算；否則以 process pool 平行，排隊中的任務數有上限
+    """
+    defaults = load_default_params() if defaults is None else defaults
+    workers = max(int(workers or os.cpu_count() or 1), 1)
+    tasks = [paths[i:i + files_per_task] for i in range(0, len(paths), files_per_task)]
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield from _evaluate_files(task, defaults)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        it = iter(tasks)
+        limit = workers * PENDING_TASKS_PER_WORKER
+        while True:
+            for task in it:
+                pending.add(pool.submit(_evaluate_files, task, defaults))
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield from fut.result()
+
+
+class ResultWriter:
+    """逐列寫出 CSV（每列 flush）或 Parquet（每 PARQUET_ROW_GROUP 列一個 row group，需 pyarrow）"""
+
+    def __init__(self, out_path):
+        self.ext = os.path.splitext(str(out_path))[1].lower()
+        if self.ext not in (".csv", ".parquet"):
+            raise ValueError(f"不支援的輸出格式 {self.ext!r}（僅 .csv / .parquet）")
+        self.out_path = out_path
+        self._buffer = []
+        self._writer = None
+        if self.ext == ".csv":
+            self._file = open(out_path, "w", newline="", encoding="utf-8")
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+            self._csv.writeheader()
+        else:
+            if importlib.util.find_spec("pyarrow") is None:
+                raise ImportError("輸出 Parquet 需要安裝 pyarrow")
+
+    def write(self, row):
+        if self.ext == ".csv":
+            self._csv.writerow(row)
+            self._file.flush()
+            return
+        self._buffer.append(row)
+        if len(self._buffer) >= PARQUET_ROW_GROUP:
+            self._flush_parquet()
+
+    def _flush_parquet(self):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self._buffer:
+            return
+        if self._writer is None:
+            schema = pa.schema([(c, pa.type_for_alias(RESULT_TYPES[c])) for c in RESULT_COLUMNS])
+            self._writer = pq.ParquetWriter(self.out_path, schema)
+        table = pa.Table.from_pandas(pd.DataFrame(self._buffer, columns=RESULT_COLUMNS),
+                                     schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        if self.ext == ".csv":
+            self._file.close()
+            return
+        self._flush_parquet()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def run_batch(inputs, out_path, workers=None, recursive=False, defaults=None, progress=None):
+    """
+    批次評估並寫出結果檔；回傳統計 dict（total / drc_fail / errors / seconds）
+    progress(done, total)：每寫出一列後回呼
+    """
+    paths = expand_inputs(inputs, recursive=recursive)
+    t0 = time.perf_counter()
+    stats = {"total": len(paths), "drc_fail": 0, "errors": 0}
+    with ResultWriter(out_path) as writer:
+        for done, row in enumerate(iter_batch_results(paths, workers=workers, defaults=defaults), start=1):
+            writer.write(row)
+            stats["errors"] += bool(row["error"])
+            stats["drc_fail"] += row["DRC_status"] == "FAIL"
+            if progress:
+                progress(done, len(paths))
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="5G RRU 專案 JSON 批次評估（體積 / 重量 / 鰭片 / 瓶頸 / DRC）")
+    parser.add_argument("inputs", nargs="+", help="專案檔、目錄或 glob（如 'archive/**/*.json'）")
+    parser.add_argument("-o", "--output", required=True, help="輸出檔 (.csv / .parquet)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker 行程數（預設 CPU 數）")
+    parser.add_argument("-r", "--recursive", action="store_true", help="目錄輸入時遞迴搜尋子目錄")
+    parser.add_argument("--defaults", default=DEFAULT_CONFIG_PATH,
+                        help="補齊缺少參數用的設定檔（預設 default_config.json；空字串表示不補齊）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不顯示進度")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        if not args.quiet and (done == total or done % 100 == 0):
+            print(f"\r{done}/{total}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+    stats = run_batch(args.inputs, args.output, workers=args.workers, recursive=args.recursive,
+                      defaults=load_default_params(args.defaults), progress=progress)
+    print(f"{stats['total']} projects in {stats['seconds']:.1f}s — DRC fail {stats['drc_fail']}, "
+          f"errors {stats['errors']} → {args.output}", file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
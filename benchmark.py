@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from batch_eval import COMPONENT_SECTIONS, DEFAULT_CONFIG_PATH, load_default_params
+from sweep_executor import SweepExecutor
+from thermal_engine import (
+    ThermalModel, build_tim_props, calc_fin_count, calc_fin_count_vec,
+    calc_thermal_resistance, calc_thermal_resistance_vec, compute_key_results,
+)
+
+# ==============================================================================
+# 5G RRU Benchmark Suite - 熱計算核心效能基準
+#
+# 以合成元件表（10 ~ 100,000 列）與掃描點數（10 ~ 10^6）量測各熱路徑的
+# throughput / p50 / p99 延遲 / 峰值記憶體（tracemalloc），結果存成 JSON 供版本間比較。
+# 同一 case 的 variant 並列（如 row_apply vs vectorized），回歸時可看出退步的是哪條路徑。
+# 用法：python benchmark.py -o bench.json            （完整尺寸）
+#       python benchmark.py --quick --cases sa_scan,tornado
+# ==============================================================================
+
+TABLE_SIZES = (10, 100, 1_000, 10_000, 100_000)
+SWEEP_SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+FIN_COUNTS = (10, 30, 100, 300)                 # tab_3d 建圖：鰭片數
+
+QUICK_TABLE_SIZES = (10, 100, 1_000)
+QUICK_SWEEP_SIZES = (10, 1_000, 10_000)
+QUICK_FIN_COUNTS = (10, 30)
+
+ROW_APPLY_MAX_ROWS = 10_000     # df.apply(calc_thermal_resistance) 逐列版超過此列數不量測（太慢）
+SCALAR_LOOP_MAX_POINTS = 100_000  # 純量 calc_fin_count 迴圈上限
+SA_STEPS = 21                   # 單變數掃描最大點數（_sa_calc 掃描）
+TORNADO_PCT = 20.0              # Tornado ±%
+
+DEFAULT_MIN_TIME = 0.5          # 秒；每個量測點至少累積的計時長度
+DEFAULT_MAX_REPEAT = 50
+MIN_REPEAT = 3
+
+
+# ==================================================
+# 合成資料
+# ==================================================
+def base_components(config_path=DEFAULT_CONFIG_PATH):
+    """default_config.json 的三類元件合併表（含 _src），作為合成表的取樣母體"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    frames = []
+    for key, src in COMPONENT_SECTIONS:
+        if cfg.get(key):
+            df = pd.DataFrame(cfg[key])
+            df["_src"] = src
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def synthetic_components(n, seed=0, base=None):
+    """
+    n 列合成元件表：自預設元件表有放回抽樣，功耗 / 高度 / 熱阻加 ±20% 抖動，
+    保留 Final PA（Copper Coin）、DDR / PWR（Tc 限制）與各種 TIM 的分支比例
+    """
+    base = base_components() if base is None else base
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+    jitter = lambda: rng.uniform(0.8, 1.2, n)
+    df["Power(W)"] = (df["Power(W)"] * jitter()).round(3)
+    df["Height(mm)"] = (df["Height(mm)"] * jitter()).round(1)
+    df["R_jc"] = df["R_jc"] * jitter()
+    return df
+
+
+def benchmark_params(config_path=DEFAULT_CONFIG_PATH):
+    """基準用全域參數（default_config.json + 主頁預設 Slope）"""
+    p = load_default_params(config_path)
+    p.setdefault("Slope", 0.03)
+    return p
+
+
+# ==================================================
+# 量測
+# ==================================================
+def measure(fn, n_items, min_time=DEFAULT_MIN_TIME, max_repeat=DEFAULT_MAX_REPEAT, memory=True):
+    """
+    重複執行 fn() 直到累積 min_time 秒（至少 MIN_REPEAT 次、至多 max_repeat 次），
+    回傳延遲分位數與 throughput（n_items / p50）；memory=True 時另跑一次 tracemalloc 取峰值。
+    第一次呼叫為暖機；若暖機本身已超過 min_time 則直接作為唯一樣本（大型 case 避免重複數秒）。
+    """
+    t0 = time.perf_counter()
+    fn()
+    first = time.perf_counter() - t0
+    if first >= min_time:
+        samples = [first]
+    else:
+        samples = []
+        while len(samples) < max_repeat and (len(samples) < MIN_REPEAT or sum(samples) < min_time):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+    s = np.asarray(samples)
+    p50 = float(np.percentile(s, 50))
+    out = {
+        "n": int(n_items),
+        "repeat": len(samples),
+        "p50_ms": p50 * 1e3,
+        "p99_ms": float(np.percentile(s, 99)) * 1e3,
+        "mean_ms": float(s.mean()) * 1e3,
+        "throughput_per_s": n_items / p50 if p50 > 0 else float("inf"),
+        "peak_mem_mb": None,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            out["peak_mem_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return out
+
+
+# ==================================================
+# 各 case：回傳 [(variant, size, unit, fn, n_items), ...]
+# ==================================================
+def _sa_calc(params, df, vk, val, Area_fixed_m2=None):
+    """原逐點 _sa_calc：以 compute_key_results 計算單一掃描點"""
+    p = dict(params)
+    if vk == "power_scale":
+        d = df.copy()
+        d["Power(W)"] = d["Power(W)"] * val
+        return compute_key_results(p, d, Area_fixed_m2=Area_fixed_m2)
+    p[vk] = val
+    return compute_key_results(p, df, Area_fixed_m2=Area_fixed_m2)
+
+
+def _tornado_points(params):
+    """Tornado 各變數的 (low, base, high)，同 app 的 ±TORNADO_PCT 規則"""
+    out = []
+    for vk in ("Gap", "T_amb", "power_scale"):
+        bv = 1.0 if vk == "power_scale" else float(params[vk])
+        out.append((vk, [max(bv * (1 - TORNADO_PCT / 100), 0.1), bv, bv * (1 + TORNADO_PCT / 100)]))
+    return out
+
+
+def case_thermal_resistance(params, table_sizes, sweep_sizes, fin_counts):
+    g = dict(params)
+    g["tim_props"] = build_tim_props(params)
+    for n in table_sizes:
+        df = synthetic_components(n)
+        if n <= ROW_APPLY_MAX_ROWS:
+            yield "row_apply", n, "rows", (lambda df=df: df.apply(calc_thermal_resistance, axis=1, args=(g,))), n
+        yield "vectorized", n, "rows", (lambda df=df: calc_thermal_resistance_vec(df, g)), n
+
+
+def case_compute_key_results(params, table_sizes, sweep_sizes, fin_counts):
+    for n in table_sizes:
+        df = synthetic_components(n)
+        yield "single_point", n, "rows", (lambda df=df: compute_key_results(params, df)), n
+
+
+def case_sa_scan(params, table_sizes, sweep_sizes, fin_counts):
+    """單變數掃描（Gap，SA_STEPS 點）：逐點 _sa_calc vs 預編譯 ThermalModel（含建模時間）"""
+    x = np.linspace(params["Gap"] * 0.5, params["Gap"] * 1.5, SA_STEPS)
+    for n in table_sizes:
+        df = synthetic_components(n)
+        yield "per_point", n, "points", (lambda df=df: [_sa_calc(params, df, "Gap", v) for v in x]), SA_STEPS
+        yield "thermal_model", n, "points", (lambda df=df: ThermalModel(params, df).evaluate({"Gap": x})), SA_STEPS
+
+
+def case_tornado(params, table_sizes, sweep_sizes, fin_counts):
+    """Tornado：基準面積 1 點 + 3 變數 × (low, base, high)，Fixed-Design 面積"""
+    points = _tornado_points(params)
+    n_points = 1 + sum(len(v) for _, v in points)
+
+    def per_point(df):
+        area = _sa_calc(params, df, "Gap", params["Gap"])["Area_req"]
+        return [[_sa_calc(params, df, vk, v, Area_fixed_m2=area) for v in vals] for vk, vals in points]
+
+    def thermal_model(df):
+        model = ThermalModel(params, df)
+        area = float(model.evaluate({"Gap": [params["Gap"]]})["Area_req"][0])
+        out = []
+        for vk, vals in points:
+            if vk == "power_scale":
+                out.append(model.evaluate(power_scale=vals, Area_fixed_m2=area))
+            else:
+                out.append(model.evaluate({vk: vals}, Area_fixed_m2=area))
+        return out
+
+    for n in table_sizes:
+        df = synthetic_components(n)
+        yield "per_point", n, "points", (lambda df=df: per_point(df)), n_points
+        yield "thermal_model", n, "points", (lambda df=df: thermal_model(df)), n_points
+
+
+def case_fin_count(params, table_sizes, sweep_sizes, fin_counts):
+    W_hsk = params["W_pcb"] + params["Top"] + params["Btm"]
+    for n in sweep_sizes:
+        gap = np.linspace(2.0, 20.0, n)
+        if n <= SCALAR_LOOP_MAX_POINTS:
+            yield "scalar", n, "points", (lambda gap=gap: [calc_fin_count(W_hsk, g, params["Fin_t"]) for g in gap]), n
+        yield "vectorized", n, "points", (lambda gap=gap: calc_fin_count_vec(W_hsk, gap, params["Fin_t"])), n
+
+
+def case_sweep(params, table_sizes, sweep_sizes, fin_counts):
+    """預設元件表上的 Gap 掃描（SweepExecutor 本行程分塊計算）"""
+    df = base_components()
+    ex = SweepExecutor(params, df, workers=1)
+    for n in sweep_sizes:
+        gap = np.linspace(2.0, 20.0, n)
+        yield "sweep_executor", n, "points", (lambda gap=gap: ex.evaluate({"Gap": gap})), n
+
+
+def case_figure_3d(params, table_sizes, sweep_sizes, fin_counts):
+    """tab_3d 建圖（plotly 未安裝時略過）：build 與 build + to_json（st.plotly_chart 需序列化）"""
+    try:
+        from rru_3d import build_rru_figure
+    except ImportError:
+        return
+    L_hsk = params["L_pcb"] + params["Left"] + params["Right"]
+    Gap, Fin_t, Fin_Height = params["Gap"], params["Fin_t"], 60.0
+    for n in fin_counts:
+        W_hsk = n * (Gap + Fin_t) - Gap
+        RRU_Height = params["H_shield"] + params["H_filter"] + params["t_base"] + Fin_Height
+        args = (L_hsk, W_hsk, RRU_Height, params["H_shield"], params["H_filter"], params["t_base"],
+                Fin_Height, Fin_t, Gap, n)
+        yield "build", n, "fins", (lambda args=args: build_rru_figure(*args)), n
+        yield "build_to_json", n, "fins", (lambda args=args: build_rru_figure(*args).to_json()), n
+
+
+CASES = {
+    "thermal_resistance": case_thermal_resistance,
+    "compute_key_results": case_compute_key_results,
+    "sa_scan": case_sa_scan,
+    "tornado": case_tornado,
+    "fin_count": case_fin_count,
+    "sweep": case_sweep,
+    "figure_3d": case_figure_3d,
+}
+
+
+def environment():
+    """執行環境資訊（寫入 JSON meta，比較不同機器 / 版本時參考）"""
+    env = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": None,
+        "git_rev": None,
+    }
+    try:
+        import plotly
+        env["plotly"] = plotly.__version__
+    except ImportError:
+        pass
+    try:
+        env["git_rev"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return env
+
+
+def run_benchmarks(cases=None, quick=False, min_time=DEFAULT_MIN_TIME, max_repeat=DEFAULT_MAX_REPEAT,
+                   memory=True, params=None, progress=None):
+    """
+    執行指定 case（預設全部），回傳 {"meta": 環境資訊, "results": [每個量測點一筆 dict]}
+    progress(record)：每完成一個量測點後回呼
+    """
+    cases = list(CASES) if cases is None else list(cases)
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise ValueError(f"未知的 case：{sorted(unknown)}（可用：{list(CASES)}）")
+    params = benchmark_params() if params is None else params
+    sizes = ((QUICK_TABLE_SIZES, QUICK_SWEEP_SIZES, QUICK_FIN_COUNTS) if quick
+             else (TABLE_SIZES, SWEEP_SIZES, FIN_COUNTS))
+    results = []
+    for case in cases:
+        for variant, size, unit, fn, n_items in CASES[case](params, *sizes):
+            rec = {"case": case, "variant": variant, "size": int(size), "unit": unit}
+            rec.update(measure(fn, n_items, min_time=min_time, max_repeat=max_repeat, memory=memory))
+            results.append(rec)
+            if progress:
+                progress(rec)
+    meta = environment()
+    meta.update(quick=quick, min_time=min_time, max_repeat=max_repeat)
+    return {"meta": meta, "results": results}
+
+
+def format_record(rec):
+    mem = "-" if rec["peak_mem_mb"] is None else f"{rec['peak_mem_mb']:.1f}"
+    return (f"{rec['case']:<20} {rec['variant']:<15} {rec['size']:>9} {rec['p50_ms']:>11.3f} "
+            f"{rec['p99_ms']:>11.3f} {rec['throughput_per_s']:>14.0f} {mem:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="5G RRU 熱計算效能基準（throughput / p50 / p99 / 峰值記憶體 → JSON）")
+    parser.add_argument("-o", "--output", default=None, help="結果 JSON 路徑（預設不存檔）")
+    parser.add_argument("--cases", default=None, help=f"逗號分隔的 case（預設全部：{','.join(CASES)}）")
+    parser.add_argument("--quick", action="store_true", help="只跑小尺寸（開發時快速檢查）")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="每個量測點至少累積的秒數")
+    parser.add_argument("--max-repeat", type=int, default=DEFAULT_MAX_REPEAT, help="每個量測點最多重複次數")
+    parser.add_argument("--no-memory", action="store_true", help="不量測峰值記憶體（tracemalloc 會多跑一次）")
+    args = parser.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()] if args.cases else None
+    print(f"{'case':<20} {'variant':<15} {'size':>9} {'p50 ms':>11} {'p99 ms':>11} {'items/s':>14} {'peak MB':>9}",
+          file=sys.stderr)
+    report = run_benchmarks(cases, quick=args.quick, min_time=args.min_time, max_repeat=max(args.max_repeat, 1),
+                            memory=not args.no_memory,
+                            progress=lambda rec: print(format_record(rec), file=sys.stderr, flush=True))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"{len(report['results'])} results → {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
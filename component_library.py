@@ -0,0 +1,744 @@
+import atexit
+import bisect
+import threading
+import time
+from collections.abc import Mapping
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+import weakref
+
+# ==============================================================================
+# 5G RRU Component Library - 元件資料庫快取（rf / digital / pwr library）
+#
+# LibraryCache 為行程內所有 session 共用：第一次全量讀取，之後每 TTL 只以 updated_at
+# 增量查詢變更的文件；刪除以 tombstone（deleted=True）寫入，讓增量同步也看得到。
+# 三個 collection 以 thread pool 同時分頁讀取，且只投影快選清單需要的欄位
+# （Component / Power(W)）；完整元件資料在使用者實際選取時才逐筆讀取並快取。
+# session 取得的是不可變快照（LibrarySnapshot），寫入經由快取完成並立即發佈新快照。
+# 寫入為 write-behind：put / delete 先更新本地快照並排入佇列（同一文件只保留最後一次），
+# 由背景計時器以批次交易（commit）送出；每筆寫入帶樂觀版本檢查（預期的 updated_at），
+# 其他使用者已先修改的文件不會被覆蓋，而是回報衝突並改採伺服器版本。
+# 後端介面：fetch_page / get / set / commit（FirestoreBackend、MemoryBackend；離線用 local_store.SqliteBackend）。
+# 不依賴 Streamlit；app.py 以 st.cache_resource 持有單一實例。
+# ==============================================================================
+
+LIBRARY_COLLECTIONS = ("rf_library", "digital_library", "pwr_library")
+
+UPDATED_FIELD = "updated_at"   # 最後修改時間（epoch 秒，由寫入端加上）
+DELETED_FIELD = "deleted"      # 刪除標記（tombstone）
+META_FIELDS = (UPDATED_FIELD, DELETED_FIELD)
+
+# 快照只投影的欄位（field projection）：快選清單用 Component / Power(W)，Limit(C) 供範圍索引
+PICKER_FIELDS = ("Component", "Power(W)", "Limit(C)")
+RANGE_FIELDS = ("Power(W)", "Limit(C)")
+
+LIBRARY_TTL_S = 60.0           # 快照有效秒數；過期後下一次 snapshot() 觸發增量同步
+FULL_RESYNC_S = 6 * 3600.0     # 全量重讀間隔（補上未帶 updated_at 的外部修改 / 硬刪除）
+CLOCK_SKEW_S = 120.0           # 增量查詢往回重疊的秒數（容許寫入端時鐘誤差）
+PAGE_SIZE = 500                # 每次分頁讀取的文件數
+WRITE_DELAY_S = 2.0            # 第一筆寫入排入佇列後，延遲多久批次送出（期間的寫入合併為同一批）
+MAX_BATCH_WRITES = 500         # 單次 commit 的寫入數上限（Firestore 交易上限）；佇列達此數時立即送出
+CONFLICT_HISTORY = 200         # 保留的未讀取衝突筆數
+
+
+def doc_id_for(name):
+    """元件名稱 → Firestore document id（與既有資料相同的轉換規則）"""
+    return name.replace(" ", "_").replace("/", "-").replace("(", "").replace(")", "")
+
+
+def empty_library():
+    """空元件庫（無法連線時的 fallback，介面同 LibrarySnapshot）"""
+    return LibrarySnapshot({c: () for c in LIBRARY_COLLECTIONS})
+
+
+def option_label(record):
+    """快選清單顯示字串（同原本 f"{Component} ({Power(W)}W)" 格式）"""
+    return f"{record['Component']} ({record.get('Power(W)')}W)"
+
+
+def _strip_meta(data):
+    return {k: v for k, v in data.items() if k not in META_FIELDS}
+
+
+def _version(data):
+    """文件版本（updated_at）；文件不存在時為 None"""
+    return None if data is None else data.get(UPDATED_FIELD)
+
+
+def _versioned(data):
+    """保留 updated_at（版本）、去除 deleted 的唯讀複本（快照摘要 / 完整資料快取）"""
+    return MappingProxyType({k: v for k, v in data.items() if k != DELETED_FIELD})
+
+
+# put / delete 未指定 expected 時：以快取目前所知的版本為預期（無法偵測呼叫端看到的是舊版本）
+LATEST = object()
+
+
+# 行程結束前送出所有快取中尚未寫入的佇列（計時器為 daemon thread，不會等待）
+_LIVE_CACHES = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for cache in list(_LIVE_CACHES):
+        cache.flush()
+
+
+class FirestoreBackend:
+    """
+    Firestore 存取：fetch_page（分頁 + 欄位投影）/ get（單筆完整文件）/ set
+    設定環境變數 FIRESTORE_EMULATOR_HOST 時 firestore.client() 會連到本機 emulator，可直接測試
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def fetch_page(self, collection, fields=None, since=None, cursor=None, limit=PAGE_SIZE):
+        """
+        讀取一頁：回傳 ([(doc_id, dict)], next_cursor)，next_cursor 為 None 表示已是最後一頁
+        fields：只投影這些欄位（None 為完整文件）；since：只取 updated_at >= since 的文件
+        """
+        q = self.db.collection(collection)
+        if since is not None:
+            q = q.where(UPDATED_FIELD, ">=", since).order_by(UPDATED_FIELD)
+        if fields is not None:
+            q = q.select(list(fields))
+        if cursor is not None:
+            q = q.start_after(cursor)
+        docs = list(q.limit(limit).stream())
+        return [(d.id, d.to_dict() or {}) for d in docs], (docs[-1] if len(docs) == limit else None)
+
+    def get(self, collection, doc_id):
+        snap = self.db.collection(collection).document(doc_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    def set(self, collection, doc_id, data):
+        self.db.collection(collection).document(doc_id).set(data)
+
+    def commit(self, ops):
+        """
+        批次寫入（單一交易：get_all 讀取目前版本 + 寫入，衝突時 Firestore 自動重試交易）
+        ops：[(collection, doc_id, data, expected)]，expected 為預期的目前 updated_at（None 表示文件不存在）
+        版本不符的文件不寫入；回傳 {(collection, doc_id): 伺服器目前資料或 None}
+        """
+        from google.cloud import firestore
+
+        refs = [self.db.collection(c).document(d) for c, d, _, _ in ops]
+
+        @firestore.transactional
+        def run(tx):
+            current = {s.reference.path: (s.to_dict() if s.exists else None) for s in tx.get_all(refs)}
+            conflicts = {}
+            for ref, (c, d, data, expected) in zip(refs, ops):
+                cur = current.get(ref.path)
+                if _version(cur) != expected:
+                    conflicts[(c, d)] = cur
+                else:
+                    tx.set(ref, data)
+            return conflicts
+
+        return run(self.db.transaction(max_attempts=5))
+
+
+class MemoryBackend:
+    """
+    記憶體內的假後端（與 FirestoreBackend 相同介面），供測試 / 離線開發 / 基準量測
+    data：{collection: {doc_id: dict}}；latency：每次呼叫模擬的往返延遲（秒）
+    calls / doc_reads 記錄呼叫次數與讀取文件數（對應 Firestore 計費的讀取）；commits 記錄批次寫入次數
+    """
+
+    def __init__(self, data=None, latency=0.0):
+        self.data = {c: {k: dict(v) for k, v in docs.items()} for c, docs in (data or {}).items()}
+        self.latency = latency
+        self.calls = 0
+        self.doc_reads = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        self._orders = {}   # (collection, since) → 排序後的 key（set 時清除）
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def fetch_page(self, collection, fields=None, since=None, cursor=None, limit=PAGE_SIZE):
+        self._round_trip()
+        with self._lock:
+            docs = self.data.get(collection, {})
+            order = self._orders.get((collection, since))
+            if order is None:
+                # 同 Firestore 排序：無條件時依 doc id，增量查詢依 (updated_at, doc id)
+                if since is None:
+                    order = sorted((k,) for k in docs)
+                else:
+                    order = sorted((d[UPDATED_FIELD], k) for k, d in docs.items()
+                                   if isinstance(d.get(UPDATED_FIELD), (int, float)) and d[UPDATED_FIELD] >= since)
+                self._orders[(collection, since)] = order
+            start = 0 if cursor is None else bisect.bisect_right(order, cursor)
+            page = order[start:start + limit]
+            rows = []
+            for key in page:
+                d = docs[key[-1]]
+                rows.append((key[-1], {f: d[f] for f in fields if f in d} if fields is not None else dict(d)))
+            self.doc_reads += len(rows)
+        return rows, (page[-1] if len(page) == limit else None)
+
+    def get(self, collection, doc_id):
+        self._round_trip()
+        with self._lock:
+            self.doc_reads += 1
+            d = self.data.get(collection, {}).get(doc_id)
+            return None if d is None else dict(d)
+
+    def set(self, collection, doc_id, data):
+        self._round_trip()
+        with self._lock:
+            self.data.setdefault(collection, {})[doc_id] = dict(data)
+            self._orders = {k: v for k, v in self._orders.items() if k[0] != collection}
+
+    def commit(self, ops):
+        self._round_trip()
+        conflicts = {}
+        with self._lock:
+            self.commits += 1
+            self.doc_reads += len(ops)
+            for c, d, data, expected in ops:
+                docs = self.data.setdefault(c, {})
+                cur = docs.get(d)
+                if _version(cur) != expected:
+                    conflicts[(c, d)] = None if cur is None else dict(cur)
+                else:
+                    docs[d] = dict(data)
+            touched = {c for c, _, _, _ in ops}
+            self._orders = {k: v for k, v in self._orders.items() if k[0] not in touched}
+        return conflicts
+
+
+class LibraryIndex:
+    """
+    單一 collection 的唯讀索引（由不可變快照建立，與快照同生命週期，跨 rerun / session 共用）
+    by_name：Component → record（同名取第一筆，同原本 matched[0]）
+    prefix()：排序名稱上以 bisect 做前綴搜尋（不分大小寫）
+    range()：Power(W) / Limit(C) 範圍查詢（排序值 + bisect，第一次使用時建立）
+    options / option_names：快選清單字串與其對應的元件名稱（建立一次，不再逐 rerun 格式化）
+    updated()：本地寫入後以增量方式產生新索引（不重新排序 / 格式化整個 collection）
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.by_name = {}
+        for r in records:
+            self.by_name.setdefault(r.get("Component"), r)
+        keyed = sorted((str(n).casefold(), n) for n in self.by_name)
+        self._keys = [k for k, _ in keyed]
+        self._sorted_names = [n for _, n in keyed]
+        self._labels = {n: option_label(r) for n, r in self.by_name.items()}
+        self._finish()
+
+    def _finish(self):
+        self.names = tuple(self.by_name)
+        self.options = tuple(self._labels.values())
+        self.option_names = dict(zip(self.options, self.names))
+        self._ranges = {}
+
+    def updated(self, records, upserts=(), removed=()):
+        """
+        套用本地變更後的新索引（self 不變，仍供舊快照使用）
+        records：變更後的完整 records（順序同 dict 就地更新）；upserts：新增 / 覆蓋的 record；removed：移除的名稱
+        有同名重複的 collection 退回完整重建（維持「同名取第一筆」）
+        """
+        if len(self.by_name) != len(self.records):
+            return LibraryIndex(records)
+        new = LibraryIndex.__new__(LibraryIndex)
+        new.records = records
+        new.by_name, new._labels = dict(self.by_name), dict(self._labels)
+        new._keys, new._sorted_names = list(self._keys), list(self._sorted_names)
+        for name in removed:
+            if new.by_name.pop(name, None) is not None:
+                del new._labels[name]
+                i = bisect.bisect_left(new._keys, str(name).casefold())
+                while new._sorted_names[i] != name:
+                    i += 1
+                del new._keys[i], new._sorted_names[i]
+        for r in upserts:
+            name = r.get("Component")
+            if name not in new.by_name:
+                key = str(name).casefold()
+                i = bisect.bisect_left(new._keys, key)
+                while i < len(new._keys) and new._keys[i] == key and new._sorted_names[i] < name:
+                    i += 1
+                new._keys.insert(i, key)
+                new._sorted_names.insert(i, name)
+            new.by_name[name] = r
+            new._labels[name] = option_label(r)
+        if len(new.by_name) != len(records):
+            return LibraryIndex(records)
+        new._finish()
+        return new
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+    def version(self, name):
+        """name 在此快照中的版本（updated_at）；不存在時為 None（作為 put / delete 的 expected）"""
+        r = self.by_name.get(name)
+        return None if r is None else r.get(UPDATED_FIELD)
+
+    def prefix(self, query, limit=None):
+        """名稱以 query 開頭的元件（依名稱排序）"""
+        q = str(query).casefold()
+        i = bisect.bisect_left(self._keys, q)
+        out = []
+        while i < len(self._keys) and self._keys[i].startswith(q) and (limit is None or len(out) < limit):
+            out.append(self._sorted_names[i])
+            i += 1
+        return out
+
+    def prefix_options(self, query, limit=None):
+        """prefix() 結果對應的快選清單字串"""
+        return [option_label(self.by_name[n]) for n in self.prefix(query, limit)]
+
+    def range(self, field, lo=None, hi=None):
+        """field 值介於 [lo, hi] 的元件名稱（依值排序；缺值或非數值者不列入）"""
+        if field not in self._ranges:
+            pairs = sorted((float(r[field]), n) for n, r in self.by_name.items()
+                           if isinstance(r.get(field), (int, float)) and not isinstance(r.get(field), bool))
+            self._ranges[field] = ([v for v, _ in pairs], [n for _, n in pairs])
+        values, names = self._ranges[field]
+        a = 0 if lo is None else bisect.bisect_left(values, lo)
+        b = len(values) if hi is None else bisect.bisect_right(values, hi)
+        return names[a:b]
+
+
+class LibrarySnapshot(Mapping):
+    """
+    不可變元件庫快照：{collection: tuple(唯讀 dict)}，用法同原本的
+    st.session_state['component_library'][collection]（可迭代、item['Component']）
+    啟用欄位投影時每筆只含 PICKER_FIELDS 與 updated_at（版本，寫入時作為 expected）；
+    完整資料以 LibraryCache.record() 取得
+    version 於內容變更時遞增；synced_at 為最後同步時間（epoch 秒）
+    """
+
+    __slots__ = ("_libs", "version", "synced_at", "_indexes")
+
+    def __init__(self, libs, version=0, synced_at=None, indexes=None):
+        self._libs = libs
+        self.version = version
+        self.synced_at = synced_at
+        self._indexes = dict(indexes or {})
+
+    def index(self, collection):
+        """collection 的 LibraryIndex（第一次使用時建立並快取於快照上）"""
+        idx = self._indexes.get(collection)
+        if idx is None:
+            idx = self._indexes[collection] = LibraryIndex(self._libs[collection])
+        return idx
+
+    def __getitem__(self, collection):
+        return self._libs[collection]
+
+    def __iter__(self):
+        return iter(self._libs)
+
+    def __len__(self):
+        return len(self._libs)
+
+
+class LibraryCache:
+    """
+    行程共用的元件庫快取
+    snapshot()：回傳目前快照，超過 ttl 時先增量同步（冷啟動時阻塞；其他 session 在同步期間沿用舊快照）
+    record()：單一元件的完整資料（第一次使用時才讀取，之後快取至該文件變更為止）
+    put() / delete()：就地更新本地快照並排入 write-behind 佇列；flush() 以批次交易送出
+    pop_conflicts()：取出版本衝突（其他使用者已先修改，本地寫入未套用）
+    stats()：讀取次數 / 文件數 / 同步延遲 / 寫入批次數
+    fields：快照投影的欄位（None 表示讀取完整文件）
+    write_delay：寫入延遲秒數（None 表示每次 put / delete 立即同步送出）
+    """
+
+    def __init__(self, backend, ttl=LIBRARY_TTL_S, full_resync=FULL_RESYNC_S, collections=LIBRARY_COLLECTIONS,
+                 fields=PICKER_FIELDS, page_size=PAGE_SIZE, clock=time.time, write_delay=WRITE_DELAY_S,
+                 batch_size=MAX_BATCH_WRITES):
+        self.backend = backend
+        self.ttl = ttl
+        self.full_resync = full_resync
+        self.collections = tuple(collections)
+        self.fields = None if fields is None else tuple(fields)
+        self.page_size = page_size
+        self.clock = clock
+        self.write_delay = write_delay
+        self.batch_size = batch_size
+        self._docs = {c: {} for c in self.collections}    # doc_id → 唯讀摘要（快照內容）
+        self._stamps = {c: {} for c in self.collections}  # doc_id → updated_at（判斷完整資料是否過期）
+        self._full = {c: {} for c in self.collections}    # doc_id → 唯讀完整資料（lazy）
+        self._ids = {c: {} for c in self.collections}     # Component → doc_id
+        self._cursor = None       # 下一次增量查詢的起點（上一次同步開始時間）
+        self._last_sync = None
+        self._last_full = None
+        self._lock = threading.Lock()
+        self._snapshot = LibrarySnapshot({c: () for c in self.collections})
+        self._pending = {}        # (collection, doc_id) → 待寫入 op（同一文件合併為最後一次）
+        self._inflight = {}       # 正在 commit 的 op
+        self._conflicts = deque(maxlen=CONFLICT_HISTORY)
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._stats = {"syncs": 0, "full_syncs": 0, "queries": 0, "pages": 0, "doc_reads": 0, "record_reads": 0,
+                       "errors": 0, "total_sync_ms": 0.0, "last_sync_ms": None, "last_error": None,
+                       "snapshots_served": 0, "mutations": 0, "flushes": 0, "commits": 0, "writes": 0, "conflicts": 0,
+                       "write_errors": 0, "total_flush_ms": 0.0, "last_flush_ms": None}
+        _LIVE_CACHES.add(self)
+
+    # ---------- 讀取 ----------
+    def snapshot(self):
+        if self._last_sync is None:
+            self.sync()
+        elif self.clock() - self._last_sync >= self.ttl and self._lock.acquire(blocking=False):
+            # 已有快照：只由一個 session 同步，其餘直接沿用目前快照
+            try:
+                self._sync_locked()
+            finally:
+                self._lock.release()
+        self._stats["snapshots_served"] += 1
+        return self._snapshot
+
+    def sync(self, full=False):
+        """立即同步（full=True 強制全量）；回傳同步後的快照"""
+        with self._lock:
+            self._sync_locked(full)
+        return self._snapshot
+
+    def _fetch_collection(self, collection, since):
+        """逐頁讀取一個 collection（投影 fields + 中繼欄位）；回傳 (rows, 頁數)"""
+        fields = None if self.fields is None else tuple(dict.fromkeys(self.fields + META_FIELDS))
+        rows, pages, cursor = [], 0, None
+        while True:
+            page, cursor = self.backend.fetch_page(collection, fields=fields, since=since, cursor=cursor,
+                                                   limit=self.page_size)
+            rows.extend(page)
+            pages += 1
+            if cursor is None:
+                return rows, pages
+
+    def _sync_locked(self, full=False):
+        start = self.clock()
+        full = full or self._cursor is None or start - self._last_full >= self.full_resync
+        since = None if full else self._cursor - CLOCK_SKEW_S
+        t0 = time.perf_counter()
+        try:
+            # 三個 collection 同時讀取（各自依序分頁）
+            with ThreadPoolExecutor(max_workers=len(self.collections)) as pool:
+                fetched = list(pool.map(lambda c: self._fetch_collection(c, since), self.collections))
+        except Exception as e:
+            self._stats["errors"] += 1
+            self._stats["last_error"] = f"{type(e).__name__}: {e}"
+            if self._last_sync is None:
+                raise
+            self._last_sync = start   # 失敗時沿用舊快照，ttl 後再試
+            return
+
+        changed = {}
+        for c, (rows, pages) in zip(self.collections, fetched):
+            self._stats["queries"] += 1
+            self._stats["pages"] += pages
+            self._stats["doc_reads"] += len(rows)
+            old, stamps, full_cache = self._docs[c], self._stamps[c], self._full[c]
+            docs = {} if full else dict(old)
+            dirty = False
+            for doc_id, data in rows:
+                if self._queued(c, doc_id) is not None:
+                    continue              # 本地尚未寫入的變更優先（衝突於 commit 時判定）
+                stamp = data.get(UPDATED_FIELD)
+                if stamps.get(doc_id) != stamp:
+                    full_cache.pop(doc_id, None)
+                    stamps[doc_id] = stamp
+                if data.get(DELETED_FIELD):
+                    dirty |= docs.pop(doc_id, None) is not None
+                    continue
+                rec = _versioned(data)
+                prev = old.get(doc_id)
+                if prev is not None and prev == rec:
+                    docs[doc_id] = prev       # 內容未變：沿用原物件
+                else:
+                    docs[doc_id] = rec
+                    dirty = True
+            for key in list(self._pending) + list(self._inflight):
+                if key[0] == c:
+                    if key[1] in old:
+                        docs[key[1]] = old[key[1]]
+                    else:
+                        docs.pop(key[1], None)
+            if dirty or docs.keys() != old.keys():
+                changed[c] = docs
+
+        ms = (time.perf_counter() - t0) * 1e3
+        self._stats["syncs"] += 1
+        self._stats["full_syncs"] += full
+        self._stats["total_sync_ms"] += ms
+        self._stats["last_sync_ms"] = ms
+        self._cursor = start
+        self._last_sync = start
+        if full:
+            self._last_full = start
+        self._docs.update(changed)
+        self._publish(changed, start)
+
+    def _publish(self, changed, synced_at):
+        if changed:
+            libs = dict(self._snapshot._libs)
+            for c in changed:
+                docs = self._docs[c]
+                libs[c] = tuple(docs.values())
+                self._ids[c] = {d.get("Component"): doc_id for doc_id, d in docs.items()}
+            kept = {c: idx for c, idx in self._snapshot._indexes.items() if c not in changed}
+            self._snapshot = LibrarySnapshot(libs, self._snapshot.version + 1, synced_at, kept)
+        else:
+            self._snapshot = LibrarySnapshot(self._snapshot._libs, self._snapshot.version, synced_at,
+                                             self._snapshot._indexes)
+
+    def record(self, collection, name, with_version=False):
+        """
+        元件完整資料（可修改的 dict 複本，不含中繼欄位）；不存在或已刪除時回傳 None
+        with_version=True 時回傳 (資料, 版本)：版本為讀到的 updated_at，之後覆蓋 / 刪除時作為 expected
+        """
+        doc_id = self._ids[collection].get(name) or doc_id_for(name)
+        op = self._queued(collection, doc_id)
+        if op is not None:
+            rec = None if op["data"].get(DELETED_FIELD) else _versioned(op["data"])
+        else:
+            rec = self._full[collection].get(doc_id)
+            if rec is None:
+                data = self.backend.get(collection, doc_id)
+                self._stats["record_reads"] += 1
+                if data is not None and not data.get(DELETED_FIELD):
+                    rec = self._full[collection][doc_id] = _versioned(data)
+        out = None if rec is None else _strip_meta(rec)
+        return (out, _version(rec)) if with_version else out
+
+    # ---------- 寫入 ----------
+    def _summary(self, data):
+        if self.fields is None:
+            return _versioned(data)
+        return MappingProxyType({f: data[f] for f in self.fields + (UPDATED_FIELD,) if f in data})
+
+    def _queued(self, collection, doc_id):
+        key = (collection, doc_id)
+        return self._pending.get(key) or self._inflight.get(key)
+
+    def _apply_local(self, collection, changes):
+        """
+        就地更新 collection 的文件表並發佈新快照；changes：[(doc_id, 摘要 record 或 None 表示移除)]
+        已建立的索引以 LibraryIndex.updated() 增量更新（呼叫端持有 _lock）
+        """
+        docs, ids = self._docs[collection], self._ids[collection]
+        upserts, removed = [], []
+        for doc_id, rec in changes:
+            prev = docs.get(doc_id)
+            name = None if rec is None else rec.get("Component")
+            if prev is not None and (rec is None or prev.get("Component") != name):
+                removed.append(prev.get("Component"))
+                if ids.get(prev.get("Component")) == doc_id:
+                    del ids[prev.get("Component")]
+            if rec is None:
+                docs.pop(doc_id, None)
+            else:
+                docs[doc_id] = rec
+                ids[name] = doc_id
+                upserts.append(rec)
+        old = self._snapshot
+        libs = dict(old._libs)
+        libs[collection] = tuple(docs.values())
+        indexes = dict(old._indexes)
+        if collection in indexes:
+            indexes[collection] = indexes[collection].updated(libs[collection], upserts, removed)
+        self._snapshot = LibrarySnapshot(libs, old.version + 1, old.synced_at, indexes)
+
+    def _enqueue(self, collection, doc_id, name, data, owner, expected):
+        """
+        排入寫入佇列；回傳 (待寫入數, 衝突記錄或 None)
+        expected：呼叫端看到的版本。文件已有待寫入 / commit 中的寫入時，須為同一 owner 且 expected 等於
+        該寫入的版本（即呼叫端看過它）才合併為同一筆（保留第一筆的預期版本送出）；其他 owner 的待寫入
+        不會被取代，本次寫入不套用並回報衝突。沒有待寫入時 expected 原樣帶到 commit，由後端比對伺服器版本
+        """
+        key = (collection, doc_id)
+        queued = self._queued(collection, doc_id)
+        if queued is not None:
+            queued_version = queued["data"][UPDATED_FIELD]
+            if queued["owner"] != owner or (expected is not LATEST and expected != queued_version):
+                deleted = bool(queued["data"].get(DELETED_FIELD))
+                return len(self._pending), self._record_conflict(
+                    collection, name, data, expected, queued_version, deleted, owner)
+        elif expected is LATEST:
+            expected = self._stamps[collection].get(doc_id)
+        prev = self._pending.get(key)
+        if prev is not None:
+            expected = prev["expected"]
+        elif key in self._inflight:
+            expected = self._inflight[key]["data"][UPDATED_FIELD]
+        self._pending[key] = {"collection": collection, "doc_id": doc_id, "name": name, "data": data,
+                              "expected": expected, "owner": owner}
+        self._stats["mutations"] += 1
+        return len(self._pending), None
+
+    def _record_conflict(self, collection, name, data, expected, actual, deleted, owner):
+        conflict = {"collection": collection, "name": name,
+                    "action": "delete" if data.get(DELETED_FIELD) else "put", "expected": expected,
+                    "actual": actual, "deleted": deleted, "owner": owner}
+        self._conflicts.append(conflict)
+        self._stats["conflicts"] += 1
+        return conflict
+
+    def _after_enqueue(self, n_pending):
+        """排定送出；同步模式（write_delay=None）立即送出並回傳衝突清單"""
+        if self.write_delay is None:
+            return self.flush()
+        self._schedule(0.0 if n_pending >= self.batch_size else self.write_delay)
+        return []
+
+    @staticmethod
+    def _rejected(conflicts, collection, name, owner):
+        return any(x["collection"] == collection and x["name"] == name and x["owner"] == owner for x in conflicts)
+
+    def _schedule(self, delay):
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                if delay > 0:
+                    return            # 已有計時器：本次寫入併入同一批
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def put(self, collection, name, record, owner=None, expected=LATEST):
+        """
+        新增 / 覆蓋元件（加上 updated_at）：立即更新本地快照，寫入排入佇列
+        owner：發起者識別（如 session id），衝突時以 pop_conflicts(owner) 取回
+        expected：使用者修改時看到的版本（LibraryIndex.version() / record(with_version=True)；
+                  新增時為 None 表示文件不應存在）；版本已變時不覆蓋並回報衝突
+        回傳本次寫入的版本（之後再修改時作為 expected）；與待寫入的變更衝突時回傳 None
+        """
+        data = dict(record)
+        data.pop(DELETED_FIELD, None)
+        data[UPDATED_FIELD] = self.clock()
+        doc_id = doc_id_for(name)
+        with self._lock:
+            n, conflict = self._enqueue(collection, doc_id, name, data, owner, expected)
+            if conflict is not None:
+                return None
+            self._full[collection][doc_id] = _versioned(data)
+            self._apply_local(collection, [(doc_id, self._summary(data))])
+        if self._rejected(self._after_enqueue(n), collection, name, owner):
+            return None
+        return data[UPDATED_FIELD]
+
+    def delete(self, collection, name, owner=None, expected=LATEST):
+        """
+        刪除元件：寫入 tombstone（其他行程增量同步時移除）；立即更新本地快照，寫入排入佇列
+        owner / expected / 回傳值同 put()
+        """
+        doc_id = self._ids[collection].get(name) or doc_id_for(name)
+        data = {"Component": name, DELETED_FIELD: True, UPDATED_FIELD: self.clock()}
+        with self._lock:
+            n, conflict = self._enqueue(collection, doc_id, name, data, owner, expected)
+            if conflict is not None:
+                return None
+            self._full[collection].pop(doc_id, None)
+            self._apply_local(collection, [(doc_id, None)])
+        if self._rejected(self._after_enqueue(n), collection, name, owner):
+            return None
+        return data[UPDATED_FIELD]
+
+    def flush(self):
+        """
+        立即送出佇列（每 batch_size 筆一次 commit）；回傳本次的衝突清單
+        後端失敗時未送出的寫入放回佇列（write_delay 後重試），本地快照維持不變
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                if not self._pending:
+                    return []
+                self._inflight, self._pending = self._pending, {}
+                ops = list(self._inflight.values())
+            t0 = time.perf_counter()
+            done, results, error = 0, {}, None
+            for i in range(0, len(ops), self.batch_size):
+                part = ops[i:i + self.batch_size]
+                try:
+                    results.update(self.backend.commit(
+                        [(op["collection"], op["doc_id"], op["data"], op["expected"]) for op in part]))
+                except Exception as e:
+                    error = e
+                    break
+                self._stats["commits"] += 1
+                done += len(part)
+            with self._lock:
+                conflicts = self._resolve(ops[:done], results)
+                for op in ops[done:]:
+                    key = (op["collection"], op["doc_id"])
+                    if key in self._pending:
+                        self._pending[key]["expected"] = op["expected"]   # 較新的寫入沿用原預期版本
+                    else:
+                        self._pending[key] = op
+                self._inflight = {}
+                ms = (time.perf_counter() - t0) * 1e3
+                self._stats["flushes"] += 1
+                self._stats["total_flush_ms"] += ms
+                self._stats["last_flush_ms"] = ms
+                if error is not None:
+                    self._stats["write_errors"] += 1
+                    self._stats["last_error"] = f"{type(error).__name__}: {error}"
+            if self._pending and self.write_delay is not None:
+                self._schedule(self.write_delay)
+            return conflicts
+
+    def _resolve(self, ops, results):
+        """已 commit 的 op：成功者記錄新版本；衝突者改採伺服器版本並記錄衝突（呼叫端持有 _lock）"""
+        conflicts, local = [], {}
+        for op in ops:
+            c, doc_id = op["collection"], op["doc_id"]
+            if (c, doc_id) not in results:
+                self._stamps[c][doc_id] = op["data"][UPDATED_FIELD]
+                self._stats["writes"] += 1
+                continue
+            current = results[(c, doc_id)]
+            self._stamps[c][doc_id] = _version(current)
+            self._full[c].pop(doc_id, None)
+            if (c, doc_id) not in self._pending:
+                alive = current is not None and not current.get(DELETED_FIELD)
+                if alive:
+                    self._full[c][doc_id] = _versioned(current)
+                local.setdefault(c, []).append((doc_id, self._summary(current) if alive else None))
+            conflicts.append(self._record_conflict(
+                c, op["name"], op["data"], op["expected"], _version(current),
+                current is None or bool(current.get(DELETED_FIELD)), op["owner"]))
+        for c, changes in local.items():
+            self._apply_local(c, changes)
+        return conflicts
+
+    def pop_conflicts(self, owner=None):
+        """取出（並移除）owner 的衝突記錄；owner=None 取出全部"""
+        with self._lock:
+            mine = [x for x in self._conflicts if owner is None or x["owner"] == owner]
+            if mine:
+                self._conflicts = deque((x for x in self._conflicts if not (owner is None or x["owner"] == owner)),
+                                        maxlen=CONFLICT_HISTORY)
+        return mine
+
+    # ---------- 統計 ----------
+    def stats(self):
+        s = dict(self._stats)
+        s["mean_sync_ms"] = s["total_sync_ms"] / s["syncs"] if s["syncs"] else None
+        s["mean_flush_ms"] = s["total_flush_ms"] / s["flushes"] if s["flushes"] else None
+        s["pending_writes"] = len(self._pending) + len(self._inflight)
+        s["snapshot_version"] = self._snapshot.version
+        s["docs"] = {c: len(self._docs[c]) for c in self.collections}
+        s["age_s"] = None if self._last_sync is None else self.clock() - self._last_sync
+        return s
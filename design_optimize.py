@@ -0,0 +1,261 @@
+import numpy as np
+
+from thermal_engine import (
+    ThermalModel, drc_check_vec, DRC_RULES, calc_h_value_vec, calc_fin_count_vec,
+    DRC_AR_MAX, DRC_H_CONV_MIN, DRC_GAP_MIN, DRC_EMBED_FH_MAX, DRC_DC_FIN_T_MIN, DRC_DC_RATIO_MAX,
+)
+
+# ==============================================================================
+# 5G RRU Design Optimizer - 最小體積 / 重量設計搜尋
+#
+# 在 Tj_Margin ≥ 目標值且主頁 DRC 全數通過的條件下，搜尋 Gap、Fin_t 與機構邊距。
+# 利用模型的單調結構，只需數十次批次評估，不做暴力網格：
+#   - 固定 Fin_t 與邊距時，鰭片數 n 隨 Gap 階梯遞減；同一 n 的區間內 h 隨 Gap 上升，
+#     FH、體積、重量、AR 皆遞減，h_conv 遞增 → 每個 n 只需評估區間右端（最大 Gap）
+#   - 固定 n 時 Fin_t 越小 Gap 越大，各項皆較佳 → Embedded 取 Fin_t 下限；
+#     Die-casting 以二分法求滿足 Fin_t ≥ 3 與 FH/Fin_t ≤ 30 的最小 Fin_t
+#   - 邊距越大底面積越大、FH 越低（可行性單調）→ 二分求最小可行邊距，再以黃金分割搜尋目標最小值
+# 尺寸推算模式下散熱器恰好以瓶頸元件定尺寸，Bottleneck_Tj_Margin 只取決於元件表、T_amb 與 Margin，
+# 與 Gap / Fin_t / 邊距無關，故 Tj 目標只需檢查一次。
+# ==============================================================================
+
+OBJECTIVES = {"Volume_L": "Volume_L", "weight": "total_weight_kg", "total_weight_kg": "total_weight_kg"}
+
+DEFAULT_BOUNDS = {"Gap": (4.0, 20.0), "Fin_t": (1.0, 6.0)}
+MARGIN_KEYS = ("Top", "Btm", "Left", "Right")
+
+BISECT_ITERS = 40        # Fin_t 二分次數（區間縮至 ~1e-12 倍）
+MARGIN_BISECT_ITERS = 12
+GOLDEN_ITERS = 16
+ACTIVE_TOL = 1e-3        # 相對 slack 小於此值視為 active constraint
+GAP_EDGE_EPS = 1e-9      # mm，鰭片數斷點往區間內縮的量（確保右端點仍為 n 片）
+
+
+class _Counter:
+    """包裝 ThermalModel.evaluate 並計數批次評估次數"""
+
+    def __init__(self, model, h_model):
+        self.model = model
+        self.h_model = h_model
+        self.calls = 0
+        self.points = 0
+
+    def __call__(self, design):
+        self.calls += 1
+        self.points += len(next(iter(design.values())))
+        return self.model.evaluate(design, h_model=self.h_model)
+
+
+def _margin_values(bounds, s):
+    """邊距插值：s ∈ [0, 1] 由各邊距下限線性移到上限"""
+    return {k: lo + s * (hi - lo) for k, (lo, hi) in bounds.items()}
+
+
+def _right_end_gap(W_hsk, n, Fin_t, gap_hi):
+    """
+    n 片鰭片可用的最大 Gap（n 片總寬恰為 W_hsk），截至 gap_hi
+    斷點本身受浮點誤差影響可能算成 n-1 片，故往區間內縮 GAP_EDGE_EPS（遠小於 FIN_WIDTH_TOL）
+    """
+    return np.minimum((W_hsk - n * Fin_t) / (n - 1) - GAP_EDGE_EPS, gap_hi)
+
+
+def _fin_candidates(W_hsk, Fin_t, gap_lo, gap_hi):
+    """固定 Fin_t 時，[gap_lo, gap_hi] 內出現的各鰭片數 n 與其區間右端 Gap"""
+    n_max = int(calc_fin_count_vec(W_hsk, gap_lo, Fin_t))
+    n_min = max(int(calc_fin_count_vec(W_hsk, gap_hi, Fin_t)), 2)
+    n = np.arange(n_min, max(n_max, n_min) + 1)
+    return n, _right_end_gap(W_hsk, n, Fin_t, gap_hi)
+
+
+def _solve_fins(ev, base, W_hsk, die_casting, gap_b, fin_t_b, obj_key):
+    """
+    固定邊距下的 Gap / Fin_t 最佳化；回傳最佳點 dict（無可行解時為 None）
+    """
+    gap_lo, gap_hi = gap_b
+    t_lo, t_hi = fin_t_b
+    if die_casting:
+        t_lo = max(t_lo, DRC_DC_FIN_T_MIN)
+    if t_lo > t_hi:
+        return None
+
+    fin_tech = ev.model.params["fin_tech_selector_v2"]
+
+    def run(n, fin_t):
+        """評估每個 n 在給定 Fin_t 下的區間右端點"""
+        gap = _right_end_gap(W_hsk, n, fin_t, gap_hi)
+        design = {k: np.full(n.size, v) for k, v in base.items()}
+        design.update({"Gap": np.maximum(gap, 0.0), "Fin_t": np.broadcast_to(fin_t, n.shape).astype(float)})
+        res = ev(design)
+        code = drc_check_vec(fin_tech, design["Gap"], design["Fin_t"], res["Fin_Height"])
+        ok = (gap >= gap_lo) & (res["Fin_Count"] == n) & (res["Fin_Height"] > 0) & np.isfinite(res[obj_key])
+        return design, res, code, ok
+
+    n, _ = _fin_candidates(W_hsk, t_lo, gap_lo, gap_hi)
+    design, res, code, ok = run(n, t_lo)
+    if die_casting:
+        # 各 n 各自求滿足 FH/Fin_t ≤ 30 的最小 Fin_t（Fin_t 增加時高厚比單調遞減）
+        ratio_fail = ok & (code == 6)
+        if ratio_fail.any():
+            n_fix = n[ratio_fail]
+            lo = np.full(n_fix.size, t_lo)
+            hi = np.full(n_fix.size, t_hi)
+            for _ in range(BISECT_ITERS):
+                mid = 0.5 * (lo + hi)
+                _, r, _, _ = run(n_fix, mid)
+                pass_ratio = (r["Fin_Height"] / mid) <= DRC_DC_RATIO_MAX
+                hi = np.where(pass_ratio, mid, hi)
+                lo = np.where(pass_ratio, lo, mid)
+            # 以上界 hi（已滿足高厚比）重新評估
+            d, r, c, o = run(n_fix, hi)
+            idx = np.flatnonzero(ratio_fail)
+            for k in design:
+                design[k] = np.array(design[k], dtype=float)
+                design[k][idx] = d[k]
+            for k in res:
+                res[k] = np.array(res[k])
+                res[k][idx] = r[k]
+            code[idx], ok[idx] = c, o
+
+    feasible = ok & (code == 0)
+    if not feasible.any():
+        return None
+    obj = np.where(feasible, res[obj_key], np.inf)
+    i = int(np.argmin(obj))
+    return {
+        "design": {k: float(v[i]) for k, v in design.items()},
+        "result": ev.model.result_at(res, i),
+        "objective": float(obj[i]),
+        "at_gap_hi": bool(design["Gap"][i] >= gap_hi),
+    }
+
+
+def _slacks(p, res, die_casting, tj_target):
+    """各約束的相對 slack（≥ 0 為滿足，越接近 0 越緊）"""
+    gap, fin_t, fh = p["Gap"], p["Fin_t"], res["Fin_Height"]
+    h_conv = float(calc_h_value_vec(gap)[1])
+    s = {
+        "AR ≤ 12": (DRC_AR_MAX - fh / gap) / DRC_AR_MAX,
+        "h_conv ≥ 4": (h_conv - DRC_H_CONV_MIN) / DRC_H_CONV_MIN,
+        "Gap ≥ 4": (gap - DRC_GAP_MIN) / DRC_GAP_MIN,
+        f"Tj_Margin ≥ {tj_target:g}": (res["Bottleneck_Tj_Margin"] - tj_target) / max(abs(tj_target), 1.0),
+    }
+    if die_casting:
+        s["Die-casting Fin_t ≥ 3"] = (fin_t - DRC_DC_FIN_T_MIN) / DRC_DC_FIN_T_MIN
+        s["Die-casting FH/Fin_t ≤ 30"] = (DRC_DC_RATIO_MAX - fh / fin_t) / DRC_DC_RATIO_MAX
+    else:
+        s["Embedded FH ≤ 100"] = (DRC_EMBED_FH_MAX - fh) / DRC_EMBED_FH_MAX
+    return s
+
+
+def optimize_design(global_params, df_components, objective="Volume_L", tj_margin_target=0.0,
+                    bounds=None, h_model="constant"):
+    """
+    最小化 Volume_L（或 weight）：Bottleneck_Tj_Margin ≥ tj_margin_target 且 DRC 全數通過
+    bounds: {變數: (下限, 上限)}；Gap / Fin_t 未給時用 DEFAULT_BOUNDS，
+            Top/Btm/Left/Right 有給才列為變數（四邊一同由下限往上限移動）
+    回傳 dict：feasible, design（最佳變數值）, results（同 compute_key_results 格式）,
+              objective, active_constraint, slacks, evaluations（批次呼叫次數）, points（評估點數）
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective 需為 {sorted(OBJECTIVES)} 之一")
+    obj_key = OBJECTIVES[objective]
+    bounds = dict(bounds or {})
+    unknown = set(bounds) - set(DEFAULT_BOUNDS) - set(MARGIN_KEYS)
+    if unknown:
+        raise KeyError(f"不支援的最佳化變數: {sorted(unknown)}")
+    for k, (lo, hi) in bounds.items():
+        if not lo <= hi:
+            raise ValueError(f"{k} 範圍需滿足下限 ≤ 上限")
+    gap_b = bounds.get("Gap", DEFAULT_BOUNDS["Gap"])
+    fin_t_b = bounds.get("Fin_t", DEFAULT_BOUNDS["Fin_t"])
+    margin_b = {k: bounds[k] for k in MARGIN_KEYS if k in bounds}
+
+    p = dict(global_params)
+    p.setdefault("Slope", 0.03)
+    die_casting = "Embedded" not in p["fin_tech_selector_v2"]
+    ev = _Counter(ThermalModel(p, df_components), h_model)
+
+    def infeasible(reason):
+        return {"feasible": False, "design": None, "results": None, "objective": None,
+                "active_constraint": reason, "slacks": {}, "evaluations": ev.calls, "points": ev.points}
+
+    # Tj 目標：與幾何無關，先檢查一次
+    base_res = ev.model.result_at(ev({"Gap": np.array([float(p["Gap"])])}), 0)
+    if base_res["Total_Power"] <= 0:
+        return infeasible("無功耗元件，無需散熱設計")
+    if base_res["Bottleneck_Tj_Margin"] < tj_margin_target:
+        return infeasible(f"Tj_Margin ≥ {tj_margin_target:g}（目前 {base_res['Bottleneck_Tj_Margin']:.1f}°C，"
+                          f"與鰭片幾何無關，需調整 Margin、T_amb 或元件）")
+
+    def solve(s):
+        m = _margin_values(margin_b, s)
+        q = {**p, **m}
+        W_hsk = q["W_pcb"] + q["Top"] + q["Btm"]
+        return _solve_fins(ev, m, W_hsk, die_casting, gap_b, fin_t_b, obj_key)
+
+    if not margin_b:
+        best = solve(0.0)
+        s_best = None
+    else:
+        # 可行性隨邊距單調：二分最小可行邊距，再於可行區間以黃金分割找目標最小值
+        best = solve(0.0)
+        s_lo = 0.0
+        if best is None:
+            if solve(1.0) is None:
+                return infeasible("邊距放到上限仍無可行解（DRC 無法滿足）")
+            lo, hi = 0.0, 1.0
+            for _ in range(MARGIN_BISECT_ITERS):
+                mid = 0.5 * (lo + hi)
+                if solve(mid) is None:
+                    lo = mid
+                else:
+                    hi = mid
+            s_lo = hi
+            best = solve(s_lo)
+        s_best = s_lo
+        phi = (np.sqrt(5) - 1) / 2
+        a, b = s_lo, 1.0
+        c, d = b - phi * (b - a), a + phi * (b - a)
+        fc, fd = solve(c), solve(d)
+        val = lambda r: np.inf if r is None else r["objective"]
+        for _ in range(GOLDEN_ITERS):
+            if val(fc) <= val(fd):
+                b, d, fd = d, c, fc
+                c = b - phi * (b - a)
+                fc = solve(c)
+            else:
+                a, c, fc = c, d, fd
+                d = a + phi * (b - a)
+                fd = solve(d)
+        for s, r in ((c, fc), (d, fd), (1.0, solve(1.0))):
+            if val(r) < val(best):
+                best, s_best = r, s
+
+    if best is None:
+        return infeasible("範圍內無滿足 DRC 的 Gap / Fin_t 組合")
+
+    design = best["design"]
+    q = {**p, **design}
+    slacks = _slacks(q, best["result"], die_casting, tj_margin_target)
+    # Tj 約束與幾何無關（已事先檢查），active constraint 只在設計變數可影響的約束中判斷
+    geometric = {k: v for k, v in slacks.items() if not k.startswith("Tj_Margin")}
+    name, tight = min(geometric.items(), key=lambda kv: kv[1])
+    if tight <= ACTIVE_TOL:
+        active = name
+    elif margin_b and s_best is not None and 0 < s_best < 1:
+        active = "邊距（目標函數內部最小值）"
+    elif best["at_gap_hi"]:
+        active = f"Gap ≤ {gap_b[1]:g}（變數上限）"
+    else:
+        active = f"鰭片數階梯（n = {best['result']['Fin_Count']}，再加大 Gap 將少一片）"
+    return {
+        "feasible": True,
+        "design": design,
+        "results": best["result"],
+        "objective": best["objective"],
+        "active_constraint": active,
+        "drc_rule": DRC_RULES[0],
+        "slacks": slacks,
+        "evaluations": ev.calls,
+        "points": ev.points,
+    }
@@ -0,0 +1,215 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from thermal_engine import (
+    KERNEL_PARAMS, ThermalModel, compute_key_results_batch, drc_check_vec, DRC_RULES,
+)
+
+# ==============================================================================
+# 5G RRU Design-Space Sweep - 多維設計空間掃描
+#
+# 任意 global 參數組合（Gap, Fin_t, T_amb, L_pcb, W_pcb, Top/Btm/Left/Right, H_filter, Margin…）
+# 的全因子網格或自訂格點，分塊 (chunk) 評估以限制記憶體，並可逐塊寫入 CSV / Parquet。
+# ==============================================================================
+
+# 除 global 參數外可掃描的虛擬變數（同敏感度分析的功耗縮放）
+EXTRA_SWEEP_KEYS = ("power_scale",)
+
+# 結果表欄位：掃描軸 + 以下
+RESULT_COLUMNS = ["Volume_L", "total_weight_kg", "Fin_Height", "Fin_Count",
+                  "Tj_Margin", "Bottleneck", "Total_Power", "DRC_fail", "DRC_rule"]
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+KERNEL_PARAMS_SET = frozenset(KERNEL_PARAMS)
+
+
+class DesignGrid:
+    """
+    設計點集合：全因子網格（axes）或自訂格點（points），可依序分塊取出而不展開全部點
+    axes: {參數名: 值序列}，點數 = 各軸長度乘積，最後一軸變化最快（同 itertools.product）
+    points: DataFrame / {參數名: 等長陣列}，逐列為一個設計點
+    非數值軸（如 fin_tech_selector_v2）於外層展開，每個值各為一個子網格
+    """
+
+    def __init__(self, axes=None, points=None):
+        if (axes is None) == (points is None):
+            raise ValueError("axes 與 points 需擇一指定")
+        self.numeric_axes = {}
+        self.category_axes = {}
+        self.points = None
+        if axes is not None:
+            for k, v in dict(axes).items():
+                values = list(np.atleast_1d(np.asarray(v, dtype=object)))
+                if not values:
+                    raise ValueError(f"掃描軸 {k!r} 沒有任何值")
+                if all(isinstance(x, (int, float, np.integer, np.floating)) and not isinstance(x, bool) for x in values):
+                    self.numeric_axes[k] = np.asarray(values, dtype=float)
+                else:
+                    self.category_axes[k] = values
+            self.shape = tuple(len(v) for v in self.numeric_axes.values())
+            n_numeric = int(np.prod(self.shape, dtype=np.int64))
+        else:
+            df = points if isinstance(points, pd.DataFrame) else pd.DataFrame(dict(points))
+            num = df.select_dtypes(include="number")
+            self.points = {k: np.asarray(num[k], dtype=float) for k in num.columns}
+            self.category_axes = {}
+            self.point_categories = {k: np.asarray(df[k], dtype=object) for k in df.columns if k not in num.columns}
+            self.shape = (len(df),)
+            n_numeric = len(df)
+        self.n_categories = int(np.prod([len(v) for v in self.category_axes.values()], dtype=np.int64))
+        self.size = n_numeric * self.n_categories
+
+    @property
+    def keys(self):
+        """掃描參數名（類別軸在前）"""
+        if self.points is not None:
+            return list(self.point_categories) + list(self.points)
+        return list(self.category_axes) + list(self.numeric_axes)
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """依序產生 (類別參數 dict, 數值設計 dict of arrays, 點數)，每塊至多 chunk_size 點"""
+        chunk_size = int(chunk_size)
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 需為正整數")
+        if self.points is not None:
+            yield from self._point_chunks(chunk_size)
+            return
+        n = int(np.prod(self.shape, dtype=np.int64))
+        names = list(self.numeric_axes)
+        for combo in itertools.product(*self.category_axes.values()):
+            cats = dict(zip(self.category_axes, combo))
+            for start in range(0, n, chunk_size):
+                flat = np.arange(start, min(start + chunk_size, n))
+                idx = np.unravel_index(flat, self.shape) if names else ()
+                yield cats, {k: self.numeric_axes[k][i] for k, i in zip(names, idx)}, len(flat)
+
+    def _point_chunks(self, chunk_size):
+        """自訂格點：類別欄位相同的連續列歸為同一塊（維持原順序）"""
+        n = self.shape[0]
+        cat_names = list(self.point_categories)
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            if not cat_names:
+                yield {}, {k: v[start:stop] for k, v in self.points.items()}, stop - start
+                continue
+            keys = list(zip(*(self.point_categories[k][start:stop] for k in cat_names)))
+            run_start = 0
+            for i in range(1, len(keys) + 1):
+                if i == len(keys) or keys[i] != keys[run_start]:
+                    a, b = start + run_start, start + i
+                    yield dict(zip(cat_names, keys[run_start])), {k: v[a:b] for k, v in self.points.items()}, b - a
+                    run_start = i
+
+
+def _evaluate_chunk(global_params, df_components, cats, design, n, h_model, model_cache):
+    """評估一塊設計點，回傳 tidy DataFrame（掃描軸欄位 + RESULT_COLUMNS）"""
+    p = dict(global_params)
+    p.update(cats)
+    design = dict(design)
+    power_scale = design.pop("power_scale", None)
+
+    # 同一組類別參數共用預編譯模型（元件熱阻只算一次）；掃描到熱阻參數時以 batch 廣播重算
+    key = tuple(sorted(cats.items()))
+    model = model_cache.get(key)
+    if model is None:
+        model = model_cache[key] = ThermalModel(p, df_components)
+    point_design = design or {"T_amb": np.full(n, float(p["T_amb"]))}
+    if KERNEL_PARAMS_SET.isdisjoint(k for k in design if k != "T_amb"):
+        res = model.evaluate(point_design, power_scale=power_scale, h_model=h_model)
+    else:
+        res = compute_key_results_batch(p, df_components, design=point_design,
+                                        power_scale=power_scale, h_model=h_model)
+    names = model.bottleneck_names(res["Bottleneck_Index"])
+
+    full = lambda v: np.broadcast_to(v, (n,))
+    drc_code = drc_check_vec(p["fin_tech_selector_v2"], full(design.get("Gap", p["Gap"])),
+                             full(design.get("Fin_t", p["Fin_t"])), res["Fin_Height"])
+    out = {k: np.full(n, v, dtype=object) for k, v in cats.items()}
+    out.update({k: full(v) for k, v in design.items()})
+    if power_scale is not None:
+        out["power_scale"] = full(power_scale)
+    out.update({
+        "Volume_L": res["Volume_L"],
+        "total_weight_kg": res["total_weight_kg"],
+        "Fin_Height": res["Fin_Height"],
+        "Fin_Count": res["Fin_Count"],
+        "Tj_Margin": res["Bottleneck_Tj_Margin"],
+        "Bottleneck": names,
+        "Total_Power": res["Total_Power"],
+        "DRC_fail": drc_code > 0,
+        "DRC_rule": drc_code,
+    })
+    return pd.DataFrame(out)
+
+
+def iter_grid_sweep(global_params, df_components, axes=None, points=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, h_model="constant"):
+    """
+    逐塊產生掃描結果 DataFrame（記憶體上限約 chunk_size × 元件數）
+    可掃描 global_params 內任意參數與 power_scale；未列出的參數沿用 global_params
+    """
+    grid = axes if isinstance(axes, DesignGrid) else DesignGrid(axes=axes, points=points)
+    unknown = [k for k in grid.keys if k not in global_params and k not in EXTRA_SWEEP_KEYS]
+    if unknown:
+        raise KeyError(f"未知的掃描參數: {unknown}")
+    p = dict(global_params)
+    p.setdefault("Slope", 0.03)
+    model_cache = {}
+    for cats, design, n in grid.chunks(chunk_size):
+        yield _evaluate_chunk(p, df_components, cats, design, n, h_model, model_cache)
+
+
+def run_grid_sweep(global_params, df_components, axes=None, points=None, out_path=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, h_model="constant", progress=None):
+    """
+    執行多維掃描：
+    out_path 為 None 時回傳完整 DataFrame；
+    否則逐塊寫入 .csv 或 .parquet（需 pyarrow）並回傳總點數，不在記憶體中保留全部結果
+    progress(done, total)：每塊完成後回呼
+    """
+    grid = axes if isinstance(axes, DesignGrid) else DesignGrid(axes=axes, points=points)
+    chunks = iter_grid_sweep(global_params, df_components, grid, chunk_size=chunk_size, h_model=h_model)
+
+    if out_path is None:
+        frames = []
+        for df in chunks:
+            frames.append(df)
+            if progress:
+                progress(sum(len(f) for f in frames), grid.size)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=grid.keys + RESULT_COLUMNS)
+
+    ext = os.path.splitext(str(out_path))[1].lower()
+    if ext not in (".csv", ".parquet"):
+        raise ValueError(f"不支援的輸出格式 {ext!r}（僅 .csv / .parquet）")
+    writer = None
+    done = 0
+    try:
+        for df in chunks:
+            if ext == ".csv":
+                df.to_csv(out_path, mode="w" if done == 0 else "a", header=done == 0, index=False)
+            else:
+                try:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                except ImportError as e:
+                    raise ImportError("輸出 Parquet 需要安裝 pyarrow") from e
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            done += len(df)
+            if progress:
+                progress(done, grid.size)
+    finally:
+        if writer is not None:
+            writer.close()
+    return done
+
+
+def drc_rule_names(codes):
+    """DRC 規則代碼 → 說明文字"""
+    return pd.Series(codes).map(DRC_RULES)
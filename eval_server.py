@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_eval import COMPONENT_SECTIONS, load_default_params
+from thermal_engine import NUMERIC_COMPONENT_COLUMNS, ThermalModel, _tc_limited_arrays
+
+# ==============================================================================
+# 5G RRU Eval Server - 本機 HTTP/JSON 計算服務（asyncio，僅標準函式庫）
+#
+# POST /evaluate  單一設計（或 {"requests": [...]}）→ compute_key_results 格式結果；
+#                 同一時間窗內到達的請求依 (元件表, 熱阻參數, 製程) 分組，以 ThermalModel 一次向量化計算
+# POST /sweep     多維設計空間掃描（design_sweep），派送至 worker process pool
+# GET  /metrics   延遲 (p50 / p99)、吞吐量、batch 大小等統計
+# GET  /health
+# 只允許綁定 loopback 位址，不依賴任何雲端服務。
+# 用法：python eval_server.py --port 8765
+# ==============================================================================
+
+DEFAULT_PORT = 8765
+DEFAULT_BATCH_WINDOW = 0.002    # 秒；第一個請求到達後等待合併的時間窗
+DEFAULT_MAX_BATCH = 2048        # 單一 batch 上限（達到即立即計算）
+MODEL_CACHE_SIZE = 128          # ThermalModel LRU 快取（元件表 × 熱阻參數組合）
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_SWEEP_POINTS = 1_000_000
+LATENCY_WINDOW = 20_000         # 延遲統計保留的最近請求數
+THROUGHPUT_WINDOW = 10.0        # 秒；吞吐量以最近此時間窗計算
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _check_loopback(host):
+    """只允許本機位址（localhost / 127.0.0.0/8 / ::1）"""
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror as e:
+        raise ValueError(f"無法解析主機 {host!r}") from e
+    if not all(ipaddress.ip_address(info[4][0]).is_loopback for info in infos):
+        raise ValueError(f"eval server 只能綁定本機位址，{host!r} 不是 loopback")
+
+
+def request_components(req):
+    """
+    請求中的元件表：
+    "components": [ComponentRecord（可含 _src）]，或同專案檔的 rf_data / digital_data / pwr_data
+    回傳 (component_arrays 格式 dict 或 None, tc_limited, 快取 key)
+    """
+    if "components" in req:
+        rows = list(req["components"] or [])
+        src = [r.get("_src") for r in rows]
+    else:
+        rows, src = [], []
+        for key, tag in COMPONENT_SECTIONS:
+            items = req.get(key) or []
+            rows.extend(items)
+            src.extend([tag] * len(items))
+    key = json.dumps([rows, src], sort_keys=True, ensure_ascii=False)
+    if not rows:
+        return None, None, key
+    c = {col: np.array([r[col] for r in rows], dtype=float) for col in NUMERIC_COMPONENT_COLUMNS}
+    for col in ("Component", "Board_Type", "TIM_Type"):
+        c[col] = np.array([r[col] for r in rows], dtype=object)
+    return c, _tc_limited_arrays(c["Component"], np.array(src, dtype=object)), key
+
+
+def _sweep_job(global_params, components, axes, h_model):
+    """worker 行程：執行 design_sweep 並回傳欄位 list"""
+    import pandas as pd
+    from design_sweep import run_grid_sweep
+    df = pd.DataFrame(components) if components else pd.DataFrame(
+        columns=NUMERIC_COMPONENT_COLUMNS + ["Component", "Board_Type", "TIM_Type"])
+    out = run_grid_sweep(global_params, df, axes=axes, h_model=h_model)
+    return {k: out[k].tolist() for k in out.columns}
+
+
+class Metrics:
+    """請求延遲 / 吞吐量 / batch 統計（僅事件迴圈執行緒存取）"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {}
+        self.errors = 0
+        self.points = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.sweeps = 0
+        self.sweep_points = 0
+        self._latency = deque(maxlen=LATENCY_WINDOW)   # (完成時間, 延遲秒)
+
+    def record(self, route, latency, ok=True):
+        self.requests[route] = self.requests.get(route, 0) + 1
+        self.errors += not ok
+        self._latency.append((time.monotonic(), latency))
+
+    def record_batch(self, n):
+        self.batches += 1
+        self.points += n
+        self.max_batch_seen = max(self.max_batch_seen, n)
+
+    def snapshot(self, in_flight=0):
+        now = time.monotonic()
+        lat = np.array([l for _, l in self._latency]) * 1e3
+        recent = sum(1 for t, _ in self._latency if t >= now - THROUGHPUT_WINDOW)
+        pct = (lambda q: float(np.percentile(lat, q)) if lat.size else None)
+        return {
+            "uptime_s": time.time() - self.started,
+            "requests": dict(self.requests),
+            "errors": self.errors,
+            "in_flight": in_flight,
+            "latency_ms": {"p50": pct(50), "p90": pct(90), "p99": pct(99), "max": float(lat.max()) if lat.size else None,
+                           "window": int(lat.size)},
+            "throughput_rps": recent / THROUGHPUT_WINDOW,
+            "evaluations": self.points,
+            "batches": self.batches,
+            "mean_batch_size": self.points / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "sweeps": self.sweeps,
+            "sweep_points": self.sweep_points,
+        }
+
+
+class EvalServer:
+    """
+    本機計算服務；evaluate() 亦可在同一事件迴圈內直接呼叫（不經 HTTP）
+    batch_window: 合併時間窗（秒）；max_batch: 單批上限；workers: sweep 用 process 數
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, workers=None, defaults=None):
+        _check_loopback(host)
+        self.host, self.port = host, port
+        self.batch_window = batch_window
+        self.max_batch = max(int(max_batch), 1)
+        self.workers = max(int(workers or os.cpu_count() or 1), 1)
+        self.defaults = load_default_params() if defaults is None else dict(defaults)
+        self.metrics = Metrics()
+        self._pending = []
+        self._flush_handle = None
+        self._models = OrderedDict()
+        self._pool = None
+        self._server = None
+        self._in_flight = 0
+        self._conns = {}   # 連線 task → writer（關閉時逐一結束）
+
+    # ------------------------------------------------------------------
+    # 請求合併 (micro-batching)
+    # ------------------------------------------------------------------
+    def evaluate(self, req):
+        """送出一個設計點，回傳 awaitable（結果 dict 同 compute_key_results）"""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((req, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return fut
+
+    def _model(self, params, c, tc_limited, comp_key, other):
+        """依 (元件表, 熱阻參數, 非數值參數) 取用 / 建立 ThermalModel（LRU）"""
+        kernel = tuple((k, params[k]) for k in sorted(ThermalModel.SCAN_PARAMS_EXCLUDED) if k in params)
+        key = (comp_key, kernel, other)
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = ThermalModel.from_arrays(params, c, tc_limited)
+            while len(self._models) > MODEL_CACHE_SIZE:
+                self._models.popitem(last=False)
+        else:
+            self._models.move_to_end(key)
+        return model
+
+    def _flush(self):
+        """計算目前累積的請求：依 (模型, 參數鍵集合) 分組，每組一次 ThermalModel.evaluate"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        groups = {}
+        for req, fut in pending:
+            try:
+                params = dict(self.defaults)
+                params.update(req.get("global_params") or {})
+                c, tc_limited, comp_key = request_components(req)
+                numeric = {k: v for k, v in params.items() if k not in ThermalModel.SCAN_PARAMS_EXCLUDED
+                           and isinstance(v, (int, float)) and not isinstance(v, bool)}
+                other = tuple(sorted((k, str(v)) for k, v in params.items()
+                                     if k not in numeric and k not in ThermalModel.SCAN_PARAMS_EXCLUDED))
+                model = self._model(params, c, tc_limited, comp_key, other)
+                area = req.get("Area_fixed_m2")
+                gkey = (id(model), tuple(sorted(numeric)))
+                groups.setdefault(gkey, (model, []))[1].append((numeric, np.nan if area is None else float(area), fut))
+            except Exception as e:
+                fut.set_exception(HTTPError(400, f"{type(e).__name__}: {e}"))
+        for model, items in groups.values():
+            design = {k: np.array([num[k] for num, _, _ in items], dtype=float) for k in items[0][0]}
+            area = np.array([a for _, a, _ in items])
+            try:
+                res = model.evaluate(design, Area_fixed_m2=area if np.isfinite(area).any() else None)
+            except Exception as e:
+                for _, _, fut in items:
+                    fut.set_exception(HTTPError(400, f"{type(e).__name__}: {e}"))
+                continue
+            self.metrics.record_batch(len(items))
+            for i, (_, _, fut) in enumerate(items):
+                if not fut.done():
+                    fut.set_result(model.result_at(res, i))
+
+    # ------------------------------------------------------------------
+    # 大型掃描 → process pool
+    # ------------------------------------------------------------------
+    async def sweep(self, req):
+        axes = req.get("axes") or {}
+        n = int(np.prod([len(v) if isinstance(v, (list, tuple)) else 1 for v in axes.values()], dtype=np.int64))
+        if n > MAX_SWEEP_POINTS:
+            raise HTTPError(413, f"掃描點數 {n} 超過上限 {MAX_SWEEP_POINTS}")
+        params = dict(self.defaults)
+        params.update(req.get("global_params") or {})
+        comps = req.get("components")
+        if comps is None:
+            comps = [dict(r, _src=tag) for key, tag in COMPONENT_SECTIONS for r in (req.get(key) or [])]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        try:
+            out = await loop.run_in_executor(self._pool, _sweep_job, params, comps, axes,
+                                             req.get("h_model", "constant"))
+        except (KeyError, ValueError) as e:
+            raise HTTPError(400, f"{type(e).__name__}: {e}")
+        self.metrics.sweeps += 1
+        self.metrics.sweep_points += n
+        return {"n_points": n, "columns": out}
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+    async def _route(self, method, path, body):
+        if path == "/health":
+            return {"status": "ok"}
+        if path == "/metrics":
+            return self.metrics.snapshot(self._in_flight)
+        if path not in ("/evaluate", "/sweep"):
+            raise HTTPError(404, f"未知路徑 {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} 僅接受 POST")
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"JSON 格式錯誤: {e}")
+        if path == "/sweep":
+            return await self.sweep(req)
+        if isinstance(req, dict) and "requests" in req:
+            futs = [self.evaluate(r) for r in req["requests"]]
+            return {"results": list(await asyncio.gather(*futs))}
+        return await self.evaluate(req)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._conns[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                t0 = time.perf_counter()
+                self._in_flight += 1
+                path = target.split("?", 1)[0]
+                try:
+                    if length > MAX_BODY_BYTES:
+                        raise HTTPError(413, "請求內容過大")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = 200, await self._route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                finally:
+                    self._in_flight -= 1
+                if path in ("/evaluate", "/sweep"):
+                    self.metrics.record(path, time.perf_counter() - t0, ok=status == 200)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive or status == 413:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._conns.pop(task, None)
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # 關閉閒置中的 keep-alive 連線，等待各連線 task 自然結束
+            tasks = list(self._conns)
+            for w in self._conns.values():
+                w.transport.abort()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="5G RRU 本機計算服務（HTTP/JSON，自動合併同時到達的請求）")
+    parser.add_argument("--host", default="127.0.0.1", help="綁定位址（僅限 loopback）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1e3, help="請求合併時間窗 (ms)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="單一 batch 上限")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="sweep worker 行程數（預設 CPU 數）")
+    args = parser.parse_args(argv)
+    server = EvalServer(args.host, args.port, batch_window=args.window_ms / 1e3, max_batch=args.max_batch,
+                        workers=args.workers)
+
+    async def run():
+        await server.start()
+        print(f"eval server listening on http://{server.host}:{server.port}", file=sys.stderr, flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from component_library import (
+    CLOCK_SKEW_S, DELETED_FIELD, FULL_RESYNC_S, LIBRARY_COLLECTIONS, LIBRARY_TTL_S, MAX_BATCH_WRITES, PAGE_SIZE,
+    UPDATED_FIELD, _version,
+)
+
+# ==============================================================================
+# 5G RRU Local Store - 離線元件庫 / 專案儲存（SQLite）
+#
+# SqliteBackend 與 FirestoreBackend 介面相同（fetch_page / get / set / commit），
+# 可直接放在 LibraryCache 之下：Firebase 無法初始化時 app.py 改用本機資料庫，
+# 快選清單、索引、write-behind 寫入與線上模式完全相同；測試也可對真實資料庫執行（不需網路）。
+# 資料表：
+#   library  ：三個元件庫（collection 即類別），name / power / updated_at 為索引欄位，完整文件存 JSON
+#   journal  ：本機寫入的同步日誌（含寫入時的預期版本），reconcile() 時以版本檢查推送至 Firestore
+#   projects ：本機儲存的專案（同「儲存專案」下載的 JSON 內容）
+#   sync_state：各 collection 從 Firestore 拉取的增量游標
+# LibraryMirror 於線上時定期在背景拉取 Firestore，第一次斷線時本機即有完整元件庫；
+# 每 FULL_RESYNC_S 秒（及手動同步時）全量重讀，補上增量查詢看不到的硬刪除與舊時間戳記寫入。
+# ==============================================================================
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rru_local.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS library (
+    collection TEXT NOT NULL,
+    doc_id     TEXT NOT NULL,
+    name       TEXT COLLATE NOCASE,
+    power      REAL,
+    updated_at REAL,
+    deleted    INTEGER NOT NULL DEFAULT 0,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS library_name    ON library (collection, name);
+CREATE INDEX IF NOT EXISTS library_power   ON library (collection, power);
+CREATE INDEX IF NOT EXISTS library_updated ON library (collection, updated_at, doc_id);
+CREATE TABLE IF NOT EXISTS journal (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    doc_id     TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    expected   REAL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (
+    name       TEXT PRIMARY KEY,
+    version    TEXT,
+    updated_at REAL NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    cursor     REAL
+);
+"""
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class SqliteBackend:
+    """
+    本機 SQLite 元件庫（LibraryCache 後端）+ 專案儲存 + 同步日誌
+    path：資料庫檔案（":memory:" 為記憶體資料庫，供測試）；單一連線以 lock 保護，可跨 thread 使用
+    journal=True 時 set / commit 的寫入記入 journal，待 reconcile() 推送至 Firestore
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, journal=True, clock=time.time):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.journal = journal
+        self.clock = clock
+        self.calls = 0
+        self.doc_reads = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()   # reconcile / push / pull 不同時進行
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")      # 多個行程可同時讀取
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 元件庫（LibraryCache 後端介面）----------
+    def fetch_page(self, collection, fields=None, since=None, cursor=None, limit=PAGE_SIZE):
+        """同 FirestoreBackend.fetch_page：無條件時依 doc id 排序，增量查詢依 (updated_at, doc id)"""
+        if since is None:
+            sql, args = "SELECT doc_id, data FROM library WHERE collection = ?", [collection]
+            if cursor is not None:
+                sql += " AND doc_id > ?"
+                args.append(cursor[-1])
+            sql += " ORDER BY doc_id LIMIT ?"
+        else:
+            sql, args = "SELECT doc_id, data, updated_at FROM library WHERE collection = ? AND updated_at >= ?", \
+                        [collection, since]
+            if cursor is not None:
+                sql += " AND (updated_at, doc_id) > (?, ?)"
+                args.extend(cursor)
+            sql += " ORDER BY updated_at, doc_id LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            self.calls += 1
+            found = self._conn.execute(sql, args).fetchall()
+            self.doc_reads += len(found)
+        rows = []
+        for row in found:
+            d = json.loads(row[1])
+            rows.append((row[0], {f: d[f] for f in fields if f in d} if fields is not None else d))
+        if len(found) < limit:
+            return rows, None
+        last = found[-1]
+        return rows, ((last[0],) if since is None else (last[2], last[0]))
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            self.calls += 1
+            self.doc_reads += 1
+            row = self._conn.execute("SELECT data FROM library WHERE collection = ? AND doc_id = ?",
+                                     (collection, doc_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, collection, doc_id, data):
+        with self._lock:
+            self.calls += 1
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                expected = self._current_version(collection, doc_id)[1]
+                self._write(collection, doc_id, data, expected if self.journal else False)
+
+    def commit(self, ops):
+        """
+        同 FirestoreBackend.commit：單一交易內檢查版本並寫入，回傳 {(collection, doc_id): 目前資料或 None}
+        """
+        conflicts = {}
+        with self._lock:
+            self.calls += 1
+            self.commits += 1
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for c, d, data, expected in ops:
+                    found, version = self._current_version(c, d)
+                    if version != expected:
+                        conflicts[(c, d)] = found
+                    else:
+                        self._write(c, d, data, expected if self.journal else False)
+                self.doc_reads += len(ops)
+        return conflicts
+
+    def _current_version(self, collection, doc_id):
+        row = self._conn.execute("SELECT data FROM library WHERE collection = ? AND doc_id = ?",
+                                 (collection, doc_id)).fetchone()
+        found = None if row is None else json.loads(row[0])
+        return found, _version(found)
+
+    def _write(self, collection, doc_id, data, expected=False):
+        """寫入一筆（呼叫端持有 lock 且在交易內）；expected 不為 False 時同時記入 journal"""
+        text = json.dumps(data, ensure_ascii=False)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO library (collection, doc_id, name, power, updated_at, deleted, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (collection, doc_id, data.get("Component"), _number(data.get("Power(W)")),
+             _number(data.get(UPDATED_FIELD)), int(bool(data.get(DELETED_FIELD))), text))
+        if expected is not False:
+            self._conn.execute("INSERT INTO journal (collection, doc_id, data, expected, created_at) "
+                               "VALUES (?, ?, ?, ?, ?)", (collection, doc_id, text, expected, self.clock()))
+
+    # ---------- 索引查詢 ----------
+    def search(self, collection, prefix=None, power_min=None, power_max=None, limit=None):
+        """
+        以索引欄位查詢元件（不含已刪除）：名稱前綴（不分大小寫）與功耗範圍；回傳完整文件（依名稱排序）
+        """
+        sql, args = "SELECT data FROM library WHERE collection = ? AND deleted = 0", [collection]
+        if prefix:
+            sql += " AND name LIKE ? ESCAPE '\\'"
+            args.append(prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if power_min is not None:
+            sql += " AND power >= ?"
+            args.append(power_min)
+        if power_max is not None:
+            sql += " AND power <= ?"
+            args.append(power_max)
+        sql += " ORDER BY name"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            self.calls += 1
+            return [json.loads(r[0]) for r in self._conn.execute(sql, args)]
+
+    def counts(self):
+        """{collection: 未刪除的元件數}"""
+        with self._lock:
+            found = dict(self._conn.execute(
+                "SELECT collection, COUNT(*) FROM library WHERE deleted = 0 GROUP BY collection"))
+        return {c: found.get(c, 0) for c in dict.fromkeys(LIBRARY_COLLECTIONS + tuple(found))}
+
+    # ---------- 同步日誌 ----------
+    def pending(self):
+        """journal 中尚未推送的文件數"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT collection || '/' || doc_id) FROM journal").fetchone()[0]
+
+    def _journal_ops(self):
+        """
+        journal 合併為每個文件一筆 op：資料取最後一次寫入，預期版本取第一次（離線修改時看到的版本）
+        回傳 (ops, 最大 seq)
+        """
+        ops, max_seq = {}, 0
+        with self._lock:
+            for seq, c, d, text, expected in self._conn.execute(
+                    "SELECT seq, collection, doc_id, data, expected FROM journal ORDER BY seq"):
+                first = ops.get((c, d))
+                ops[(c, d)] = (c, d, json.loads(text), expected if first is None else first[3])
+                max_seq = seq
+        return list(ops.values()), max_seq
+
+    def reconcile(self, remote, collections=LIBRARY_COLLECTIONS, batch_size=MAX_BATCH_WRITES, full=False):
+        """
+        與 Firestore（或任何相同介面的後端）雙向同步：先 push() 再 pull()（full 見 pull()）
+        回傳 {"pushed", "conflicts": [{"collection", "doc_id", "name"}], "pulled", "removed"}
+        """
+        with self._sync_lock:
+            result = self._push(remote, batch_size)
+            result["pulled"], result["removed"] = self._pull(remote, collections, full)
+        return result
+
+    def push(self, remote, batch_size=MAX_BATCH_WRITES):
+        """只推送 journal；回傳 {"pushed", "conflicts"}"""
+        with self._sync_lock:
+            return self._push(remote, batch_size)
+
+    def pull(self, remote, collections=LIBRARY_COLLECTIONS, full=False):
+        """
+        只拉取遠端變更至本機（離線備援用的鏡像）；回傳拉取 + 移除的文件數
+        full=True：不用增量游標，全量重讀並移除遠端已不存在的文件（尚未推送的本機修改保留）
+        """
+        with self._sync_lock:
+            return sum(self._pull(remote, collections, full))
+
+    def _push(self, remote, batch_size):
+        """
+        journal 以 remote.commit() 批次寫入，版本檢查用離線修改時的預期版本；
+        updated_at 改為推送時間（線上快取以 updated_at 增量同步，離線時間戳記會被略過），
+        成功者把蓋上新時間的版本寫回本機；遠端已被他人修改的文件不覆蓋，改以遠端版本寫回本機並列入 conflicts
+        推送途中失敗時 journal 保留未推送的部分，下次再試
+        """
+        ops, max_seq = self._journal_ops()
+        result = {"pushed": 0, "conflicts": []}
+        for i in range(0, len(ops), batch_size):
+            stamp = self.clock()
+            part = [(c, d, dict(data, **{UPDATED_FIELD: stamp}), expected)
+                    for c, d, data, expected in ops[i:i + batch_size]]
+            conflicts = remote.commit(part)
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for c, d, data, _ in part:
+                    newer = self._conn.execute("SELECT 1 FROM journal WHERE collection = ? AND doc_id = ? "
+                                               "AND seq > ?", (c, d, max_seq)).fetchone()
+                    if (c, d) in conflicts:
+                        current = conflicts[(c, d)]
+                        if newer is not None:
+                            pass                  # 推送期間又有本機修改：保留，下次 reconcile 再判定
+                        elif current is not None:
+                            self._write(c, d, current)
+                        else:
+                            self._conn.execute("DELETE FROM library WHERE collection = ? AND doc_id = ?", (c, d))
+                        result["conflicts"].append({"collection": c, "doc_id": d, "name": data.get("Component")})
+                    else:
+                        if newer is None:
+                            self._write(c, d, data)
+                        result["pushed"] += 1
+                    self._conn.execute("DELETE FROM journal WHERE collection = ? AND doc_id = ? AND seq <= ?",
+                                       (c, d, max_seq))
+        return result
+
+    def _pull(self, remote, collections, full=False):
+        """
+        各 collection 以 updated_at 增量讀取（第一次或 full=True 為全量）寫入本機，不記入 journal
+        全量時遠端沒有的本機文件一併刪除；回傳 (拉取數, 移除數)
+        """
+        pulled = removed = 0
+        for c in collections:
+            with self._lock:
+                row = self._conn.execute("SELECT cursor FROM sync_state WHERE collection = ?", (c,)).fetchone()
+            start = self.clock()
+            since = None if full or row is None or row[0] is None else row[0] - CLOCK_SKEW_S
+            seen = set()
+            cursor = None
+            while True:
+                page, cursor = remote.fetch_page(c, since=since, cursor=cursor, limit=PAGE_SIZE)
+                with self._lock, self._conn:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    dirty = {r[0] for r in self._conn.execute(
+                        "SELECT DISTINCT doc_id FROM journal WHERE collection = ?", (c,))}
+                    for doc_id, data in page:
+                        seen.add(doc_id)
+                        if doc_id not in dirty:   # 尚未推送的本機修改優先（下次 reconcile 再判定衝突）
+                            self._write(c, doc_id, data)
+                            pulled += 1
+                if cursor is None:
+                    break
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                if since is None:
+                    # 全量：遠端已硬刪除（無 tombstone）的文件自本機移除
+                    dirty = {r[0] for r in self._conn.execute(
+                        "SELECT DISTINCT doc_id FROM journal WHERE collection = ?", (c,))}
+                    gone = [(c, r[0]) for r in self._conn.execute(
+                        "SELECT doc_id FROM library WHERE collection = ?", (c,)) if r[0] not in seen | dirty]
+                    self._conn.executemany("DELETE FROM library WHERE collection = ? AND doc_id = ?", gone)
+                    removed += len(gone)
+                self._conn.execute("INSERT OR REPLACE INTO sync_state (collection, cursor) VALUES (?, ?)", (c, start))
+        return pulled, removed
+
+    # ---------- 專案 ----------
+    def save_project(self, name, data):
+        """儲存（覆蓋）專案；data 為「儲存專案」的 dict 或 JSON 字串"""
+        text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        version = (json.loads(text).get("meta") or {}).get("version")
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO projects (name, version, updated_at, data) VALUES (?, ?, ?, ?)",
+                               (name, version, self.clock(), text))
+
+    def load_project(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM projects WHERE name = ?", (name,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def list_projects(self):
+        """[{"name", "version", "updated_at"}]（最近儲存的在前）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, version, updated_at FROM projects ORDER BY updated_at DESC").fetchall()
+        return [{"name": n, "version": v, "updated_at": t} for n, v, t in rows]
+
+    def delete_project(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM projects WHERE name = ?", (name,))
+
+
+class LibraryMirror:
+    """
+    線上時把遠端元件庫鏡像至本機資料庫（pull），讓第一次斷線時就有完整的離線元件庫
+    maybe_sync()：距上次超過 interval 秒時在背景 thread 拉取一次（不阻塞呼叫端；同時只跑一個）；
+                  第一次及距上次全量超過 full_resync 秒時改為全量重讀（移除遠端已硬刪除的文件）
+    resync()：立即全量重讀（阻塞，供手動同步）
+    """
+
+    def __init__(self, store, remote, interval=LIBRARY_TTL_S, full_resync=FULL_RESYNC_S, clock=time.time):
+        self.store = store
+        self.remote = remote
+        self.interval = interval
+        self.full_resync = full_resync
+        self.clock = clock
+        self.last_sync = None
+        self.last_full = None
+        self.last_pulled = None
+        self.last_error = None
+        self._running = threading.Lock()
+
+    def maybe_sync(self):
+        if self.last_sync is not None and self.clock() - self.last_sync < self.interval:
+            return False
+        if not self._running.acquire(blocking=False):
+            return False
+        self.last_sync = self.clock()
+        full = self.last_full is None or self.last_sync - self.last_full >= self.full_resync
+        threading.Thread(target=self._run, args=(full,), daemon=True).start()
+        return True
+
+    def resync(self):
+        """立即全量重讀；回傳拉取 + 移除的文件數"""
+        with self._running:
+            self.last_sync = self.clock()
+            self._run(True, release=False)
+        if self.last_error:
+            raise RuntimeError(self.last_error)
+        return self.last_pulled
+
+    def _run(self, full=False, release=True):
+        try:
+            start = self.clock()
+            self.last_pulled = self.store.pull(self.remote, full=full)
+            if full:
+                self.last_full = start
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            if release:
+                self._running.release()
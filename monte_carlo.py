@@ -0,0 +1,333 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from thermal_engine import (
+    KERNEL_PARAMS, NUMERIC_COMPONENT_COLUMNS, build_tim_props, component_arrays, thermal_kernel,
+    tc_limited_mask, compute_key_results_batch, _col, _evaluate_designs,
+)
+
+# ==============================================================================
+# 5G RRU Monte Carlo - 公差分析
+#
+# 依使用者指定的分佈對全域參數（T_amb、Voiding、t_Grease / t_Pad / t_Putty…）與
+# 元件欄位（Power(W)、R_jc…）抽樣，以 (samples × components) 向量化計算整條
+# calc_thermal_resistance → compute_key_results 鏈。
+# 分塊 (chunk) 計算限制記憶體；每塊使用 SeedSequence.spawn 產生的獨立亂數流，
+# 結果只取決於 seed 與 chunk_size，與執行緒數、執行順序無關。
+# ==============================================================================
+
+DISTRIBUTIONS = ("normal", "uniform", "triangular")
+
+# 物理上不可為負的參數（抽樣後截至 0）；Voiding 另截至 (0, 1]
+NON_NEGATIVE = {"Power(W)", "R_jc", "Pad_L", "Pad_W", "Thick(mm)", "Height(mm)",
+                "t_Grease", "t_Pad", "t_Pad2", "t_Putty", "t_Solder",
+                "K_Grease", "K_Pad", "K_Pad2", "K_Putty", "K_Solder", "K_Via"}
+
+COMPONENT_TOL_COLUMNS = [c for c in NUMERIC_COMPONENT_COLUMNS if c != "Qty"]
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_PERCENTILES = (1, 5, 50, 95, 99)
+
+# 元件 Tj_Margin 以直方圖累積（記憶體與樣本數無關，每元件固定 TJ_HIST_BINS 格）：
+# 各元件的範圍由固定 TJ_HIST_PILOT 點的試抽樣（獨立亂數流，與 chunk_size 無關）的 [min, max]
+# 往兩側各延伸一個跨距決定（跨距至少 TJ_HIST_MIN_SPAN °C）；
+# 超出範圍的樣本不截入邊界格：每側計數，並保留最極端的 TJ_OUTSIDE_KEEP 個原值（記憶體有上限）
+TJ_HIST_BINS = 4096
+TJ_HIST_MIN_SPAN = 1.0
+TJ_HIST_PILOT = 4096
+TJ_OUTSIDE_KEEP = 2048
+
+
+def _sample(rng, spec, nominal, shape):
+    """
+    依 spec 抽樣；nominal 為標稱值（scalar 或可廣播至 shape 的陣列）
+    spec: {"dist": "normal", "sd" | "rel_sd"}
+          {"dist": "uniform", "tol" | "rel_tol"} 或 {"dist": "uniform", "low", "high"}
+          {"dist": "triangular", "tol" | "rel_tol"}（眾數 = 標稱值）或 {"low", "mode", "high"}
+          可另加 "min" / "max" 截斷
+    """
+    dist = spec.get("dist", "normal")
+    nominal = np.broadcast_to(np.asarray(nominal, dtype=float), shape)
+
+    def half_width():
+        if "rel_tol" in spec:
+            return np.abs(nominal) * spec["rel_tol"]
+        if "tol" in spec:
+            return spec["tol"]
+        raise ValueError(f"{dist} 分佈需指定 tol / rel_tol 或 low / high")
+
+    if dist == "normal":
+        sd = np.abs(nominal) * spec["rel_sd"] if "rel_sd" in spec else spec.get("sd")
+        if sd is None:
+            raise ValueError("normal 分佈需指定 sd 或 rel_sd")
+        x = nominal + rng.standard_normal(shape) * sd
+    elif dist == "uniform":
+        if "low" in spec:
+            x = rng.uniform(spec["low"], spec["high"], shape)
+        else:
+            hw = half_width()
+            x = nominal + (2 * rng.random(shape) - 1) * hw
+    elif dist == "triangular":
+        if "low" in spec:
+            x = rng.triangular(spec["low"], spec.get("mode", 0.5 * (spec["low"] + spec["high"])), spec["high"], shape)
+        else:
+            # 以反函數法抽樣，允許每個元件有不同的標稱值
+            hw = np.broadcast_to(half_width(), shape)
+            u = rng.random(shape)
+            x = nominal + hw * np.where(u < 0.5, np.sqrt(2 * u) - 1, 1 - np.sqrt(2 * (1 - u)))
+    else:
+        raise ValueError(f"未知的分佈 {dist!r}，可用：{DISTRIBUTIONS}")
+    if "min" in spec or "max" in spec:
+        x = np.clip(x, spec.get("min", -np.inf), spec.get("max", np.inf))
+    return x
+
+
+def _clip_physical(key, x):
+    """截除物理上不合理的抽樣值"""
+    if key in NON_NEGATIVE:
+        return np.maximum(x, 0.0)
+    if key == "Voiding":
+        return np.clip(x, 1e-6, 1.0)
+    return x
+
+
+class MonteCarloResult:
+    """Monte Carlo 統計結果"""
+
+    def __init__(self, names, n_samples, tj_hist, tj_lo, tj_step, tj_outside, tj_out_n, tj_nan, bt_counts, volume,
+                 bottleneck_margin, percentiles):
+        self.component_names = names
+        self.n_samples = n_samples
+        self.percentiles = tuple(percentiles)
+        self.volume = volume
+        self.bottleneck_margin = bottleneck_margin
+        self._tj_hist = tj_hist
+        self._tj_lo = tj_lo
+        self._tj_step = tj_step
+        self._tj_below = [np.sort(v) for v in tj_outside[0]]   # 各元件低於直方圖範圍、最極端的樣本（原值）
+        self._tj_above = [np.sort(v) for v in tj_outside[1]]   # 各元件高於直方圖範圍、最極端的樣本（原值）
+        self._tj_out_n = tj_out_n                              # (2, n_comp)：範圍外總數（below / above）
+        self._tj_nan = tj_nan
+        self._bt_counts = bt_counts
+
+    @property
+    def tj_out_of_range(self):
+        """各元件落在直方圖範圍外的樣本數（below / above；最極端的 TJ_OUTSIDE_KEEP 個以原值計入百分位）"""
+        return pd.DataFrame({"Component": self.component_names,
+                             "below": self._tj_out_n[0], "above": self._tj_out_n[1]})
+
+    def _tj_hi(self):
+        return self._tj_lo + self._tj_hist.shape[1] * self._tj_step
+
+    @property
+    def bottleneck_probability(self):
+        """各元件成為瓶頸的機率（"None" = 無可行瓶頸）"""
+        probs = self._bt_counts / max(self.n_samples, 1)
+        return pd.Series(probs, index=list(self.component_names) + ["None"], name="P_bottleneck")
+
+    def tj_margin_percentiles(self, percentiles=None):
+        """
+        各元件 Tj_Margin 百分位（°C；直方圖範圍內解析度為該元件的 bin 寬，範圍外為樣本原值；
+        範圍外超過 TJ_OUTSIDE_KEEP 個時，未保留的樣本以範圍邊界近似）
+        index 為元件列位置
+        """
+        qs = np.asarray(self.percentiles if percentiles is None else percentiles, dtype=float) / 100
+        cdf = np.cumsum(self._tj_hist, axis=1)
+        hi_edge = self._tj_hi()
+        out = np.full((len(self.component_names), len(qs)), np.nan)
+        for c in range(len(self.component_names)):
+            below, above = self._tj_below[c], self._tj_above[c]
+            n_below, n_above = int(self._tj_out_n[0, c]), int(self._tj_out_n[1, c])
+            n_in = int(cdf[c, -1]) if cdf.shape[1] else 0
+            total = n_below + n_in + n_above
+            if total == 0:
+                continue
+            # 第 ceil(q·n) 小的樣本：依序為 below 原值 / 未保留的 below（下邊界）/ 直方圖（bin 中心）
+            # / 未保留的 above（上邊界）/ above 原值
+            for j, t in enumerate(np.maximum(np.ceil(qs * total), 1).astype(np.int64)):
+                if t <= len(below):
+                    out[c, j] = below[t - 1]
+                elif t <= n_below:
+                    out[c, j] = self._tj_lo[c]
+                elif t <= n_below + n_in:
+                    idx = np.searchsorted(cdf[c], t - n_below)
+                    out[c, j] = self._tj_lo[c] + (idx + 0.5) * self._tj_step[c]
+                elif t <= total - len(above):
+                    out[c, j] = hi_edge[c]
+                else:
+                    out[c, j] = above[t - (total - len(above)) - 1]
+        cols = [f"P{q:g}" for q in qs * 100]
+        df = pd.DataFrame(out, columns=cols)
+        df.insert(0, "Component", self.component_names)
+        return df
+
+    def volume_percentiles(self, percentiles=None):
+        """Volume_L 百分位"""
+        qs = self.percentiles if percentiles is None else percentiles
+        vol = self.volume[np.isfinite(self.volume)]
+        values = np.percentile(vol, qs) if vol.size else np.full(len(qs), np.nan)
+        return pd.Series(values, index=[f"P{q:g}" for q in qs], name="Volume_L")
+
+    def summary(self):
+        """元件百分位 + 瓶頸機率 合併表"""
+        df = self.tj_margin_percentiles()
+        df["P_bottleneck"] = self._bt_counts[:-1] / max(self.n_samples, 1)
+        df["P_margin_lt_0"] = self.prob_margin_below(0.0)
+        df["N_out_of_range"] = self._tj_out_n.sum(axis=0)
+        return df
+
+    def prob_margin_below(self, threshold=0.0):
+        """各元件 Tj_Margin < threshold 的機率（直方圖範圍內以 bin 解析度，範圍外以原值 / 範圍邊界計）"""
+        n_bins = self._tj_hist.shape[1]
+        k = np.clip(np.floor((threshold - self._tj_lo) / self._tj_step), 0, n_bins).astype(np.int64)
+        cdf = np.concatenate([np.zeros((len(k), 1), dtype=np.int64), np.cumsum(self._tj_hist, axis=1)], axis=1)
+        kept = np.array([[len(v) for v in self._tj_below], [len(v) for v in self._tj_above]],
+                        dtype=np.int64).reshape(2, len(k))
+        dropped = self._tj_out_n - kept
+        hit = (cdf[np.arange(len(k)), k]
+               + np.array([np.searchsorted(v, threshold) for v in self._tj_below], dtype=np.int64)
+               + np.array([np.searchsorted(v, threshold) for v in self._tj_above], dtype=np.int64)
+               + np.where(self._tj_lo < threshold, dropped[0], 0)
+               + np.where(self._tj_hi() < threshold, dropped[1], 0))
+        total = cdf[:, -1] + self._tj_out_n.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, hit / total, np.nan)
+
+
+def _chunk_eval(p, c0, tc_limited, global_tol, component_tol, n, seed_seq, area_fixed):
+    """
+    單一分塊：抽樣 → 熱阻核心 → 瓶頸與尺寸 → 各元件 Tj_Margin
+    area_fixed 不為 None 時，Tj_Margin 以固定散熱面積（標稱設計）計算；體積仍為各樣本重新定尺寸的結果
+    """
+    rng = np.random.default_rng(seed_seq)
+    n_comp = len(c0["Qty"])
+    g = dict(p)
+    for key in sorted(global_tol):
+        x = _clip_physical(key, _sample(rng, global_tol[key], p[key], (n,)))
+        g[key] = x[:, None] if key in KERNEL_PARAMS else x
+    c = dict(c0)
+    for col in sorted(component_tol):
+        c[col] = _clip_physical(col, _sample(rng, component_tol[col], c0[col], (n, n_comp)))
+    g["tim_props"] = build_tim_props(g)
+    k_out = thermal_kernel(c, g)
+
+    comp = {k: c[k] for k in ("Qty", "Height(mm)", "R_jc", "Limit(C)")}
+    comp["R_int"], comp["R_TIM"] = k_out["R_int"], k_out["R_TIM"]
+    comp["tc_limited"] = tc_limited
+    p_pts = {k: (v[:, 0] if isinstance(v, np.ndarray) and v.ndim == 2 else v) for k, v in g.items()}
+    res = _evaluate_designs(p_pts, n, comp, c["Power(W)"], k_out["Allowed_dT"], None)
+
+    # 各元件 Tj_Margin（同主頁：T_hsk_base = T_amb + Min_dT_Allowed / Margin；Fixed-Design 同 compute_key_results）
+    T_amb = np.broadcast_to(p_pts["T_amb"], (n,))
+    T_hsk_base = T_amb + res["Min_dT_Allowed"] / p_pts["Margin"]
+    if area_fixed is not None and area_fixed > 0:
+        eff = 0.95 if "Embedded" in p["fin_tech_selector_v2"] else 0.90
+        T_hsk_base = T_amb + res["Total_Power"] / (res["h_value"] * area_fixed * eff)
+    power = np.broadcast_to(c["Power(W)"], (n, n_comp))
+    Tc = (T_hsk_base[:, None] + c["Height(mm)"] * _col(p_pts["Slope"])
+          + power * (k_out["R_int"] + k_out["R_TIM"]))
+    Tj = Tc + power * c["R_jc"]
+    margin = c["Limit(C)"] - np.where(tc_limited, Tc, Tj)
+    bt = res["Bottleneck_Index"]
+    bt_margin = np.where(bt >= 0, margin[np.arange(n), np.maximum(bt, 0)], 0.0)
+    return margin, bt, res["Volume_L"], bt_margin
+
+
+def run_monte_carlo(global_params, df_components, global_tol=None, component_tol=None,
+                    n_samples=1_000_000, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, workers=1,
+                    fixed_design=True, percentiles=DEFAULT_PERCENTILES, progress=None):
+    """
+    Monte Carlo 公差分析
+    global_tol: {全域參數: spec}，例如 {"T_amb": {"dist": "normal", "sd": 2}, "Voiding": {"dist": "uniform", "low": 0.6, "high": 0.9}}
+    component_tol: {元件欄位: spec}，每個元件、每個樣本獨立抽樣，例如 {"Power(W)": {"dist": "normal", "rel_sd": 0.05}}
+    fixed_design=True：散熱器固定為標稱設計的面積（實際產品的公差情境），Tj_Margin 隨抽樣變動；
+                       False 時每個樣本重新定尺寸，瓶頸元件 Tj_Margin 恆由 Margin 決定
+    workers > 1 時以執行緒平行計算各分塊（NumPy 運算釋放 GIL），結果與 workers = 1 相同
+    progress(done, total)：每塊完成後回呼
+    """
+    global_tol = dict(global_tol or {})
+    component_tol = dict(component_tol or {})
+    p = dict(global_params)
+    p.setdefault("Slope", 0.03)
+    bad = [k for k in global_tol if k not in p or isinstance(p[k], str)]
+    if bad:
+        raise KeyError(f"無法抽樣的全域參數: {bad}")
+    bad = [k for k in component_tol if k not in COMPONENT_TOL_COLUMNS]
+    if bad:
+        raise KeyError(f"無法抽樣的元件欄位: {bad}（可用：{COMPONENT_TOL_COLUMNS}）")
+    if n_samples <= 0 or chunk_size <= 0:
+        raise ValueError("n_samples 與 chunk_size 需為正整數")
+
+    names = np.asarray(df_components["Component"], dtype=object) if len(df_components) else np.empty(0, dtype=object)
+    n_comp = len(names)
+    c0 = component_arrays(df_components) if n_comp else None
+    tc_limited = tc_limited_mask(df_components) if n_comp else None
+
+    area_fixed = None
+    if fixed_design and n_comp:
+        area_fixed = float(compute_key_results_batch(p, df_components)["Area_req"][0])
+
+    sizes = [min(chunk_size, n_samples - s) for s in range(0, n_samples, chunk_size)]
+    # 最後一個亂數流專供直方圖範圍試抽樣（不計入結果）；前 len(sizes) 個與分塊一一對應
+    streams = np.random.SeedSequence(seed).spawn(len(sizes) + 1)
+
+    n_bins = TJ_HIST_BINS
+    tj_hist = np.zeros((n_comp, n_bins), dtype=np.int64)
+    tj_lo = np.zeros(n_comp)
+    tj_step = np.ones(n_comp)
+    tj_outside = ([np.empty(0)] * n_comp, [np.empty(0)] * n_comp)
+    tj_out_n = np.zeros((2, n_comp), dtype=np.int64)
+    if n_comp:
+        # 直方圖範圍：固定點數的試抽樣 [min, max] 往兩側各延伸一個跨距（與 chunk_size / 執行緒數無關）
+        pilot = _chunk_eval(p, c0, tc_limited, global_tol, component_tol, TJ_HIST_PILOT, streams[-1], area_fixed)[0]
+        ok = np.isfinite(pilot)
+        m_lo = np.array([pilot[ok[:, c], c].min() if ok[:, c].any() else 0.0 for c in range(n_comp)])
+        m_hi = np.array([pilot[ok[:, c], c].max() if ok[:, c].any() else 0.0 for c in range(n_comp)])
+        span = np.maximum(m_hi - m_lo, TJ_HIST_MIN_SPAN)
+        tj_lo[:] = m_lo - span
+        tj_step[:] = 3 * span / n_bins
+    tj_nan = np.zeros(n_comp, dtype=np.int64)
+    bt_counts = np.zeros(n_comp + 1, dtype=np.int64)
+    volume = np.empty(n_samples)
+    bt_margin = np.empty(n_samples)
+
+    empty_volume = float(compute_key_results_batch(p, df_components)["Volume_L"][0]) if not n_comp else None
+
+    def task(i):
+        if not n_comp:
+            n = sizes[i]
+            return np.zeros((n, 0)), np.full(n, -1), np.full(n, empty_volume), np.zeros(n)
+        return _chunk_eval(p, c0, tc_limited, global_tol, component_tol, sizes[i], streams[i], area_fixed)
+
+    offset = 0
+    with ThreadPoolExecutor(max_workers=max(int(workers), 1)) as pool:
+        for i, (margin, bt_idx, vol, bt_m) in enumerate(pool.map(task, range(len(sizes)))):
+            n = sizes[i]
+            volume[offset:offset + n] = vol
+            bt_margin[offset:offset + n] = bt_m
+            bt_counts += np.bincount(np.where(bt_idx >= 0, bt_idx, n_comp), minlength=n_comp + 1)
+            if n_comp:
+                ok = np.isfinite(margin)
+                tj_nan += (~ok).sum(axis=0)
+                with np.errstate(invalid='ignore'):
+                    bins = np.floor((margin - tj_lo) / tj_step)
+                inside = ok & (bins >= 0) & (bins < n_bins)
+                flat = (np.arange(n_comp) * n_bins + np.where(inside, bins, 0).astype(np.int64))[inside]
+                tj_hist += np.bincount(flat, minlength=n_comp * n_bins).reshape(n_comp, n_bins)
+                for side, mask in ((0, ok & (bins < 0)), (1, ok & (bins >= n_bins))):
+                    tj_out_n[side] += mask.sum(axis=0)
+                    for c in np.flatnonzero(mask.any(axis=0)):
+                        # 每側只保留最極端的 TJ_OUTSIDE_KEEP 個（below 取最小、above 取最大）
+                        v = np.concatenate([tj_outside[side][c], margin[mask[:, c], c]])
+                        if len(v) > TJ_OUTSIDE_KEEP:
+                            v = (np.partition(v, TJ_OUTSIDE_KEEP - 1)[:TJ_OUTSIDE_KEEP] if side == 0
+                                 else np.partition(v, len(v) - TJ_OUTSIDE_KEEP)[-TJ_OUTSIDE_KEEP:])
+                        tj_outside[side][c] = v
+            offset += n
+            if progress:
+                progress(offset, n_samples)
+
+    return MonteCarloResult(names, n_samples, tj_hist, tj_lo, tj_step, tj_outside, tj_out_n, tj_nan, bt_counts,
+                            volume, bt_margin, percentiles)
@@ -0,0 +1,191 @@
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# ==============================================================================
+# 5G RRU Rerun Profiler - 每次 rerun 的分段計時 / cProfile
+#
+# 以 checkpoint() 把一次 rerun 切成連續區段（Header、Tab1 編輯器、熱流程、Tab2 ...），
+# 以 stage() 量測區段內的細項或 callback（如 _sync_editor_state、3D Mesh3d 建圖）。
+# 每次 rerun 結束時寫一行 JSON 至輪替日誌檔，供長期觀察實際使用時的熱點；
+# profile=True 時每個區段另以 cProfile 記錄（僅除錯面板開啟時使用）。
+# 不依賴 Streamlit；app.py 將 RerunProfiler 存於 session_state，跨 rerun 保留。
+# ==============================================================================
+
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "rerun_timings.jsonl")
+LOG_MAX_BYTES = 5 * 2**20     # 單一日誌檔上限，超過即輪替
+LOG_BACKUP_COUNT = 3          # 保留的舊日誌檔數
+HISTORY_SIZE = 50             # 記憶體中保留的 rerun 筆數（除錯面板顯示）
+PROFILE_TOP = 25              # cProfile 報表列出的函數數
+
+LOGGER_NAME = "rru.rerun_timings"
+
+
+def get_timing_logger(path=DEFAULT_LOG_PATH, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """
+    rerun 計時日誌（RotatingFileHandler，每行一筆 JSON）；path 為空時回傳 None（不寫檔）
+    同一行程重複呼叫只掛一個 handler
+    """
+    if not path:
+        return None
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    target = os.path.abspath(path)
+    if not any(getattr(h, "baseFilename", None) == target for h in logger.handlers):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(target, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+def _profile_text(prof, top=PROFILE_TOP):
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+
+class RerunProfiler:
+    """
+    一個 session 的 rerun 計時器
+    begin() → checkpoint(name) ... → finish()；stage(name) 可在任何時候使用（含 rerun 開始前執行的 callback），
+    finish() 之後、下一次 begin() 之前記錄的 stage 併入下一次 rerun。
+    每筆記錄：{"name", "kind": "section" | "stage", "ms", "profile": cProfile 報表或 None}
+    """
+
+    def __init__(self, logger=None, history_size=HISTORY_SIZE):
+        self.logger = logger
+        self.session = uuid.uuid4().hex[:8]
+        self.history = deque(maxlen=history_size)
+        self.profile = False
+        self._entries = []
+        self._t_begin = None
+        self._t_mark = None
+        self._prof = None        # 目前區段的 cProfile（checkpoint 時輪替）
+        self._profiling = False  # 是否已有 cProfile 啟用中（cProfile 不可巢狀）
+
+    # ---------- 區段 ----------
+    def begin(self, profile=False):
+        """rerun 開始；前一次 rerun 未正常結束（st.stop / st.rerun）時先以 interrupted 結束"""
+        if self._t_begin is not None:
+            self.finish(interrupted=True)
+        self.profile = bool(profile)
+        self._t_begin = self._t_mark = time.perf_counter()
+        self._start_section_profile()
+
+    def checkpoint(self, name):
+        """結束目前區段（自上一個 checkpoint / begin 起算），記為 name"""
+        if self._t_begin is None:
+            return
+        now = time.perf_counter()
+        self._entries.append({"name": name, "kind": "section", "ms": (now - self._t_mark) * 1e3,
+                              "profile": self._stop_section_profile()})
+        self._t_mark = time.perf_counter()
+        self._start_section_profile()
+
+    @contextmanager
+    def stage(self, name):
+        """量測一段細項；若沒有區段 cProfile 在執行（如 callback），profile 模式下另開一個"""
+        prof = None
+        if self.profile and not self._profiling:
+            prof = cProfile.Profile()
+            self._profiling = True
+            prof.enable()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1e3
+            text = None
+            if prof is not None:
+                prof.disable()
+                self._profiling = False
+                text = _profile_text(prof)
+            self._entries.append({"name": name, "kind": "stage", "ms": ms, "profile": text})
+
+    def finish(self, interrupted=False):
+        """rerun 結束：剩餘時間記為最後區段，寫入日誌與 history，回傳本次記錄"""
+        if self._t_begin is None:
+            return None
+        now = time.perf_counter()
+        if (now - self._t_mark) * 1e3 >= 0.01:
+            self._entries.append({"name": "(其餘)", "kind": "section", "ms": (now - self._t_mark) * 1e3,
+                                  "profile": self._stop_section_profile()})
+        else:
+            self._stop_section_profile()
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "session": self.session,
+            "total_ms": (now - self._t_begin) * 1e3,
+            "interrupted": interrupted,
+            "profiled": self.profile,
+            "entries": self._entries,
+        }
+        self.history.append(record)
+        self._entries = []
+        self._t_begin = self._t_mark = None
+        if self.logger is not None:
+            try:
+                self.logger.info(json.dumps(self.log_line(record), ensure_ascii=False))
+            except (OSError, ValueError):
+                pass  # 日誌寫入失敗不影響 app
+        return record
+
+    @staticmethod
+    def log_line(record):
+        """日誌格式：不含 cProfile 報表，同名項目加總"""
+        line = {k: record[k] for k in ("ts", "session", "total_ms", "interrupted")}
+        for kind in ("section", "stage"):
+            agg = {}
+            for e in record["entries"]:
+                if e["kind"] == kind:
+                    agg[e["name"]] = round(agg.get(e["name"], 0.0) + e["ms"], 3)
+            line[kind + "s"] = agg
+        line["total_ms"] = round(line["total_ms"], 3)
+        return line
+
+    # ---------- 統計 ----------
+    def last(self):
+        return self.history[-1] if self.history else None
+
+    def summary(self, kind="section"):
+        """history 中各項目的 {name: {"count", "mean_ms", "max_ms", "last_ms"}}（依首次出現順序）"""
+        out = {}
+        for rec in self.history:
+            for e in rec["entries"]:
+                if e["kind"] != kind:
+                    continue
+                s = out.setdefault(e["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+                s["count"] += 1
+                s["total_ms"] += e["ms"]
+                s["max_ms"] = max(s["max_ms"], e["ms"])
+                s["last_ms"] = e["ms"]
+        for s in out.values():
+            s["mean_ms"] = s.pop("total_ms") / s["count"]
+        return out
+
+    # ---------- cProfile ----------
+    def _start_section_profile(self):
+        if self.profile and not self._profiling:
+            self._prof = cProfile.Profile()
+            self._profiling = True
+            self._prof.enable()
+
+    def _stop_section_profile(self):
+        if self._prof is None:
+            return None
+        self._prof.disable()
+        self._profiling = False
+        prof, self._prof = self._prof, None
+        return _profile_text(prof)
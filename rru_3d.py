@@ -0,0 +1,145 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# ==============================================================================
+# 5G RRU 3D Model - Tab 4 3D 模擬視圖
+#
+# 由主頁結果（機構尺寸 / 鰭片規格）建立 plotly Figure；
+# 不依賴 Streamlit，供 app.py 顯示及 benchmark.py 量測建圖時間。
+# ==============================================================================
+
+LIGHTING_METAL = dict(ambient=0.5, diffuse=0.8, specular=0.5, roughness=0.1)
+LIGHTING_MATTE = dict(ambient=0.6, diffuse=0.8, specular=0.1, roughness=0.8)
+
+# 長方體 8 頂點（底面 0-3、頂面 4-7）→ 12 個三角面
+BOX_IJK = dict(
+    i=[7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2],
+    j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
+    k=[0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6]
+)
+BOX_FACES = np.column_stack([BOX_IJK['i'], BOX_IJK['j'], BOX_IJK['k']])
+# 頂點順序：底面 (x0,y0) (x1,y0) (x1,y1) (x0,y1)，頂面同序；True 表示該軸取 hi
+BOX_CORNERS = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                        [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=bool)
+
+FIN_COLORSCALE = [[0, '#E67E22'], [0.45, '#BDC3C7'], [1, '#D6EAF8']]
+
+# [Perf] Level of Detail：鰭片數超過門檻時，兩側保留完整鰭片、中段以等距代表片取代；
+# 不論參數為何，送至瀏覽器的 Mesh3d 頂點數都不超過 MAX_MESH_VERTICES（每個長方體 8 頂點）
+LOD_FIN_THRESHOLD = 120    # 鰭片數超過此值時啟用 LOD
+LOD_EDGE_FINS = 6          # LOD 時兩側各保留的完整鰭片數
+MAX_MESH_VERTICES = 2400   # 機殼 + 基座 + 鰭片的頂點上限
+
+
+def box_mesh(lo, hi):
+    """
+    N 個軸對齊長方體合併為單一三角網格（NumPy 一次產生，無逐個 trace）
+    lo, hi: (N, 3) 各長方體的最小 / 最大角點 → (頂點 (8N, 3), 三角面 (12N, 3))
+    """
+    lo, hi = np.atleast_2d(np.asarray(lo, dtype=float)), np.atleast_2d(np.asarray(hi, dtype=float))
+    verts = np.where(BOX_CORNERS[None, :, :], hi[:, None, :], lo[:, None, :]).reshape(-1, 3)
+    faces = (BOX_FACES[None, :, :] + 8 * np.arange(len(lo))[:, None, None]).reshape(-1, 3)
+    return verts, faces
+
+
+def fin_offsets(W_hsk, Gap, Fin_t, num_fins_int):
+    """各鰭片的 y 起點（整排置中）；超出 W_hsk 的鰭片捨去（同原逐片迴圈的 break）"""
+    if num_fins_int <= 0:
+        return np.empty(0)
+    total_fin_w = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
+    y_off = (W_hsk - total_fin_w) / 2
+    fy0 = y_off + np.arange(num_fins_int) * (Fin_t + Gap)
+    return fy0[:np.searchsorted(fy0 + Fin_t > W_hsk, True)]
+
+
+def lod_fin_indices(n_fins, lod_fin_threshold=LOD_FIN_THRESHOLD, max_vertices=MAX_MESH_VERTICES):
+    """
+    要繪製的鰭片 index（遞增）：不超過門檻與頂點預算時全部繪製；
+    否則兩側各 LOD_EDGE_FINS 片完整保留，中段等距取代表片（首尾鰭片必含，整排外形尺寸不變）
+    lod_fin_threshold=None 表示不啟用 LOD，只受頂點預算限制
+    """
+    budget = max((max_vertices - 16) // 8, 2)  # 扣除機殼與基座各 8 頂點
+    limit = budget if lod_fin_threshold is None else max(min(int(lod_fin_threshold), budget), 2)
+    if n_fins <= limit:
+        return np.arange(n_fins)
+    edge = min(LOD_EDGE_FINS, limit // 4)
+    middle = np.linspace(edge, n_fins - 1 - edge, limit - 2 * edge).round().astype(np.int64)
+    return np.unique(np.concatenate([np.arange(edge), middle, np.arange(n_fins - edge, n_fins)]))
+
+
+def mesh_trace(verts, faces, **kwargs):
+    """頂點 / 三角面陣列 → go.Mesh3d"""
+    return go.Mesh3d(x=verts[:, 0], y=verts[:, 1], z=verts[:, 2],
+                     i=faces[:, 0], j=faces[:, 1], k=faces[:, 2], **kwargs)
+
+
+def build_rru_figure(L_hsk, W_hsk, RRU_Height, H_shield, H_filter, t_base, Fin_Height, Fin_t, Gap, num_fins_int,
+                     lod_fin_threshold=LOD_FIN_THRESHOLD, max_vertices=MAX_MESH_VERTICES):
+    """
+    建立 RRU 3D 模型：底部電子艙 + 散熱器基座 + 鰭片（底部→頂部熱梯度配色）+ 外框線
+    [Perf] 全部鰭片合併為一個 Mesh3d（逐頂點 intensity），trace 數固定為 4，與鰭片數無關；
+    鰭片以 lod_fin_indices 挑選（LOD 門檻 / 頂點預算），尺寸與鰭片高度配色不受影響
+    """
+    h_body       = H_shield + H_filter
+    z_base_start = h_body
+    z_base_end   = h_body + t_base
+    z_fin_start  = z_base_end
+    z_fin_end    = z_base_end + Fin_Height
+
+    fig_3d = go.Figure()
+
+    # 1. 機殼 (實心深藍灰)
+    verts, faces = box_mesh([0, 0, 0], [L_hsk, W_hsk, h_body])
+    fig_3d.add_trace(mesh_trace(
+        verts, faces,
+        color='#5D6D7E', opacity=1.0,
+        lighting=LIGHTING_MATTE, flatshading=True,
+        name='Electronics Body', showscale=False
+    ))
+
+    # 2. 散熱器基座 (銀灰)
+    verts, faces = box_mesh([0, 0, z_base_start], [L_hsk, W_hsk, z_base_end])
+    fig_3d.add_trace(mesh_trace(
+        verts, faces,
+        color='#BDC3C7', opacity=1.0,
+        lighting=LIGHTING_METAL, flatshading=True,
+        name='Heatsink Base', showscale=False
+    ))
+
+    # 3. 散熱鰭片 (底部暖色→頂部冷色熱梯度)：所有鰭片一個 trace
+    fy0 = fin_offsets(W_hsk, Gap, Fin_t, num_fins_int)
+    fy0 = fy0[lod_fin_indices(len(fy0), lod_fin_threshold, max_vertices)]
+    if len(fy0):
+        n = len(fy0)
+        lo = np.column_stack([np.zeros(n), fy0, np.full(n, z_fin_start)])
+        hi = np.column_stack([np.full(n, L_hsk), fy0 + Fin_t, np.full(n, z_fin_end)])
+        verts, faces = box_mesh(lo, hi)
+        fig_3d.add_trace(mesh_trace(
+            verts, faces,
+            intensity=np.tile(BOX_CORNERS[:, 2].astype(float), n), cmin=0, cmax=1,
+            colorscale=FIN_COLORSCALE,
+            showscale=False,
+            lighting=LIGHTING_METAL, flatshading=True,
+            name='Fins', showlegend=True
+        ))
+
+    # 4. 外框線
+    xl = [0,L_hsk,L_hsk,0,0,None,0,L_hsk,L_hsk,0,0,None,0,0,None,L_hsk,L_hsk,None,L_hsk,L_hsk,None,0,0]
+    yl = [0,0,W_hsk,W_hsk,0,None,0,0,W_hsk,W_hsk,0,None,0,0,None,0,0,None,W_hsk,W_hsk,None,W_hsk,W_hsk]
+    zl = [0,0,0,0,0,None,RRU_Height,RRU_Height,RRU_Height,RRU_Height,RRU_Height,None,0,RRU_Height,None,0,RRU_Height,None,0,RRU_Height,None,0,RRU_Height]
+    fig_3d.add_trace(go.Scatter3d(x=xl, y=yl, z=zl, mode='lines',
+                                  line=dict(color='#2C3E50', width=2), showlegend=False))
+
+    max_dim = max(L_hsk, W_hsk, RRU_Height) * 1.1
+    fig_3d.update_layout(
+        scene=dict(
+            xaxis=dict(title='Length', range=[0, max_dim], dtick=50),
+            yaxis=dict(title='Width',  range=[0, max_dim], dtick=50),
+            zaxis=dict(title='Height', range=[0, max_dim], dtick=50),
+            aspectmode='manual', aspectratio=dict(x=1, y=1, z=1),
+            camera=dict(projection=dict(type="orthographic"), eye=dict(x=1.2, y=1.2, z=1.2)),
+            bgcolor='white'
+        ),
+        margin=dict(l=0, r=0, b=0, t=0), height=600
+    )
+    return fig_3d
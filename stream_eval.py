@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from batch_eval import COMPONENT_SECTIONS, load_default_params
+from thermal_engine import DRC_RULES, NUMERIC_COMPONENT_COLUMNS, run_main_pipeline_batch
+
+# ==============================================================================
+# 5G RRU Stream Evaluator - JSONL 串流評估
+#
+# stdin 每行一筆專案記錄（component_schema.json 的 projects document：
+# project_name / meta / global_params / rf_data / digital_data / pwr_data），
+# 累積成 micro-batch 後以 run_main_pipeline_batch 一次向量化計算，依輸入順序寫出結果 JSONL。
+# 記憶體只保留一個 batch（與串流長度無關）；讀取端以有界佇列緩衝，下游變慢時自然回壓。
+# 用法：plm_export | python stream_eval.py --batch-size 256 > results.jsonl
+# ==============================================================================
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT = 0.05       # 秒；batch 未滿時等待更多輸入的上限（限制低流量時的延遲）
+QUEUE_BATCHES = 4             # 讀取佇列容量 = batch_size × QUEUE_BATCHES
+
+RESULT_FIELDS = ["project_name", "Volume_L", "total_weight_kg", "Fin_Height", "Fin_Count",
+                 "Bottleneck", "Tj_Margin", "Total_Power", "DRC_status", "DRC_rule", "error"]
+
+_END = object()
+
+
+def record_arrays(record):
+    """專案記錄 → 三類元件合併的欄位陣列（component_arrays 格式 + _src），不經 pandas"""
+    rows, src = [], []
+    for key, tag in COMPONENT_SECTIONS:
+        items = record.get(key) or []
+        rows.extend(items)
+        src.extend([tag] * len(items))
+    c = {col: np.array([r[col] for r in rows], dtype=float) for col in NUMERIC_COMPONENT_COLUMNS}
+    for col in ("Component", "Board_Type", "TIM_Type"):
+        c[col] = np.array([r[col] for r in rows] or [], dtype=object)
+    c["_src"] = np.array(src, dtype=object)
+    return c
+
+
+def _error_result(record, err):
+    out = dict.fromkeys(RESULT_FIELDS)
+    out["project_name"] = record.get("project_name") if isinstance(record, dict) else None
+    out["error"] = err
+    return out
+
+
+def evaluate_records(records, defaults=None):
+    """
+    一個 micro-batch：記錄 list → 結果 list（同順序）
+    個別記錄格式錯誤只影響該筆（error 欄位），其餘仍以同一批向量化計算
+    """
+    defaults = {} if defaults is None else defaults
+    results = [None] * len(records)
+    projects, index = [], []
+    for i, rec in enumerate(records):
+        if isinstance(rec, Exception):
+            results[i] = _error_result({}, f"{type(rec).__name__}: {rec}")
+            continue
+        try:
+            params = dict(defaults)
+            params.update(rec.get("global_params") or {})
+            projects.append((params, record_arrays(rec)))
+            index.append(i)
+        except Exception as e:
+            results[i] = _error_result(rec, f"{type(e).__name__}: {e}")
+    if projects:
+        try:
+            res = run_main_pipeline_batch(projects)
+        except Exception as e:
+            if len(projects) == 1:
+                results[index[0]] = _error_result(records[index[0]], f"{type(e).__name__}: {e}")
+                return results
+            # 批次失敗時逐筆重算，只讓造成失敗的記錄帶 error
+            for i in index:
+                results[i] = evaluate_records([records[i]], defaults)[0]
+            return results
+        for j, i in enumerate(index):
+            code = int(res["DRC_code"][j])
+            results[i] = {
+                "project_name": records[i].get("project_name"),
+                "Volume_L": float(res["Volume_L"][j]),
+                "total_weight_kg": float(res["total_weight_kg"][j]),
+                "Fin_Height": float(res["Fin_Height"][j]),
+                "Fin_Count": int(res["Fin_Count"][j]),
+                "Bottleneck": res["Bottleneck_Name"][j],
+                "Tj_Margin": float(res["Bottleneck_Tj_Margin"][j]),
+                "Total_Power": float(res["Total_Power"][j]),
+                "DRC_status": "FAIL" if code else ("WARN" if res["DRC_warn"][j] else "PASS"),
+                "DRC_rule": DRC_RULES[code],
+                "error": None,
+            }
+    return results
+
+
+def parse_jsonl(lines):
+    """逐行解析 JSONL；空白行略過，解析失敗的行以例外物件佔位（維持輸出順序）"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+def iter_evaluate(records, batch_size=DEFAULT_BATCH_SIZE, defaults=None):
+    """
+    產生器 API：逐筆產生結果 dict（與輸入同順序）
+    records 為專案 dict 的 iterable（可為無窮串流）；每累積 batch_size 筆計算一次
+    """
+    defaults = load_default_params() if defaults is None else defaults
+    batch = []
+    for rec in records:
+        batch.append(rec)
+        if len(batch) >= batch_size:
+            yield from evaluate_records(batch, defaults)
+            batch = []
+    if batch:
+        yield from evaluate_records(batch, defaults)
+
+
+def _reader(stream, q):
+    """讀取執行緒：解析後放入有界佇列（佇列滿時阻塞 = 回壓上游）"""
+    try:
+        for rec in parse_jsonl(stream):
+            q.put(rec)
+    finally:
+        q.put(_END)
+
+
+def _queued_batches(q, batch_size, max_wait):
+    """從佇列取出 micro-batch：湊滿 batch_size，或第一筆到達後等待超過 max_wait 即送出"""
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        batch = [item]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < batch_size:
+            try:
+                item = q.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _END:
+                yield batch
+                return
+            batch.append(item)
+        yield batch
+
+
+def run_stream(instream, outstream, batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT, defaults=None):
+    """stdin → stdout 串流評估；每個 batch 寫完即 flush，回傳處理筆數"""
+    defaults = load_default_params() if defaults is None else defaults
+    q = queue.Queue(maxsize=batch_size * QUEUE_BATCHES)
+    threading.Thread(target=_reader, args=(instream, q), daemon=True).start()
+    n = 0
+    for batch in _queued_batches(q, batch_size, max_wait):
+        for res in evaluate_records(batch, defaults):
+            outstream.write(json.dumps(res, ensure_ascii=False) + "\n")
+        outstream.flush()
+        n += len(batch)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="5G RRU JSONL 串流評估（stdin 專案記錄 → stdout 結果記錄）")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="micro-batch 筆數")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT,
+                        help="batch 未滿時最長等待秒數（低流量時的延遲上限）")
+    parser.add_argument("--defaults", default=None,
+                        help="補齊缺少參數用的設定檔（預設 default_config.json；空字串表示不補齊）")
+    args = parser.parse_args(argv)
+    defaults = load_default_params() if args.defaults is None else load_default_params(args.defaults)
+    try:
+        run_stream(sys.stdin, sys.stdout, batch_size=max(args.batch_size, 1), max_wait=args.max_wait,
+                   defaults=defaults)
+    except BrokenPipeError:
+        # 下游提早關閉（如 | head）：stdout 轉向 devnull，避免直譯器結束時 flush 再次報錯（stderr 保留給後續診斷）
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from thermal_engine import (
+    NUMERIC_COMPONENT_COLUMNS, ThermalModel, component_arrays, tc_limited_mask,
+    _batch_from_arrays, _design_columns, _n_points,
+)
+
+# ==============================================================================
+# 5G RRU Sweep Executor - 多進程批次計算
+#
+# 將 design matrix 切塊分派至 process pool；元件表只透過共享記憶體發佈一次，
+# 每個任務只傳遞該塊的設計參數，不重複 pickle DataFrame。
+# 結果依原順序組回；小型工作直接在本行程計算，避免進程啟動成本。
+# ==============================================================================
+
+# 文字欄位以代碼存入共享記憶體，類別表於 worker 初始化時傳遞一次
+OBJECT_COLUMNS = ['Component', 'Board_Type', 'TIM_Type']
+SHARED_COLUMNS = NUMERIC_COMPONENT_COLUMNS + OBJECT_COLUMNS + ['tc_limited']
+
+MIN_PARALLEL_POINTS = 20_000   # 少於此點數時在本行程計算
+TASKS_PER_WORKER = 4           # 每個 worker 平均分到的任務數（平衡負載與派送成本）
+MAX_CHUNK_CELLS = 4_000_000    # 每塊 設計點 × 元件數 上限（限制 (points × components) 中間陣列記憶體）
+
+# worker 行程內的狀態（由 _init_worker 設定）
+_WORKER = {}
+
+
+class SharedComponentTable:
+    """
+    元件表的共享記憶體發佈：所有欄位存成一塊 (n_columns × n_rows) float64 陣列，
+    文字欄位以 factorize 代碼儲存。以 spec 傳給其他行程後用 attach() 重建欄位陣列（零複製）。
+    """
+
+    def __init__(self, df_components):
+        n = len(df_components)
+        self.categories = {}
+        self._shm = None
+        if not n:
+            self.spec = {"name": None, "n_rows": 0, "categories": {}}
+            return
+        c = component_arrays(df_components)
+        self._shm = shared_memory.SharedMemory(create=True, size=len(SHARED_COLUMNS) * n * 8)
+        block = np.ndarray((len(SHARED_COLUMNS), n), dtype=np.float64, buffer=self._shm.buf)
+        for i, col in enumerate(NUMERIC_COMPONENT_COLUMNS):
+            block[i] = c[col]
+        for j, col in enumerate(OBJECT_COLUMNS):
+            codes, uniques = pd.factorize(pd.Series(c[col], dtype=object), use_na_sentinel=False)
+            block[len(NUMERIC_COMPONENT_COLUMNS) + j] = codes
+            self.categories[col] = np.asarray(uniques, dtype=object)
+        block[-1] = tc_limited_mask(df_components)
+        self.spec = {"name": self._shm.name, "n_rows": n, "categories": self.categories}
+
+    @staticmethod
+    def attach(spec):
+        """依 spec 連結共享記憶體，回傳 (shm, 元件欄位 dict, tc_limited)；空表時回傳 (None, None, None)"""
+        if not spec["n_rows"]:
+            return None, None, None
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        block = np.ndarray((len(SHARED_COLUMNS), spec["n_rows"]), dtype=np.float64, buffer=shm.buf)
+        c = {col: block[i] for i, col in enumerate(NUMERIC_COMPONENT_COLUMNS)}
+        for j, col in enumerate(OBJECT_COLUMNS):
+            codes = block[len(NUMERIC_COMPONENT_COLUMNS) + j].astype(np.int64)
+            c[col] = spec["categories"][col][codes]
+        return shm, c, block[-1].astype(bool)
+
+    def close(self):
+        """釋放共享記憶體（僅建立者呼叫）"""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def _init_worker(spec, global_params):
+    """worker 初始化：連結共享元件表並預編譯 ThermalModel"""
+    shm, c, tc_limited = SharedComponentTable.attach(spec)
+    _WORKER["shm"] = shm  # 保留參照，避免 buffer 被回收
+    _WORKER["c"], _WORKER["tc_limited"] = c, tc_limited
+    _WORKER["params"] = dict(global_params)
+    _WORKER["model"] = ThermalModel.from_arrays(global_params, c, tc_limited)
+
+
+def _eval_chunk(design, power_scale, Area_fixed_m2, h_model, h_solver, c=None, tc_limited=None, params=None, model=None):
+    """計算一塊設計點；不影響元件熱阻的掃描走預編譯模型，否則以 batch 重算"""
+    c = _WORKER.get("c") if c is None else c
+    tc_limited = _WORKER.get("tc_limited") if tc_limited is None else tc_limited
+    params = _WORKER.get("params") if params is None else params
+    model = _WORKER.get("model") if model is None else model
+    cols, n_pts = _design_columns(design)
+    if ThermalModel.SCAN_PARAMS_EXCLUDED.isdisjoint(cols):
+        return model.evaluate(cols or None, power_scale=power_scale, Area_fixed_m2=Area_fixed_m2,
+                              h_model=h_model, h_solver=h_solver)
+    n_pts, power_scale, Area_fixed_m2 = _n_points(n_pts, power_scale, Area_fixed_m2)
+    p = dict(params)
+    p.update(cols)
+    return _batch_from_arrays(p, n_pts, c, tc_limited, power_scale, Area_fixed_m2, h_model, h_solver)
+
+
+def _worker_task(args):
+    return _eval_chunk(*args)
+
+
+class SweepExecutor:
+    """
+    compute_key_results 風格的平行批次計算器（建議以 with 使用，結束時釋放 pool 與共享記憶體）
+    workers: 進程數（預設 os.cpu_count()）；min_parallel_points: 少於此點數時在本行程計算
+    evaluate() 參數同 compute_key_results_batch，結果依原順序組回
+    """
+
+    def __init__(self, global_params, df_components, workers=None, min_parallel_points=MIN_PARALLEL_POINTS,
+                 mp_context=None):
+        p = dict(global_params)
+        p.setdefault('Slope', 0.03)
+        self.params = p
+        self.workers = max(int(workers or os.cpu_count() or 1), 1)
+        self.min_parallel_points = min_parallel_points
+        self._mp_context = mp_context
+        # 本行程計算用（小型工作 / fallback）
+        if len(df_components):
+            self._c, self._tc = component_arrays(df_components), tc_limited_mask(df_components)
+        else:
+            self._c = self._tc = None
+        self.model = ThermalModel.from_arrays(p, self._c, self._tc)
+        self._table = None
+        self._pool = None
+        self._df = df_components
+
+    def _ensure_pool(self):
+        """第一次需要平行計算時才建立共享記憶體與 pool"""
+        if self._pool is None:
+            self._table = SharedComponentTable(self._df)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context,
+                                             initializer=_init_worker, initargs=(self._table.spec, self.params))
+        return self._pool
+
+    def evaluate(self, design=None, power_scale=None, Area_fixed_m2=None, h_model="constant", h_solver=None,
+                 chunk_size=None, progress=None):
+        """
+        平行評估 design matrix；progress(done_points, total_points) 於每塊完成時回呼
+        回傳 {key: ndarray}（同 compute_key_results_batch）
+        """
+        cols, n_pts = _design_columns(design)
+        n_pts, power_scale, Area_fixed_m2 = _n_points(n_pts, power_scale, Area_fixed_m2)
+        parallel = self.workers > 1 and n_pts >= self.min_parallel_points
+        n_comp = len(self.model.power)
+        if chunk_size is None:
+            chunk_size = -(-n_pts // (self.workers * TASKS_PER_WORKER)) if parallel else n_pts
+            chunk_size = min(chunk_size, max(MAX_CHUNK_CELLS // max(n_comp, 1), 1))
+        chunk_size = max(int(chunk_size), 1)
+        bounds = [(s, min(s + chunk_size, n_pts)) for s in range(0, n_pts, chunk_size)]
+        full = lambda v: None if v is None else np.broadcast_to(v, (n_pts,))
+        power_scale, Area_fixed_m2 = full(power_scale), full(Area_fixed_m2)
+        if not cols:
+            cols = {'T_amb': np.full(n_pts, float(self.params['T_amb']))}
+        tasks = [({k: v[a:b] for k, v in cols.items()},
+                  None if power_scale is None else power_scale[a:b],
+                  None if Area_fixed_m2 is None else Area_fixed_m2[a:b],
+                  h_model, h_solver) for a, b in bounds]
+
+        parts = [None] * len(bounds)
+        done = 0
+        if not parallel:
+            # 小型工作：本行程依序計算（仍分塊以限制記憶體）
+            local = dict(c=self._c, tc_limited=self._tc, params=self.params, model=self.model)
+            for i, args in enumerate(tasks):
+                parts[i] = _eval_chunk(*args, **local)
+                done += bounds[i][1] - bounds[i][0]
+                if progress:
+                    progress(done, n_pts)
+        else:
+            pool = self._ensure_pool()
+            futures = {pool.submit(_worker_task, args): i for i, args in enumerate(tasks)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                parts[i] = fut.result()
+                done += bounds[i][1] - bounds[i][0]
+                if progress:
+                    progress(done, n_pts)
+        return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+    def shutdown(self):
+        """關閉 pool 並釋放共享記憶體"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
@@ -0,0 +1,54 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_eval  # noqa: E402
+from batch_eval import RESULT_COLUMNS, ResultWriter  # noqa: E402
+
+
+def _rows(n):
+    """正常列與錯誤列交錯（錯誤列的數值欄為 None），第一個 row group 全為錯誤列"""
+    rows = []
+    for i in range(n):
+        row = dict.fromkeys(RESULT_COLUMNS)
+        row["project"] = f"p{i}.json"
+        if i < 3 or i % 4 == 0:
+            row["error"] = "JSONDecodeError: bad"
+        else:
+            row.update(version="4.19", Volume_L=1.5 + i, total_weight_kg=2.0, Fin_Height=40.0, Fin_Count=20 + i,
+                       Bottleneck="Final PA", Tj_Margin=5.0, Total_Power=300.0, DRC_status="PASS",
+                       DRC_rule="Pass", error="")
+        rows.append(row)
+    return rows
+
+
+def test_csv_writer_rows(tmp_path):
+    out = tmp_path / "res.csv"
+    with ResultWriter(out) as w:
+        for row in _rows(10):
+            w.write(row)
+    with open(out, newline="", encoding="utf-8") as f:
+        got = list(csv.DictReader(f))
+    assert [r["project"] for r in got] == [f"p{i}.json" for i in range(10)]
+
+
+def test_parquet_writer_row_groups(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(batch_eval, "PARQUET_ROW_GROUP", 3)
+    out = tmp_path / "res.parquet"
+    rows = _rows(10)
+    with ResultWriter(out) as w:
+        for row in rows:
+            w.write(row)
+
+    f = pq.ParquetFile(out)
+    assert f.metadata.num_row_groups == 4   # 3 + 3 + 3 + 1（close 時寫出餘數）
+    df = f.read().to_pandas()
+    assert list(df.columns) == RESULT_COLUMNS
+    assert df["project"].tolist() == [r["project"] for r in rows]
+    assert df["Fin_Count"].tolist()[3] == 23
+    assert df["Volume_L"].isna().tolist() == [r["Volume_L"] is None for r in rows]
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import base_components, benchmark_params  # noqa: E402
+from design_optimize import optimize_design  # noqa: E402
+from thermal_engine import ThermalModel, drc_check_vec  # noqa: E402
+
+GRID_GAP = 400
+GRID_FIN_T = 60
+
+
+def _brute_force(params, comps, gap_b, fin_t_b):
+    """Gap × Fin_t 網格上 DRC 全過的最小 Volume_L（無可行點時為 None）"""
+    G, T = np.meshgrid(np.linspace(*gap_b, GRID_GAP), np.linspace(*fin_t_b, GRID_FIN_T))
+    G, T = G.ravel(), T.ravel()
+    res = ThermalModel(params, comps).evaluate({"Gap": G, "Fin_t": T})
+    code = drc_check_vec(params["fin_tech_selector_v2"], G, T, res["Fin_Height"])
+    ok = (code == 0) & (res["Fin_Height"] > 0) & np.isfinite(res["Volume_L"])
+    return float(res["Volume_L"][ok].min()) if ok.any() else None
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_optimizer_not_worse_than_grid(seed):
+    """最佳化結果不得劣於暴力網格（鰭片數斷點上的右端 Gap 曾被算成 n-1 片而遺漏）"""
+    rng = np.random.default_rng(seed)
+    params = benchmark_params()
+    comps = base_components()
+    for k in ("Top", "Btm", "Left", "Right"):
+        if k in params:
+            params[k] = float(params[k]) * rng.uniform(0.7, 1.5)
+    gap_lo = rng.uniform(4.0, 8.0)
+    fin_t_lo = rng.uniform(1.0, 3.0)
+    gap_b = (gap_lo, gap_lo + rng.uniform(2.0, 12.0))
+    fin_t_b = (fin_t_lo, fin_t_lo + rng.uniform(0.5, 3.0))
+
+    best = _brute_force(params, comps, gap_b, fin_t_b)
+    out = optimize_design(params, comps, bounds={"Gap": gap_b, "Fin_t": fin_t_b})
+    if best is None:
+        return
+    assert out["feasible"]
+    assert out["objective"] <= best + 1e-6
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from component_library import UPDATED_FIELD  # noqa: E402
+from local_store import LibraryMirror, SqliteBackend  # noqa: E402
+
+COLL = "rf_library"
+
+
+class Clock:
+    def __init__(self, t=100_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _doc(name, stamp):
+    return {"Component": name, "Power(W)": 1.0, UPDATED_FIELD: stamp}
+
+
+def _stores(clock):
+    """remote：遠端（不記 journal，代表 Firestore）；local：本機離線資料庫"""
+    remote = SqliteBackend(":memory:", journal=False, clock=clock)
+    local = SqliteBackend(":memory:", clock=clock)
+    for d in ("A", "B", "C"):
+        remote.set(COLL, d, _doc(d, clock()))
+    return remote, local
+
+
+def _names(store):
+    return sorted(d["Component"] for d in store.search(COLL))
+
+
+def test_full_pull_catches_hard_delete_and_old_clock_write():
+    clock = Clock()
+    remote, local = _stores(clock)
+    assert local.pull(remote, collections=(COLL,)) == 3
+
+    clock.t += 3600
+    remote._conn.execute("DELETE FROM library WHERE collection = ? AND doc_id = 'B'", (COLL,))   # 無 tombstone
+    remote.set(COLL, "C", _doc("C-old-clock", 1.0))    # 寫入端時鐘落後：增量游標看不到
+    local.set(COLL, "D", _doc("D", clock()))           # 尚未推送的本機新增
+    local.pull(remote, collections=(COLL,))
+    assert _names(local) == ["A", "B", "C", "D"]
+
+    res = local.reconcile(remote, collections=(COLL,), full=True)
+    assert res["removed"] == 1
+    assert _names(local) == ["A", "C-old-clock", "D"]
+    assert _names(remote) == ["A", "C-old-clock", "D"]   # D 已推送
+
+
+def test_mirror_full_resync_periodic_and_manual():
+    clock = Clock()
+    remote, local = _stores(clock)
+    mirror = LibraryMirror(local, remote, interval=60, full_resync=3600, clock=clock)
+
+    def sync():
+        assert mirror.maybe_sync()
+        with mirror._running:      # 等背景 thread 結束
+            pass
+
+    sync()
+    assert mirror.last_full == clock.t and _names(local) == ["A", "B", "C"]
+
+    remote._conn.execute("DELETE FROM library WHERE collection = ? AND doc_id = 'A'", (COLL,))
+    clock.t += 120
+    sync()                          # 增量：看不到硬刪除
+    assert "A" in _names(local)
+    clock.t += 3600
+    sync()                          # 超過 full_resync → 全量
+    assert _names(local) == ["B", "C"]
+
+    remote._conn.execute("DELETE FROM library WHERE collection = ? AND doc_id = 'B'", (COLL,))
+    assert mirror.resync() >= 1
+    assert _names(local) == ["C"]
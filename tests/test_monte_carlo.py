@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import monte_carlo  # noqa: E402
+from benchmark import base_components, benchmark_params  # noqa: E402
+
+TOL = dict(global_tol={"T_amb": {"dist": "normal", "sd": 3}},
+           component_tol={"Power(W)": {"dist": "normal", "rel_sd": 0.05}})
+
+
+def _run_with_raw(monkeypatch, **kw):
+    """執行 Monte Carlo，並攔截各分塊的原始 Tj_Margin 供精確比對（第一次呼叫為直方圖範圍試抽樣，不計入）"""
+    raw = []
+    orig = monte_carlo._chunk_eval
+
+    def spy(*args):
+        out = orig(*args)
+        raw.append(out[0])
+        return out
+
+    monkeypatch.setattr(monte_carlo, "_chunk_eval", spy)
+    res = monte_carlo.run_monte_carlo(benchmark_params(), base_components(), **TOL, **kw)
+    return res, np.concatenate(raw[1:])
+
+
+def test_out_of_range_samples_not_clamped(monkeypatch):
+    """試抽樣極小 → 直方圖範圍窄，範圍外樣本須以原值計入（不得截入邊界格）"""
+    monkeypatch.setattr(monte_carlo, "TJ_HIST_PILOT", 3)
+    res, margin = _run_with_raw(monkeypatch, n_samples=3000, seed=1, chunk_size=500)
+    assert (res.tj_out_of_range[["below", "above"]].to_numpy().sum()) > 0
+
+    qs = [0, 1, 50, 99, 100]
+    got = res.tj_margin_percentiles(qs).iloc[:, 1:].to_numpy(float)
+    exact = np.nanpercentile(margin, qs, axis=0, method="inverted_cdf").T
+    assert np.all(np.abs(got - exact) <= 0.5 * res._tj_step[:, None] + 1e-9)
+    # 有範圍外樣本的一側，極值以原值計 → 精確相等
+    n_out = res.tj_out_of_range[["below", "above"]].to_numpy()
+    np.testing.assert_allclose(got[:, [0, -1]][n_out > 0], exact[:, [0, -1]][n_out > 0])
+
+    thr = float(np.nanmedian(margin))
+    expect = (margin < thr).sum(axis=0) / np.isfinite(margin).sum(axis=0)
+    np.testing.assert_allclose(res.prob_margin_below(thr), expect, atol=1e-12)
+
+
+def test_histogram_size_independent_of_margin_range(monkeypatch):
+    res, _ = _run_with_raw(monkeypatch, n_samples=2000, seed=0, chunk_size=500)
+    assert res._tj_hist.shape == (len(base_components()), monte_carlo.TJ_HIST_BINS)
+
+
+def test_out_of_range_buffer_bounded(monkeypatch):
+    """範圍外樣本很多時只保留最極端的 TJ_OUTSIDE_KEEP 個；計數與極值仍正確"""
+    monkeypatch.setattr(monte_carlo, "TJ_HIST_PILOT", 3)
+    monkeypatch.setattr(monte_carlo, "TJ_OUTSIDE_KEEP", 16)
+    res, margin = _run_with_raw(monkeypatch, n_samples=5000, seed=2, chunk_size=7)
+
+    n_out = res.tj_out_of_range[["below", "above"]].to_numpy()
+    assert n_out.max() > 16
+    assert max(len(v) for v in res._tj_below + res._tj_above) <= 16
+    assert n_out.sum() + res._tj_hist.sum() == np.isfinite(margin).sum()
+
+    got = res.tj_margin_percentiles([0, 100]).iloc[:, 1:].to_numpy(float)
+    np.testing.assert_allclose(got, np.stack([np.nanmin(margin, axis=0), np.nanmax(margin, axis=0)], axis=1))
+    assert np.all(res.prob_margin_below(np.inf) == 1.0)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import base_components, benchmark_params  # noqa: E402
+from thermal_engine import (H_STATUS_CONVERGED, H_STATUS_MAX_ITER, H_STATUS_SKIPPED,  # noqa: E402
+                            ResultCache, ThermalModel)
+
+
+def _model():
+    p = benchmark_params()
+    p["Slope"] = 0.03
+    return ThermalModel(p, base_components())
+
+
+def test_dynamic_h_status_and_caching():
+    """未迭代 / 無效的點照常快取；只有達迭代上限的點每次重算"""
+    model, cache = _model(), ResultCache()
+    ps = np.array([0.0, 1.0, 20.0])   # 零功耗（未迭代）、正常、FH 發散（無效）
+    res = cache.evaluate(model, power_scale=ps, h_model="dynamic")
+    assert res["h_status"].tolist() == [H_STATUS_SKIPPED, H_STATUS_CONVERGED, H_STATUS_SKIPPED]
+    assert len(cache) == 3
+
+    again = cache.evaluate(model, power_scale=ps, h_model="dynamic")
+    assert cache.hits == 3
+    np.testing.assert_array_equal(again["Fin_Height"], res["Fin_Height"])
+
+    capped = cache.evaluate(model, power_scale=ps, h_model="dynamic", h_solver={"max_iter": 1})
+    assert capped["h_status"][1] == H_STATUS_MAX_ITER
+    assert len(cache) == 5   # max_iter=1 為不同 key：零功耗與無效點寫入，未收斂點不寫入
+
+
+def test_warm_start_rejected_on_cached_path():
+    model, cache = _model(), ResultCache()
+    with pytest.raises(ValueError):
+        cache.evaluate(model, power_scale=[1.0, 2.0], h_model="dynamic", h_solver={"warm_start": True})
+    cache.evaluate(model, power_scale=[1.0], h_model="dynamic", h_solver={"warm_start": False})
+    cache.evaluate(model, power_scale=[1.0], h_model="dynamic")
+    assert cache.hits == 1   # warm_start=False 與未指定為同一 key
@@ -0,0 +1,1530 @@
+import functools
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ==============================================================================
+# 5G RRU Thermal Engine - 計算核心
+#
+# 與 app.py 的 Streamlit 介面分離，只依賴 NumPy；pandas 為選用（僅 DataFrame 介面需要，延遲載入），
+# 可被 app.py、批次腳本、worker 行程與測試直接 import，不觸發 UI 副作用（app.py 本身在 import 時即會執行 UI）。
+# 包含：單點計算 (calc_h_value / calc_fin_count / calc_thermal_resistance / compute_key_results)、
+# 重量模型、DRC 規則，以及向量化 / 批次 / 快取版本。
+# ==============================================================================
+
+# calc_thermal_resistance 回傳欄位（順序與舊版 pd.Series 一致）
+THERMAL_COLUMNS = ['Base_L', 'Base_W', 'Loc_Amb', 'R_int', 'R_TIM', 'Total_W', 'Drop', 'Allowed_dT']
+
+# 熱阻計算所需的數值欄位
+NUMERIC_COMPONENT_COLUMNS = ['Qty', 'Power(W)', 'Height(mm)', 'Pad_L', 'Pad_W', 'Thick(mm)', 'Limit(C)', 'R_jc']
+
+K_COPPER_COIN = 380.0
+TIM_DEFAULT = {"k": 1, "t": 0}
+
+
+def _pd():
+    """pandas 延遲載入：只有 DataFrame 輸入 / 輸出的函式才需要"""
+    import pandas as pd
+    return pd
+
+
+def _factorize(values):
+    """依首次出現順序編碼（同 pd.factorize(use_na_sentinel=False)）；pandas 已載入時直接使用"""
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        return codes, list(uniques)
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.intp, count=len(values))
+    return codes, list(index)
+
+
+def component_arrays(df):
+    """將元件表轉為欄位陣列 (dict of np.ndarray)，供向量化核心使用"""
+    c = {col: np.asarray(df[col], dtype=float) for col in NUMERIC_COMPONENT_COLUMNS}
+    c['Component'] = np.asarray(df['Component'], dtype=object)
+    c['Board_Type'] = np.asarray(df['Board_Type'], dtype=object)
+    c['TIM_Type'] = np.asarray(df['TIM_Type'], dtype=object)
+    return c
+
+
+def gather_tim(tim_types, tim_props):
+    """依 TIM_Type 從 tim_props 以向量方式取出 (k, t)；未知類型比照 dict.get 預設 {"k":1, "t":0}"""
+    tim_types = np.asarray(tim_types, dtype=object)
+    codes, uniques = _factorize(tim_types)
+    tims = [tim_props.get(name, TIM_DEFAULT) for name in uniques]
+    return _gather_table([t['k'] for t in tims], codes), _gather_table([t['t'] for t in tims], codes)
+
+
+def _gather_table(values, codes):
+    """values 可為 scalar 或每個設計點一組值 (shape (n_pts, 1))；後者以最後一軸 gather 成 (n_pts, n_comp)"""
+    tab = np.stack(np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in values]), axis=-1)
+    if tab.ndim > 1:
+        tab = tab[..., 0, :]
+    return tab[..., codes]
+
+
+def thermal_kernel(c, g):
+    """
+    整表熱阻計算核心（取代逐列 calc_thermal_resistance）
+    c: component_arrays() 結果；g: globals_dict（需含 tim_props）
+    以遮罩取代逐列分支，結果與 calc_thermal_resistance 逐位元相同。
+    """
+    pad_l, pad_w, thick = c['Pad_L'], c['Pad_W'], c['Thick(mm)']
+    power = c['Power(W)']
+
+    is_pa = c['Component'] == "Final PA"
+    no_base = (power == 0) | (thick == 0)
+    base_l = np.where(is_pa, g['Coin_L_Setting'], np.where(no_base, 0.0, pad_l + thick))
+    base_w = np.where(is_pa, g['Coin_W_Setting'], np.where(no_base, 0.0, pad_w + thick))
+
+    loc_amb = g['T_amb'] + (c['Height(mm)'] * g['Slope'])
+
+    is_coin = c['Board_Type'] == "Copper Coin"
+    is_via = c['Board_Type'] == "Thermal Via"
+    k_board = np.where(is_coin, K_COPPER_COIN, np.where(is_via, g['K_Via'], 0.0))
+
+    pad_area = (pad_l * pad_w) / 1e6
+    base_area = (base_l * base_w) / 1e6
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_int = (k_board > 0) & (pad_area > 0)
+        eff_area = np.where(base_area > 0, np.sqrt(pad_area * base_area), pad_area)
+        r_int_val = (thick / 1000) / (k_board * eff_area)
+        r_solder = (g['t_Solder'] / 1000) / (g['K_Solder'] * pad_area * g['Voiding'])
+        r_int = np.where(is_pa, r_int_val + r_solder,
+                         np.where(is_via, r_int_val / g['Via_Eff'], r_int_val))
+        r_int = np.where(has_int, r_int, 0.0)
+
+        tim_k, tim_t = gather_tim(c['TIM_Type'], g['tim_props'])
+        target_area = np.where(base_area > 0, base_area, pad_area)
+        r_tim = np.where((target_area > 0) & (tim_t > 0), (tim_t / 1000) / (tim_k * target_area), 0.0)
+
+    total_w = c['Qty'] * power
+    drop = power * (c['R_jc'] + r_int + r_tim)
+    allowed_dt = c['Limit(C)'] - drop - loc_amb
+    return dict(zip(THERMAL_COLUMNS, (base_l, base_w, loc_amb, r_int, r_tim, total_w, drop, allowed_dt)))
+
+
+def calc_thermal_resistance_vec(df, g):
+    """整表版 calc_thermal_resistance：回傳與 df.apply(..., axis=1) 相同欄位的 DataFrame"""
+    pd = _pd()
+    if df.empty:
+        return pd.DataFrame(columns=THERMAL_COLUMNS, index=df.index, dtype=float)
+    out = thermal_kernel(component_arrays(df), g)
+    return pd.DataFrame(out, index=df.index, columns=THERMAL_COLUMNS)
+
+
+# ==================================================
+# 單點計算（原 app.py 核心計算函數）
+# ==================================================
+def calc_h_value(Gap):
+    """計算 h_conv, h_rad, h_value"""
+    h_conv = 6.4 * np.tanh(Gap / 7.0)
+    if Gap >= 10.0:
+        rad_factor = 1.0
+    else:
+        rad_factor = np.sqrt(Gap / 10.0)
+    h_rad = 2.4 * rad_factor
+    h_value = h_conv + h_rad
+    return h_value, h_conv, h_rad
+
+
+def calc_fin_count(W_hsk, Gap, Fin_t):
+    """植樹原理計算最大鰭片數"""
+    if Gap + Fin_t > 0:
+        num_fins_float = (W_hsk + Gap) / (Gap + Fin_t)
+        num_fins_int = int(num_fins_float)
+        if num_fins_int > 0:
+            total_width = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
+            # 【關鍵修復】加入 0.001 mm 容差，避免因浮點精度誤差導致 total_width 在邊界（如 273.999999 vs 274.000001）誤判而減片
+            while total_width > W_hsk + 0.001 and num_fins_int > 0:
+                num_fins_int -= 1
+                total_width = num_fins_int * Fin_t + (num_fins_int - 1) * Gap
+    else:
+        num_fins_int = 0
+    return num_fins_int
+
+
+def calc_thermal_resistance(row, g):
+    """單行元件熱阻計算 (取代原本 apply_excel_formulas)；整表計算請用 calc_thermal_resistance_vec"""
+    # 從 g (globals_dict) 取出需要的全域變數
+    if row['Component'] == "Final PA":
+        base_l, base_w = g['Coin_L_Setting'], g['Coin_W_Setting']
+    elif row['Power(W)'] == 0 or row['Thick(mm)'] == 0:
+        base_l, base_w = 0.0, 0.0
+    else:
+        base_l, base_w = row['Pad_L'] + row['Thick(mm)'], row['Pad_W'] + row['Thick(mm)']
+
+    loc_amb = g['T_amb'] + (row['Height(mm)'] * g['Slope'])
+
+    if row['Board_Type'] == "Copper Coin":
+        k_board = K_COPPER_COIN
+    elif row['Board_Type'] == "Thermal Via":
+        k_board = g['K_Via']
+    else:
+        k_board = 0.0
+
+    pad_area = (row['Pad_L'] * row['Pad_W']) / 1e6
+    base_area = (base_l * base_w) / 1e6
+
+    if k_board > 0 and pad_area > 0:
+        eff_area = np.sqrt(pad_area * base_area) if base_area > 0 else pad_area
+        r_int_val = (row['Thick(mm)']/1000) / (k_board * eff_area)
+        if row['Component'] == "Final PA":
+            r_int = r_int_val + ((g['t_Solder']/1000) / (g['K_Solder'] * pad_area * g['Voiding']))
+        elif row['Board_Type'] == "Thermal Via":
+            r_int = r_int_val / g['Via_Eff']
+        else:
+            r_int = r_int_val
+    else:
+        r_int = 0
+
+    tim = g['tim_props'].get(row['TIM_Type'], TIM_DEFAULT)
+    target_area = base_area if base_area > 0 else pad_area
+    if target_area > 0 and tim['t'] > 0:
+        r_tim = (tim['t']/1000) / (tim['k'] * target_area)
+    else:
+        r_tim = 0
+
+    total_w = row['Qty'] * row['Power(W)']
+    drop = row['Power(W)'] * (row['R_jc'] + r_int + r_tim)
+    allowed_dt = row['Limit(C)'] - drop - loc_amb
+    return _pd().Series([base_l, base_w, loc_amb, r_int, r_tim, total_w, drop, allowed_dt])
+
+
+# [v4.11 Core] compute_key_results，供敏感度分析使用
+def compute_key_results(global_params, df_components, Area_fixed_m2=None):
+    """
+    獨立計算核心結果，不依賴 Streamlit session_state
+    返回 dict 包含關鍵 KPI
+    """
+    pd = _pd()
+    # 複製參數，避免修改原始
+    p = global_params.copy()
+    df = df_components.copy()
+
+    # 準備 globals_dict 給 calc_thermal_resistance 使用
+    g_for_calc = p.copy()
+    g_for_calc['tim_props'] = build_tim_props(p)
+
+    # === 熱阻與溫降計算 ===
+    if not df.empty:
+        calc_results = calc_thermal_resistance_vec(df, g_for_calc)
+        df = pd.concat([df, calc_results], axis=1)
+
+        df["Allowed_dT"] = df["Allowed_dT"].clip(lower=0)
+        Total_Power = (df["Power(W)"] * df["Qty"]).sum() * p["Margin"]
+
+        # [Fix v4.19] 邏輯對齊：計算瓶頸時，僅考慮總功耗 > 0 的元件 (排除不發熱元件)
+        valid_rows = df[df['Total_W'] > 0]
+        if not valid_rows.empty:
+            Min_dT_Allowed = valid_rows["Allowed_dT"].min()
+            if not pd.isna(valid_rows["Allowed_dT"].idxmin()):
+                Bottleneck_Name = valid_rows.loc[valid_rows["Allowed_dT"].idxmin(), "Component"]
+            else:
+                Bottleneck_Name = "None"
+        else:
+            Min_dT_Allowed = 50 # 預設安全值
+            Bottleneck_Name = "None"
+
+    else:
+        Total_Power = 0
+        Min_dT_Allowed = 50
+        Bottleneck_Name = "None"
+
+    # === h 值 ===
+    h_value, h_conv, h_rad = calc_h_value(p["Gap"])
+
+    # === 鰭片高度與尺寸 ===
+    L_hsk = p["L_pcb"] + p["Left"] + p["Right"]
+    W_hsk = p["W_pcb"] + p["Top"] + p["Btm"]
+    base_area_m2 = (L_hsk * W_hsk) / 1e6
+
+    num_fins_int = calc_fin_count(W_hsk, p["Gap"], p["Fin_t"])
+
+    # === 所需面積 ===
+    eff = 0.95 if "Embedded" in p["fin_tech_selector_v2"] else 0.90
+
+    if Total_Power > 0 and Min_dT_Allowed > 0:
+        Area_req = 1 / (h_value * (Min_dT_Allowed / Total_Power) * eff)
+        try:
+             Fin_Height = ((Area_req - base_area_m2) * 1e6) / (2 * num_fins_int * L_hsk)
+        except:
+             Fin_Height = 0
+    else:
+        Area_req = 0
+        Fin_Height = 0
+
+    # === 體積與重量 (Detailed Logic) ===
+    RRU_Height = p["H_shield"] + p["H_filter"] + p["t_base"] + Fin_Height
+    # 【關鍵修復】先計算未 round 的原始體積（與 Tab 3 計算邏輯一致，避免 round 順序導致微差）
+    volume_raw = L_hsk * W_hsk * RRU_Height / 1e6
+
+    total_weight_kg = calc_weight_vec(p, L_hsk, W_hsk, num_fins_int, Fin_Height)["total_weight_kg"]
+
+    # === Bottleneck Tj_Margin 計算 (供敏感度分析使用) ===
+    # 若提供 Area_fixed_m2 (Fixed-Design)：以固定散熱面積反算 T_hsk，
+    # 這樣改變 T_amb / Power / Gap 時 Tj_Margin 才能正確反映差異。
+    # 若未提供 (一般計算)：散熱器重新 sizing，Tj_Margin = D × (1 - 1/Margin)。
+    Bottleneck_Tj_Margin = 0.0
+    if not df.empty and Bottleneck_Name != "None" and 'R_int' in df.columns:
+        _slope = p.get('Slope', 0.03)
+        if Area_fixed_m2 is not None and Area_fixed_m2 > 0:
+            _T_hsk_base = p['T_amb'] + Total_Power / (h_value * Area_fixed_m2 * eff)
+        else:
+            _T_hsk_base = p['T_amb'] + Min_dT_Allowed / p['Margin']
+        df['_T_hsk_eff'] = _T_hsk_base + df['Height(mm)'] * _slope
+        df['_Tc'] = df['_T_hsk_eff'] + df['Power(W)'] * (df['R_int'] + df['R_TIM'])
+        df['_Tj'] = df['_Tc'] + df['Power(W)'] * df['R_jc']
+        _tc_lim = df['Component'].str.contains('DDR', case=False, na=False)
+        if '_src' in df.columns:
+            _tc_lim = _tc_lim | (df['_src'] == 'PWR')
+        df['_T_ref'] = df['_Tj']
+        df.loc[_tc_lim, '_T_ref'] = df.loc[_tc_lim, '_Tc']
+        df['_Tj_Margin'] = df['Limit(C)'] - df['_T_ref']
+        _valid_tj = df[df['Total_W'] > 0]
+        if not _valid_tj.empty:
+            _bt_idx = _valid_tj['Allowed_dT'].idxmin()
+            if not pd.isna(_bt_idx):
+                Bottleneck_Tj_Margin = round(_valid_tj.loc[_bt_idx, '_Tj_Margin'], 1)
+
+    return {
+        "Total_Power": Total_Power,
+        "Min_dT_Allowed": Min_dT_Allowed,
+        "Bottleneck_Name": Bottleneck_Name,
+        "Area_req": Area_req,
+        "Fin_Height": Fin_Height,
+        "Volume_L": volume_raw,
+        "total_weight_kg": total_weight_kg,
+        "h_value": h_value,
+        "Bottleneck_Tj_Margin": Bottleneck_Tj_Margin,
+        "Fin_Count": num_fins_int,
+    }
+
+
+# ==================================================
+# 主頁熱流程（單一專案）
+# ==================================================
+def run_main_pipeline(df_components, global_params):
+    """
+    主頁熱流程：元件熱阻 → Tc/Tj 反推 → 鰭片/體積 → 重量 → DRC（app.py 主頁與批次評估共用）
+    df_components: 三類元件合併表（含 _src 標記）；global_params: 全域參數（可含 tim_props，否則由 K_/t_ 參數建立）
+    註：主頁的 L_hsk = L_pcb + Top + Btm，與 compute_key_results 的 L/W 慣例不同，維持主頁原樣
+    """
+    pd = _pd()
+    p = dict(global_params)
+    p.setdefault('Slope', 0.03)
+    g = dict(p)
+    g.setdefault('tim_props', build_tim_props(p))
+    T_amb, Slope, Margin = p['T_amb'], p['Slope'], p['Margin']
+    L_pcb, W_pcb, Top, Btm, Left, Right = p['L_pcb'], p['W_pcb'], p['Top'], p['Btm'], p['Left'], p['Right']
+    Gap, Fin_t = p['Gap'], p['Fin_t']
+    t_base, H_shield, H_filter = p['t_base'], p['H_shield'], p['H_filter']
+    fin_tech = p['fin_tech_selector_v2']
+    Eff = 0.95 if "Embedded" in fin_tech else 0.90
+
+    # 元件熱阻計算
+    if not df_components.empty:
+        # [Perf] 整表向量化計算（結果與逐列 calc_thermal_resistance 逐位元相同）
+        calc_results = calc_thermal_resistance_vec(df_components, g)
+        final_df = pd.concat([df_components, calc_results], axis=1)
+    else:
+        final_df = pd.DataFrame()
+
+    # 總功耗與瓶頸
+    valid_rows = final_df[final_df['Total_W'] > 0].copy() if not final_df.empty else final_df
+    if not valid_rows.empty:
+        Total_Watts_Sum = valid_rows['Total_W'].sum()
+        Min_dT_Allowed = valid_rows['Allowed_dT'].min()
+        Bottleneck_Name = valid_rows.loc[valid_rows['Allowed_dT'].idxmin()]['Component'] if not pd.isna(valid_rows['Allowed_dT'].idxmin()) else "None"
+    else:
+        Total_Watts_Sum = 0; Min_dT_Allowed = 50; Bottleneck_Name = "None"
+
+    Bottleneck_Tj_Margin = 0  # 預設值，稍後在 Tj_Margin 計算完成後更新
+
+    # [New] 反向推算 Tc / Tj
+    # T_hsk_base = 散熱器基部溫度（h=0），由瓶頸裕度反推
+    # T_hsk_eff  = 各元件高度處的散熱器有效溫度（含高度梯度修正）
+    # [Fix v4.31] 散熱器實際設計容量 = nominal_power × Margin，
+    # 故實際運作時基部溫升為 Min_dT_Allowed / Margin，Margin > 1 時元件自然有正裕度
+    T_hsk_base = T_amb + Min_dT_Allowed / Margin
+    if not final_df.empty:
+        final_df['T_hsk_eff'] = T_hsk_base + final_df['Height(mm)'] * Slope
+        final_df['Tc'] = final_df['T_hsk_eff'] + final_df['Power(W)'] * (final_df['R_int'] + final_df['R_TIM'])
+        final_df['Tj'] = final_df['Tc'] + final_df['Power(W)'] * final_df['R_jc']
+
+        # Tc 限溫元件：PWR 類 + 名稱含 DDR 的 Digital 類（限溫規格指 Tc，非 Tj）
+        tc_limited = (final_df.get('_src', '') == 'PWR') | \
+                     (final_df['Component'].str.contains('DDR', case=False, na=False))
+        final_df['T_ref'] = final_df['Tj']
+        final_df.loc[tc_limited, 'T_ref'] = final_df.loc[tc_limited, 'Tc']
+        final_df['Temp_Label'] = 'Tj'
+        final_df.loc[tc_limited, 'Temp_Label'] = 'Tc'
+        final_df['Tj_Margin'] = final_df['Limit(C)'] - final_df['T_ref']
+
+        # [Update] 更新 valid_rows 以包含 Tj/Tc/Tj_Margin 欄位（供 Tab 3 圖表使用）
+        valid_rows = final_df[final_df['Total_W'] > 0].copy()
+        if not valid_rows.empty and 'Tj_Margin' in valid_rows.columns and Bottleneck_Name != "None":
+            bt_idx = valid_rows.loc[valid_rows['Allowed_dT'].idxmin()].name
+            Bottleneck_Tj_Margin = round(valid_rows.loc[bt_idx, 'Tj_Margin'], 1)
+
+    L_hsk, W_hsk = L_pcb + Top + Btm, W_pcb + Left + Right
+
+    # 核心計算呼叫
+    h_value, h_conv, h_rad = calc_h_value(Gap)
+    num_fins_int = calc_fin_count(W_hsk, Gap, Fin_t)
+    Fin_Count = num_fins_int
+
+    Total_Power = Total_Watts_Sum * Margin
+    if Total_Power > 0 and Min_dT_Allowed > 0:
+        R_sa = Min_dT_Allowed / Total_Power
+        Area_req = 1 / (h_value * R_sa * Eff)
+        Base_Area_m2 = (L_hsk * W_hsk) / 1e6
+        try:
+            Fin_Height = ((Area_req - Base_Area_m2) * 1e6) / (2 * Fin_Count * L_hsk)
+        except:
+            Fin_Height = 0
+        RRU_Height = t_base + Fin_Height + H_shield + H_filter
+        Volume_L = (L_hsk * W_hsk * RRU_Height) / 1e6
+
+        # [v3.84] 重量計算
+        w = calc_weight_vec(p, L_hsk, W_hsk, num_fins_int, Fin_Height)
+        total_weight_kg = w['total_weight_kg']; hs_weight_kg = w['hs_weight_kg']
+        shield_weight_kg = w['shield_weight_kg']; filter_weight_kg = w['filter_weight_kg']
+        shielding_weight_kg = w['shielding_weight_kg']; pcb_weight_kg = w['pcb_weight_kg']
+
+    else:
+        R_sa = 0; Area_req = 0; Fin_Height = 0; RRU_Height = 0; Volume_L = 0
+        # [Fix NameError] 必須初始化重量變數
+        total_weight_kg = 0; hs_weight_kg = 0; shield_weight_kg = 0
+        filter_weight_kg = 0; shielding_weight_kg = 0; pcb_weight_kg = 0
+
+    # ==================================================
+    # [DRC] 設計規則檢查
+    # ==================================================
+    drc = drc_check(fin_tech, Gap, Fin_t, Fin_Height)
+    aspect_ratio = drc['aspect_ratio']
+    drc_failed, drc_msg, drc_warn_msg = drc['drc_failed'], drc['drc_msg'], drc['drc_warn_msg']
+
+    return {
+        'final_df': final_df,
+        'valid_rows': valid_rows,
+        'Total_Watts_Sum': Total_Watts_Sum,
+        'Min_dT_Allowed': Min_dT_Allowed,
+        'Bottleneck_Name': Bottleneck_Name,
+        'Bottleneck_Tj_Margin': Bottleneck_Tj_Margin,
+        'T_hsk_base': T_hsk_base,
+        'L_hsk': L_hsk,
+        'W_hsk': W_hsk,
+        'h_value': h_value,
+        'h_conv': h_conv,
+        'h_rad': h_rad,
+        'num_fins_int': num_fins_int,
+        'Fin_Count': Fin_Count,
+        'Total_Power': Total_Power,
+        'R_sa': R_sa,
+        'Area_req': Area_req,
+        'Fin_Height': Fin_Height,
+        'RRU_Height': RRU_Height,
+        'Volume_L': Volume_L,
+        'total_weight_kg': total_weight_kg,
+        'hs_weight_kg': hs_weight_kg,
+        'shield_weight_kg': shield_weight_kg,
+        'filter_weight_kg': filter_weight_kg,
+        'shielding_weight_kg': shielding_weight_kg,
+        'pcb_weight_kg': pcb_weight_kg,
+        'aspect_ratio': aspect_ratio,
+        'drc_failed': drc_failed,
+        'drc_msg': drc_msg,
+        'drc_warn_msg': drc_warn_msg,
+    }
+
+
+MAIN_BATCH_KEYS = ['Total_Power', 'Min_dT_Allowed', 'Bottleneck_Name', 'Bottleneck_Tj_Margin', 'Fin_Height',
+                   'Fin_Count', 'Volume_L', 'total_weight_kg', 'aspect_ratio', 'DRC_code', 'DRC_warn']
+
+
+def _tc_limited_arrays(component, src):
+    """tc_limited_mask 的陣列版（不需 pandas）：PWR 類 + 名稱含 DDR（不分大小寫）"""
+    ddr = np.fromiter((isinstance(x, str) and 'ddr' in x.lower() for x in component), dtype=bool, count=len(component))
+    return ddr | (np.asarray(src, dtype=object) == 'PWR')
+
+
+def run_main_pipeline_batch(projects):
+    """
+    多專案向量化主頁熱流程：所有專案的元件列串接後一次計算熱阻，再依專案分段取瓶頸 / 加總，
+    散熱器 sizing、重量與 DRC 以專案為單位向量化（結果同逐一呼叫 run_main_pipeline，加總順序可能差 1 ulp）
+    projects: [(global_params, components)]，components 為 component_arrays() 格式的 dict（可含 '_src'）
+    回傳 {MAIN_BATCH_KEYS: ndarray (n_projects,)}；DRC_code 見 DRC_RULES，DRC_warn 為壓鑄高厚比接近上限
+    """
+    n_proj = len(projects)
+    params = []
+    for gp, _ in projects:
+        p = dict(gp)
+        p.setdefault('Slope', 0.03)
+        params.append(p)
+    sizes = np.array([len(c['Power(W)']) for _, c in projects], dtype=np.int64)
+    proj = np.repeat(np.arange(n_proj), sizes)
+    P = {k: np.array([p[k] for p in params], dtype=float)
+         for k in KERNEL_PARAMS + ['Margin', 'L_pcb', 'W_pcb', 'Top', 'Btm', 'Left', 'Right', 'Gap', 'Fin_t',
+                                   't_base', 'H_shield', 'H_filter', 'al_density', 'filter_density',
+                                   'shielding_density', 'pcb_surface_density']}
+    fin_tech = np.array([p['fin_tech_selector_v2'] for p in params], dtype=object)
+
+    # 元件熱阻：各專案參數展開到元件列；TIM 以 (專案, 類型) 為 key 查表
+    c = {col: np.concatenate([np.asarray(comp[col], dtype=float) for _, comp in projects])
+         for col in NUMERIC_COMPONENT_COLUMNS}
+    for col in ('Component', 'Board_Type'):
+        c[col] = np.concatenate([np.asarray(comp[col], dtype=object) for _, comp in projects])
+    tim_keys = np.empty(len(proj), dtype=object)
+    tim_keys[:] = [(int(i), t) for i, t in zip(proj, np.concatenate([np.asarray(comp['TIM_Type'], dtype=object)
+                                                                     for _, comp in projects]))]
+    c['TIM_Type'] = tim_keys
+    tim_props = {}
+    for i, p in enumerate(params):
+        for name, v in (p.get('tim_props') or build_tim_props(p)).items():
+            tim_props[(i, name)] = v
+    g = {k: P[k][proj] for k in KERNEL_PARAMS if k in P}
+    g['tim_props'] = tim_props
+    k_out = thermal_kernel(c, g)
+
+    # 分段瓶頸：僅 Total_W > 0 的元件；第一個最小 Allowed_dT（同 idxmin）
+    allowed = k_out['Allowed_dT']
+    valid = k_out['Total_W'] > 0
+    Total_Watts_Sum = np.bincount(proj, weights=np.where(valid, k_out['Total_W'], 0.0), minlength=n_proj)
+    has_valid = np.bincount(proj, weights=valid, minlength=n_proj) > 0
+    key = np.where(valid, allowed, np.inf)
+    order = np.lexsort((np.arange(len(proj)), key, proj))
+    nonempty = sizes > 0
+    bt = np.zeros(n_proj, dtype=np.int64)
+    bt[nonempty] = order[(np.cumsum(sizes) - sizes)[nonempty]]
+    bt_dt = np.full(n_proj, np.inf)
+    bt_dt[nonempty] = key[bt[nonempty]]
+    has_bt = has_valid & ~np.isnan(bt_dt)
+    Min_dT_Allowed = np.where(has_valid, bt_dt, 50.0)
+    names = np.full(n_proj, "None", dtype=object)
+    names[has_bt] = c['Component'][bt[has_bt]]
+
+    # 瓶頸 Tj 裕度（Margin 反推散熱器基部溫度；PWR / DDR 以 Tc 為準）
+    T_hsk_base = P['T_amb'] + Min_dT_Allowed / P['Margin']
+    src = np.concatenate([np.asarray(comp['_src'], dtype=object) if '_src' in comp
+                          else np.full(len(comp['Power(W)']), None, dtype=object) for _, comp in projects])
+    tc_limited = _tc_limited_arrays(c['Component'], src)
+    Tj_Margin = np.zeros(n_proj)
+    j, i = bt[has_bt], np.flatnonzero(has_bt)
+    Tc = T_hsk_base[i] + c['Height(mm)'][j] * P['Slope'][i] + c['Power(W)'][j] * (k_out['R_int'][j] + k_out['R_TIM'][j])
+    Tj = Tc + c['Power(W)'][j] * c['R_jc'][j]
+    Tj_Margin[i] = np.round(c['Limit(C)'][j] - np.where(tc_limited[j], Tc, Tj), 1)
+    Tj_Margin[names == "None"] = 0.0
+
+    # 散熱器 sizing / 體積 / 重量（主頁 L/W 慣例）
+    L_hsk = P['L_pcb'] + P['Top'] + P['Btm']
+    W_hsk = P['W_pcb'] + P['Left'] + P['Right']
+    h_value = calc_h_value_vec(P['Gap'])[0]
+    num_fins = calc_fin_count_vec(W_hsk, P['Gap'], P['Fin_t'])
+    eff = np.array([0.95 if "Embedded" in t else 0.90 for t in fin_tech])
+    Total_Power = Total_Watts_Sum * P['Margin']
+    ok = (Total_Power > 0) & (Min_dT_Allowed > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Area_req = 1 / (h_value * (Min_dT_Allowed / Total_Power) * eff)
+        FH = ((Area_req - (L_hsk * W_hsk) / 1e6) * 1e6) / (2 * num_fins * L_hsk)
+    Fin_Height = np.where(ok, FH, 0.0)
+    RRU_Height = P['t_base'] + Fin_Height + P['H_shield'] + P['H_filter']
+    Volume_L = np.where(ok, (L_hsk * W_hsk * RRU_Height) / 1e6, 0.0)
+    total_weight_kg = np.where(ok, calc_weight_vec(P, L_hsk, W_hsk, num_fins, Fin_Height)['total_weight_kg'], 0.0)
+
+    # DRC
+    drc_code = drc_check_vec(fin_tech, P['Gap'], P['Fin_t'], Fin_Height)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_ratio = np.where((P['Gap'] > 0) & (Fin_Height > 0), Fin_Height / P['Gap'], 0.0)
+        fin_ratio = np.where(P['Fin_t'] > 0, Fin_Height / P['Fin_t'], np.inf)
+    die_casting = np.array(["Embedded" not in t and "Die-casting" in t for t in fin_tech], dtype=bool)
+    drc_warn = die_casting & (drc_code == 0) & (fin_ratio > DRC_DC_RATIO_WARN)
+    return {
+        'Total_Power': Total_Power, 'Min_dT_Allowed': Min_dT_Allowed, 'Bottleneck_Name': names,
+        'Bottleneck_Tj_Margin': Tj_Margin, 'Fin_Height': Fin_Height, 'Fin_Count': num_fins,
+        'Volume_L': Volume_L, 'total_weight_kg': total_weight_kg, 'aspect_ratio': aspect_ratio,
+        'DRC_code': drc_code, 'DRC_warn': drc_warn,
+    }
+
+
+# ==================================================
+# 批次計算 (designs × components broadcast)
+# ==================================================
+# 影響元件熱阻 (Allowed_dT) 的全域參數；其餘參數只影響散熱器尺寸與重量
+KERNEL_PARAMS = ['T_amb', 'Slope', 'Coin_L_Setting', 'Coin_W_Setting', 'K_Via', 'Via_Eff',
+                 'K_Solder', 't_Solder', 'Voiding',
+                 'K_Grease', 't_Grease', 'K_Pad', 't_Pad', 'K_Pad2', 't_Pad2', 'K_Putty', 't_Putty']
+
+BATCH_RESULT_KEYS = ['Total_Power', 'Min_dT_Allowed', 'Bottleneck_Index', 'Area_req', 'Fin_Height',
+                     'Volume_L', 'total_weight_kg', 'h_value', 'Bottleneck_Tj_Margin', 'Fin_Count']
+
+
+def build_tim_props(p):
+    """由全域參數建立 tim_props（與 compute_key_results 相同結構）"""
+    return {
+        "Solder": {"k": p["K_Solder"], "t": p["t_Solder"]},
+        "Grease": {"k": p["K_Grease"], "t": p["t_Grease"]},
+        "Pad": {"k": p["K_Pad"], "t": p["t_Pad"]},
+        "Pad2": {"k": p["K_Pad2"], "t": p["t_Pad2"]},
+        "Putty": {"k": p["K_Putty"], "t": p["t_Putty"]},
+        "None": {"k": 1, "t": 0}
+    }
+
+
+def calc_h_value_vec(Gap):
+    """陣列版 calc_h_value"""
+    Gap = np.asarray(Gap, dtype=float)
+    h_conv = 6.4 * np.tanh(Gap / 7.0)
+    with np.errstate(invalid='ignore'):
+        rad_factor = np.where(Gap >= 10.0, 1.0, np.sqrt(Gap / 10.0))
+    h_rad = 2.4 * rad_factor
+    h_value = h_conv + h_rad
+    return h_value, h_conv, h_rad
+
+
+FIN_WIDTH_TOL = 0.001  # mm，與 calc_fin_count 相同的浮點容差
+
+
+def calc_fin_count_vec(W_hsk, Gap, Fin_t):
+    """
+    陣列版 calc_fin_count（植樹原理 + 0.001 mm 容差，逐點與純量版相同）
+    閉合解：n = floor((W + Gap) / (Gap + Fin_t))；數學上 n 片總寬必 ≤ W，
+    純量版的 while 迴圈只在浮點誤差超過容差時減一片，故一次遮罩修正即等價。
+    """
+    W_hsk, Gap, Fin_t = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (W_hsk, Gap, Fin_t)))
+    pitch = Gap + Fin_t
+    ok = pitch > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = np.where(ok, np.trunc((W_hsk + Gap) / np.where(ok, pitch, 1.0)), 0.0)
+    total_width = n * Fin_t + (n - 1) * Gap
+    n = n - ((n > 0) & (total_width > W_hsk + FIN_WIDTH_TOL))
+    return n.astype(np.int64)
+
+
+def fin_count_breakpoints(W_hsk, lo, hi, Gap=None, Fin_t=None):
+    """
+    固定 W_hsk 下，鰭片數跳階的確切位置（Gap 或 Fin_t 二擇一為掃描變數，另一個固定）
+    - 掃 Gap（給 Fin_t）：n ≥ k ⇔ Gap ≤ (W - k·Fin_t) / (k - 1)
+    - 掃 Fin_t（給 Gap）：n ≥ k ⇔ Fin_t ≤ (W - (k-1)·Gap) / k
+    回傳 dict：x（區間 [lo, hi] 內的斷點，遞增）、n_left（x 左側的鰭片數 = k）、
+    n_right（越過 x 後的鰭片數 = k - 1）。x 本身理論上仍為 k 片，實際結果受浮點誤差影響。
+    """
+    if (Gap is None) == (Fin_t is None):
+        raise ValueError("Gap 與 Fin_t 需恰好指定一個（另一個為掃描變數）")
+    W = float(W_hsk)
+    lo, hi = float(lo), float(hi)
+    if Gap is None:
+        t = float(Fin_t)
+        k_min = max(int(np.ceil((W + hi) / (t + hi))), 2) if t + hi > 0 else 2
+        k_max = int(np.floor((W + lo) / (t + lo))) if t + lo > 0 else k_min - 1
+        k = np.arange(k_min, k_max + 1)
+        x = (W - k * t) / (k - 1)
+    else:
+        G = float(Gap)
+        k_min = max(int(np.ceil((W + G) / (G + hi))), 1) if G + hi > 0 else 1
+        k_max = int(np.floor((W + G) / (G + lo))) if G + lo > 0 else k_min - 1
+        k = np.arange(k_min, k_max + 1)
+        x = (W - (k - 1) * G) / k
+    keep = (x >= lo) & (x <= hi)
+    order = np.argsort(x[keep], kind='stable')
+    k = k[keep][order]
+    return {"x": x[keep][order], "n_left": k, "n_right": k - 1}
+
+
+def with_fin_breakpoints(x_values, W_hsk, Gap=None, Fin_t=None):
+    """將鰭片數跳階點併入掃描點（排序、去重），讓掃描正好落在不連續處"""
+    x_values = np.asarray(x_values, dtype=float)
+    if x_values.size == 0:
+        return x_values
+    bp = fin_count_breakpoints(W_hsk, x_values.min(), x_values.max(), Gap=Gap, Fin_t=Fin_t)["x"]
+    return np.unique(np.concatenate([x_values, bp]))
+
+
+def tc_limited_mask(df):
+    """Tc 限溫元件：PWR 類 + 名稱含 DDR（限溫規格指 Tc，非 Tj）"""
+    mask = df['Component'].str.contains('DDR', case=False, na=False)
+    if '_src' in df.columns:
+        mask = mask | (df['_src'] == 'PWR')
+    return np.asarray(mask, dtype=bool)
+
+
+def _design_columns(design):
+    """design matrix（DataFrame / dict of arrays）→ {參數名: 1-D array}，並回傳點數"""
+    if design is None:
+        return {}, None
+    cols = {k: np.asarray(v, dtype=float).ravel() for k, v in dict(design).items()}
+    sizes = {v.size for v in cols.values()}
+    if len(sizes) > 1:
+        raise ValueError(f"design matrix 欄位長度不一致: {sorted(sizes)}")
+    return cols, (sizes.pop() if sizes else None)
+
+
+def _n_points(n_pts, power_scale, Area_fixed_m2):
+    """整理 power_scale / Area_fixed_m2 為 1-D 陣列並決定設計點數"""
+    if power_scale is not None:
+        power_scale = np.asarray(power_scale, dtype=float).ravel()
+        if n_pts is not None and power_scale.size not in (1, n_pts):
+            raise ValueError("power_scale 長度需與 design matrix 相同")
+        n_pts = max(n_pts or 1, power_scale.size)
+    if Area_fixed_m2 is not None:
+        Area_fixed_m2 = np.asarray(Area_fixed_m2, dtype=float).ravel()
+        n_pts = max(n_pts or 1, Area_fixed_m2.size)
+    return n_pts or 1, power_scale, Area_fixed_m2
+
+
+def _col(v):
+    """每點一值的 1-D 陣列轉為 (n_pts, 1)，以便與元件軸廣播"""
+    return v[:, None] if np.ndim(v) == 1 else v
+
+
+def _evaluate_designs(p, n_pts, comp, power, allowed, Area_fixed_m2, h_model="constant", h_solver=None):
+    """
+    批次計算共用後段：由元件溫降結果決定瓶頸，再推算散熱器尺寸、體積、重量與 Tj_Margin
+    comp: 元件欄位 (Qty, Height(mm), R_jc, Limit(C), R_int, R_TIM, tc_limited)；
+    power / allowed: 每點每元件的功耗與 Allowed_dT（可廣播至 (n_pts, n_comp)）
+    h_model / h_solver: 見 _size_designs
+    """
+    n_comp = len(comp['Qty'])
+    if n_comp:
+        shape = (n_pts, n_comp)
+        power = np.broadcast_to(power, shape)
+        allowed = np.broadcast_to(allowed, shape)
+        allowed = np.where(allowed < 0, 0.0, allowed)
+        Total_Power = np.nansum(power * comp['Qty'], axis=1) * p["Margin"]
+
+        # [Fix v4.19] 僅考慮總功耗 > 0 的元件
+        valid = (comp['Qty'] * power) > 0
+        usable = valid & ~np.isnan(allowed)
+        masked = np.where(usable, allowed, np.inf)
+        bt_idx = np.argmin(masked, axis=1)
+        has_bt = usable.any(axis=1)
+        Min_dT_Allowed = np.where(valid.any(axis=1),
+                                  np.where(has_bt, masked[np.arange(n_pts), bt_idx], np.nan), 50.0)
+        P_bt = power[np.arange(n_pts), bt_idx]
+    else:
+        Total_Power = np.zeros(n_pts)
+        Min_dT_Allowed = np.full(n_pts, 50.0)
+        bt_idx = np.zeros(n_pts, dtype=np.int64)
+        has_bt = np.zeros(n_pts, dtype=bool)
+        P_bt = np.zeros(n_pts)
+    return _size_designs(p, n_pts, comp, Total_Power, Min_dT_Allowed, bt_idx, has_bt, P_bt, Area_fixed_m2,
+                         h_model=h_model, h_solver=h_solver)
+
+
+def _size_designs(p, n_pts, comp, Total_Power, Min_dT_Allowed, bt_idx, has_bt, P_bt, Area_fixed_m2, margin_decimals=1,
+                  h_model="constant", h_solver=None):
+    """
+    由總功耗、瓶頸元件與其 Allowed_dT 推算 h、鰭片高度、體積、重量與瓶頸 Tj_Margin（margin_decimals=None 不四捨五入）
+    h_model="dynamic"：以 solve_fin_height_dynamic 迭代 h(FH) 與 η_fin（h_solver 為其額外參數），
+    並額外回傳 eta_fin、eff、h_iterations、h_status（見 H_STATUS）
+    """
+    if h_model not in H_MODELS:
+        raise ValueError(f"h_model 需為 {H_MODELS} 之一，收到 {h_model!r}")
+    full = lambda v: np.broadcast_to(np.asarray(v, dtype=float), (n_pts,)).copy()
+    Total_Power = full(Total_Power)
+    Min_dT_Allowed = full(Min_dT_Allowed)
+
+    # === 鰭片尺寸 ===
+    L_hsk = p["L_pcb"] + p["Left"] + p["Right"]
+    W_hsk = p["W_pcb"] + p["Top"] + p["Btm"]
+    base_area_m2 = (L_hsk * W_hsk) / 1e6
+    num_fins_int = calc_fin_count_vec(W_hsk, p["Gap"], p["Fin_t"])
+    die_casting = "Embedded" not in p["fin_tech_selector_v2"]
+    extra = {}
+
+    if h_model == "dynamic":
+        # === 動態 h / η_fin：所有點同時迭代 ===
+        sol = solve_fin_height_dynamic(Total_Power, Min_dT_Allowed, p["Gap"], p["Fin_t"], L_hsk, base_area_m2,
+                                       num_fins_int, die_casting=die_casting, **(h_solver or {}))
+        h_value, eff = sol["h_value"], sol["eff"]
+        Area_req, Fin_Height = sol["Area_req"], sol["Fin_Height"]
+        extra = {"eta_fin": sol["eta_fin"], "eff": eff,
+                 "h_iterations": sol["iterations"], "h_status": sol["status"]}
+    else:
+        # === h 值 ===
+        h_value, h_conv, h_rad = calc_h_value_vec(p["Gap"])
+
+        # === 所需面積與鰭片高度 ===
+        eff = 0.90 if die_casting else 0.95
+        sized = (Total_Power > 0) & (Min_dT_Allowed > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Area_req = np.where(sized, 1 / (h_value * (Min_dT_Allowed / Total_Power) * eff), 0.0)
+            Fin_Height = np.where(sized, ((Area_req - base_area_m2) * 1e6) / (2 * num_fins_int * L_hsk), 0.0)
+
+    # === 體積與重量 ===
+    RRU_Height = p["H_shield"] + p["H_filter"] + p["t_base"] + Fin_Height
+    volume_raw = L_hsk * W_hsk * RRU_Height / 1e6
+    total_weight_kg = calc_weight_vec(p, L_hsk, W_hsk, num_fins_int, Fin_Height)['total_weight_kg']
+
+    # === Bottleneck Tj_Margin（只需計算瓶頸元件那一欄）===
+    Bottleneck_Tj_Margin = np.zeros(n_pts)
+    if has_bt.any():
+        j = np.where(has_bt, bt_idx, 0)
+        rows = np.arange(n_pts)
+        pick = lambda a: np.broadcast_to(a, (n_pts, len(comp['Qty'])))[rows, j]
+        T_amb = full(p['T_amb'])
+        T_hsk_base = T_amb + Min_dT_Allowed / p['Margin']
+        if Area_fixed_m2 is not None:
+            A_fix = full(Area_fixed_m2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                T_hsk_base = np.where(A_fix > 0, T_amb + Total_Power / (h_value * A_fix * eff), T_hsk_base)
+        T_hsk_eff = T_hsk_base + pick(comp['Height(mm)']) * p['Slope']
+        Tc = T_hsk_eff + P_bt * (pick(comp['R_int']) + pick(comp['R_TIM']))
+        Tj = Tc + P_bt * pick(comp['R_jc'])
+        T_ref = np.where(comp['tc_limited'][j], Tc, Tj)
+        margin = pick(comp['Limit(C)']) - T_ref
+        if margin_decimals is not None:
+            margin = np.round(margin, margin_decimals)
+        Bottleneck_Tj_Margin = np.where(has_bt, margin, 0.0)
+
+    return {
+        "Total_Power": Total_Power,
+        "Min_dT_Allowed": Min_dT_Allowed,
+        "Bottleneck_Index": np.where(has_bt, bt_idx, -1),
+        "Area_req": full(Area_req),
+        "Fin_Height": full(Fin_Height),
+        "Volume_L": full(volume_raw),
+        "total_weight_kg": full(total_weight_kg),
+        "h_value": full(h_value),
+        "Bottleneck_Tj_Margin": Bottleneck_Tj_Margin,
+        "Fin_Count": np.broadcast_to(num_fins_int, (n_pts,)).copy(),
+        **extra,
+    }
+
+
+def compute_key_results_batch(global_params, df_components, design=None, power_scale=None, Area_fixed_m2=None,
+                              h_model="constant", h_solver=None):
+    """
+    批次版 compute_key_results：一次計算多個設計點
+    design: 每列一個設計點、每欄一個全域參數 (DataFrame 或 {key: array})，未列出的參數沿用 global_params
+    power_scale: 每點的功耗縮放係數 (scalar 或 array)，等同 _sa_calc 的 power_scale
+    Area_fixed_m2: Fixed-Design 基準面積 (scalar 或 array)
+    h_model: "constant"（預設，同 compute_key_results）或 "dynamic"（h(FH) + η_fin 迭代，h_solver 傳給求解器）
+    回傳 {key: ndarray}；Bottleneck_Index 為元件列位置（-1 代表 "None"）。
+    元件熱阻以 (designs × components) 廣播計算，結果與逐點呼叫 compute_key_results 相同。
+    """
+    cols, n_pts = _design_columns(design)
+    n_pts, power_scale, Area_fixed_m2 = _n_points(n_pts, power_scale, Area_fixed_m2)
+
+    # 每個參數為 scalar 或 (n_pts,) 陣列
+    p = dict(global_params)
+    p.setdefault('Slope', 0.03)
+    p.update(cols)
+
+    if len(df_components):
+        c, tc_limited = component_arrays(df_components), tc_limited_mask(df_components)
+    else:
+        c = tc_limited = None
+    return _batch_from_arrays(p, n_pts, c, tc_limited, power_scale, Area_fixed_m2, h_model, h_solver)
+
+
+def _batch_from_arrays(p, n_pts, c, tc_limited, power_scale, Area_fixed_m2, h_model="constant", h_solver=None):
+    """compute_key_results_batch 核心：以元件欄位陣列 c（None 代表空表）計算，供共享記憶體 worker 直接使用"""
+    comp = {k: np.empty(0) for k in ('Qty', 'Height(mm)', 'R_jc', 'Limit(C)', 'R_int', 'R_TIM')}
+    power = allowed = None
+    if c is not None:
+        c = dict(c)
+        if power_scale is not None:
+            c['Power(W)'] = c['Power(W)'] * _col(power_scale)
+        g = {k: _col(p[k]) for k in KERNEL_PARAMS}
+        g['tim_props'] = build_tim_props(g)
+        k_out = thermal_kernel(c, g)
+        comp = {k: c[k] for k in ('Qty', 'Height(mm)', 'R_jc', 'Limit(C)')}
+        comp['R_int'], comp['R_TIM'] = k_out['R_int'], k_out['R_TIM']
+        comp['tc_limited'] = tc_limited
+        power, allowed = c['Power(W)'], k_out['Allowed_dT']
+    return _evaluate_designs(p, n_pts, comp, power, allowed, Area_fixed_m2, h_model, h_solver)
+
+
+class ThermalModel:
+    """
+    預編譯熱模型：建立時快取與掃描變數無關的元件項（R_int、R_TIM、總熱阻、高度溫升），
+    之後評估新的 T_amb / 功耗縮放 / Gap / Fin_t / 機構尺寸時只重算相依項：
+    Allowed_dT = Limit - (P × scale) × R_total - (T_amb + Height × Slope)。
+    結果與 compute_key_results（及 compute_key_results_batch）逐點相同。
+    """
+
+    # 不影響元件熱阻、可在 evaluate 時覆寫的參數（T_amb 只平移 Allowed_dT）
+    SCAN_PARAMS_EXCLUDED = frozenset(KERNEL_PARAMS) - {'T_amb'}
+
+    def __init__(self, global_params, df_components):
+        if len(df_components):
+            self._build(global_params, component_arrays(df_components), tc_limited_mask(df_components))
+        else:
+            self._build(global_params, None, None)
+
+    @classmethod
+    def from_arrays(cls, global_params, c, tc_limited):
+        """由元件欄位陣列（component_arrays 格式，None 代表空表）建立，不經過 DataFrame"""
+        model = cls.__new__(cls)
+        model._build(global_params, c, tc_limited)
+        return model
+
+    def _build(self, global_params, c, tc_limited):
+        p = dict(global_params)
+        p.setdefault('Slope', 0.03)
+        self.params = p
+        self._c, self._content_key = c, None
+        self.names = c['Component'] if c is not None else np.empty(0, dtype=object)
+        self.comp = {k: np.empty(0) for k in ('Qty', 'Height(mm)', 'R_jc', 'Limit(C)', 'R_int', 'R_TIM')}
+        self.power = np.empty(0)
+        if c is not None:
+            g = dict(p)
+            g['tim_props'] = build_tim_props(p)
+            k_out = thermal_kernel(c, g)
+            self.comp = {k: c[k] for k in ('Qty', 'Height(mm)', 'R_jc', 'Limit(C)')}
+            self.comp['R_int'], self.comp['R_TIM'] = k_out['R_int'], k_out['R_TIM']
+            self.comp['tc_limited'] = tc_limited
+            self.power = c['Power(W)']
+            self.r_total = c['R_jc'] + k_out['R_int'] + k_out['R_TIM']
+            self.h_slope = c['Height(mm)'] * p['Slope']
+
+    @property
+    def content_key(self):
+        """模型內容雜湊（全域參數 + 元件欄位），供 ResultCache 使用"""
+        if self._content_key is None:
+            h = hashlib.sha256(content_hash(self.params).encode("ascii"))
+            if self._c is not None:
+                for k in sorted(self._c):
+                    v = self._c[k]
+                    h.update(k.encode("utf-8"))
+                    if v.dtype == object:
+                        h.update(json.dumps([_canonical(x) for x in v], ensure_ascii=False).encode("utf-8"))
+                    else:
+                        h.update(np.ascontiguousarray(v, dtype=float).tobytes())
+                h.update(np.asarray(self.comp['tc_limited'], dtype=bool).tobytes())
+            self._content_key = h.hexdigest()
+        return self._content_key
+
+    def evaluate(self, design=None, power_scale=None, Area_fixed_m2=None, h_model="constant", h_solver=None):
+        """評估一或多個設計點；參數意義同 compute_key_results_batch"""
+        cols, n_pts = _design_columns(design)
+        rebuild = self.SCAN_PARAMS_EXCLUDED.intersection(cols)
+        if rebuild:
+            raise ValueError(f"{sorted(rebuild)} 會改變元件熱阻，請重新建立 ThermalModel 或改用 compute_key_results_batch")
+        n_pts, power_scale, Area_fixed_m2 = _n_points(n_pts, power_scale, Area_fixed_m2)
+        p = dict(self.params)
+        p.update(cols)
+
+        power = allowed = None
+        if len(self.power):
+            power = self.power if power_scale is None else self.power * _col(power_scale)
+            drop = power * self.r_total
+            allowed = self.comp['Limit(C)'] - drop - (_col(p['T_amb']) + self.h_slope)
+        return _evaluate_designs(p, n_pts, self.comp, power, allowed, Area_fixed_m2, h_model, h_solver)
+
+    def analytic_sweep(self, var, lo, hi, Area_fixed_m2=None):
+        """
+        T_amb / power_scale 掃描的解析解（不取樣）：
+        各元件 Allowed_dT 在掃描變數上為直線，瓶頸 = 直線族的下包絡線（clip 至 0 後取最小 index），
+        以 O(N log N) 求出全區間的瓶頸切換點，回傳 AnalyticSweep。
+        """
+        if var not in ANALYTIC_SWEEP_VARS:
+            raise ValueError(f"analytic_sweep 僅支援 {ANALYTIC_SWEEP_VARS}，收到 {var!r}")
+        lo, hi = float(lo), float(hi)
+        if not lo <= hi:
+            raise ValueError("掃描範圍需滿足 lo <= hi")
+        if var == "power_scale" and lo <= 0:
+            raise ValueError("power_scale 解析掃描需 lo > 0（功耗為 0 時無瓶頸元件）")
+
+        # Allowed_dT_i(x) = c_i + m_i · x
+        if len(self.power):
+            if var == "T_amb":
+                c = self.comp['Limit(C)'] - self.power * self.r_total - self.h_slope
+                m = np.full(len(self.power), -1.0)
+            else:
+                c = self.comp['Limit(C)'] - (self.params['T_amb'] + self.h_slope)
+                m = -(self.power * self.r_total)
+            valid = (self.comp['Qty'] * self.power > 0) & ~np.isnan(c) & ~np.isnan(m)
+        else:
+            c = m = np.empty(0)
+            valid = np.zeros(0, dtype=bool)
+        if (m[valid] > 0).any():
+            raise ValueError("元件功耗或熱阻為負值，Allowed_dT 非遞減，無法使用解析掃描")
+        return AnalyticSweep(self, var, lo, hi, c, m, np.flatnonzero(valid), Area_fixed_m2)
+
+    def bottleneck_names(self, idx):
+        """Bottleneck_Index → 元件名稱（-1 為 "None"）"""
+        idx = np.asarray(idx)
+        names = np.full(idx.shape, "None", dtype=object)
+        ok = idx >= 0
+        names[ok] = self.names[idx[ok]]
+        return names
+
+    def result_at(self, res, i):
+        """取出第 i 個設計點，轉為 compute_key_results 相同格式的 dict"""
+        out = {k: v[i].item() for k, v in res.items() if k != 'Bottleneck_Index'}
+        out['Bottleneck_Name'] = self.bottleneck_names(res['Bottleneck_Index'][i])[()]
+        return out
+
+
+def calc_weight_vec(p, L_hsk, W_hsk, num_fins_int, Fin_Height):
+    """重量模型（散熱器 + Shield + Filter + Shielding + PCB），參數可為陣列"""
+    base_vol_cm3 = L_hsk * W_hsk * p["t_base"] / 1000
+    fins_vol_cm3 = num_fins_int * p["Fin_t"] * Fin_Height * L_hsk / 1000
+    hs_weight_kg = (base_vol_cm3 + fins_vol_cm3) * p["al_density"] / 1000
+
+    shield_outer_vol_cm3 = L_hsk * W_hsk * p["H_shield"] / 1000
+    shield_inner_vol_cm3 = p["L_pcb"] * p["W_pcb"] * p["H_shield"] / 1000
+    shield_vol_cm3 = np.maximum(shield_outer_vol_cm3 - shield_inner_vol_cm3, 0)
+    shield_weight_kg = shield_vol_cm3 * p["al_density"] / 1000
+
+    filter_vol_cm3 = L_hsk * W_hsk * p["H_filter"] / 1000
+    filter_weight_kg = filter_vol_cm3 * p["filter_density"] / 1000
+
+    shielding_height_cm = 1.2
+    shielding_area_cm2 = p["L_pcb"] * p["W_pcb"] / 100
+    shielding_vol_cm3 = shielding_area_cm2 * shielding_height_cm
+    shielding_weight_kg = shielding_vol_cm3 * p["shielding_density"] / 1000
+
+    pcb_area_cm2 = p["L_pcb"] * p["W_pcb"] / 100
+    pcb_weight_kg = pcb_area_cm2 * p["pcb_surface_density"] / 1000
+
+    cavity_weight_kg = filter_weight_kg + shield_weight_kg + shielding_weight_kg + pcb_weight_kg
+    total_weight_kg = hs_weight_kg + cavity_weight_kg
+    return {
+        "hs_weight_kg": hs_weight_kg, "shield_weight_kg": shield_weight_kg,
+        "filter_weight_kg": filter_weight_kg, "shielding_weight_kg": shielding_weight_kg,
+        "pcb_weight_kg": pcb_weight_kg, "total_weight_kg": total_weight_kg,
+    }
+
+
+# ==================================================
+# DRC 設計規則（與主頁 [DRC] 區塊相同順序，回傳第一個違反的規則）
+# ==================================================
+DRC_RULES = {
+    0: "Pass",
+    1: "Choked Flow (AR > 12)",
+    2: "Poor Convection (h_conv < 4)",
+    3: "Gap Too Small (< 4mm)",
+    4: "Embedded FH > 100mm",
+    5: "Die-casting Fin_t < 3mm",
+    6: "Die-casting FH/Fin_t > 30",
+}
+DRC_AR_MAX = 12.0
+DRC_H_CONV_MIN = 4.0
+DRC_GAP_MIN = 4.0
+DRC_EMBED_FH_MAX = 100.0
+DRC_DC_FIN_T_MIN = 3.0
+DRC_DC_RATIO_MAX = 30.0
+DRC_DC_RATIO_WARN = 25.0
+
+
+def drc_check_vec(fin_tech, Gap, Fin_t, Fin_Height):
+    """向量化 DRC：回傳規則代碼陣列（0 = 通過，其餘見 DRC_RULES），參數可為陣列（fin_tech 可為字串或字串陣列）"""
+    Gap, Fin_t, FH = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (Gap, Fin_t, Fin_Height)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_ratio = np.where((Gap > 0) & (FH > 0), FH / Gap, 0.0)
+        fin_ratio = np.where(Fin_t > 0, FH / Fin_t, np.inf)
+    h_conv = calc_h_value_vec(Gap)[1]
+    if isinstance(fin_tech, str):
+        embedded = "Embedded" in fin_tech
+        die_casting = not embedded and "Die-casting" in fin_tech
+    else:
+        # 每個設計點各自的製程（如多專案批次）
+        embedded = np.array(["Embedded" in t for t in fin_tech], dtype=bool)
+        die_casting = ~embedded & np.array(["Die-casting" in t for t in fin_tech], dtype=bool)
+    conditions = [
+        aspect_ratio > DRC_AR_MAX,
+        h_conv < DRC_H_CONV_MIN,
+        Gap < DRC_GAP_MIN,
+        embedded & (FH > DRC_EMBED_FH_MAX),
+        die_casting & (Fin_t < DRC_DC_FIN_T_MIN),
+        die_casting & (fin_ratio > DRC_DC_RATIO_MAX),
+    ]
+    return np.select(conditions, np.arange(1, len(conditions) + 1), 0).astype(np.int8)
+
+
+def drc_check(fin_tech, Gap, Fin_t, Fin_Height):
+    """
+    單點 DRC（主頁 [DRC] 區塊）：回傳 dict
+    drc_failed / drc_msg（第一個違反規則的說明）/ drc_warn_msg（壓鑄高厚比接近上限）/ aspect_ratio
+    """
+    drc_failed = False
+    drc_msg = ""
+    drc_warn_msg = ""
+
+    # 計算流阻比 (Aspect Ratio)
+    if Gap > 0 and Fin_Height > 0:
+        aspect_ratio = Fin_Height / Gap
+    else:
+        aspect_ratio = 0
+    h_conv = calc_h_value(Gap)[1]
+
+    if aspect_ratio > DRC_AR_MAX:
+        drc_failed = True
+        drc_msg = f"⛔ **設計無效 (Choked Flow)：** 流阻比 (高/寬) 達 {aspect_ratio:.1f} (上限 12)。\n鰭片太深且太密，空氣滯留無法流動，請降低高度或增大間距。"
+    elif h_conv < DRC_H_CONV_MIN:
+        drc_failed = True
+        drc_msg = f"⛔ **設計無效 (Step 3 - Poor Convection)：** 有效對流係數 h_conv 僅 {h_conv:.2f} (目標 >= 4.0)。\nGap 過小導致風阻過大，散熱效率極低。請增大 Air Gap。"
+    elif Gap < DRC_GAP_MIN:
+        drc_failed = True
+        drc_msg = f"⛔ **設計無效 (Gap Too Small)：** 鰭片間距 {Gap}mm 小於物理極限 (4mm)。\n邊界層完全重疊，自然對流失效。"
+    elif "Embedded" in fin_tech and Fin_Height > DRC_EMBED_FH_MAX:
+        drc_failed = True
+        drc_msg = f"⛔ **製程限制 (Process Limit)：** Embedded Fin (埋入式鰭片) 製程高度限制需 < 100mm (目前計算值: {Fin_Height:.1f}mm)。\n此高度已超過製程極限，建議增加設備的X/Y方向面積來讓Z方向面積增加。"
+    elif "Die-casting" in fin_tech:
+        _fin_ratio = Fin_Height / Fin_t if Fin_t > 0 else float('inf')
+        if Fin_t < DRC_DC_FIN_T_MIN:
+            drc_failed = True
+            drc_msg = (f"⛔ **製程限制 (Fin_t Too Thin)：** 壓鑄鰭片平均厚度 {Fin_t}mm < 最小值 3.0mm。\n"
+                       f"壓鑄錐形鰭片平均厚度需 ≥ 3.0mm（參考：Huawei RRU 量測值，頭部 1.5mm / 根部 4.5mm，均值 3.0mm）。")
+        elif _fin_ratio > DRC_DC_RATIO_MAX:
+            drc_failed = True
+            drc_msg = (f"⛔ **製程限制 (Fin Height/Thickness Ratio)：** 壓鑄鰭片高厚比 {_fin_ratio:.1f} > 30 (上限)。\n"
+                       f"(Fin_Height={Fin_Height:.1f}mm ÷ Fin_t={Fin_t}mm)\n"
+                       f"金屬液無法在凝固前完整充填鰭片腔體，將導致缺料或成型不良。請增加 Fin_t 或降低 Fin_Height。\n"
+                       f"參考案例：Huawei RRU H=80mm / Fin_t=3.0mm → 高厚比 26.7 ✓")
+        elif _fin_ratio > DRC_DC_RATIO_WARN:
+            drc_warn_msg = (f"⚠️ **壓鑄製程警告 (Near Limit)：** 鰭片高厚比 {_fin_ratio:.1f}（介於 25～30，接近製程上限）。\n"
+                            f"(Fin_Height={Fin_Height:.1f}mm ÷ Fin_t={Fin_t}mm)　建議與壓鑄廠確認充填可行性。")
+
+    return {"drc_failed": drc_failed, "drc_msg": drc_msg, "drc_warn_msg": drc_warn_msg, "aspect_ratio": aspect_ratio}
+
+
+# ==================================================
+# 動態 h(FH) + η_fin 修正（SPEC: Dynamic h_dynamic η_fin correction）
+# ==================================================
+FH_REF = 70.0              # h 校準參考點 [mm]
+ALPHA_H = 0.20             # h 對 FH 衰減指數
+ETA_PROCESS_EMBED = 1.06   # Embedded 製程整體校準（CFD 再校準）
+ETA_PROCESS_DC = 0.99      # Die-casting（推算值，暫用）
+K_FIN_EMBED = 200.0        # 純鋁熱導 [W/m·K]
+K_FIN_DC = 160.0           # ADC12 熱導 [W/m·K]
+FH_TOL = 0.05              # 收斂判斷 |FH_new - FH_prev| [mm]（與 index.html 相同）
+FH_MAX_ITER = 15
+
+H_MODELS = ("constant", "dynamic")
+
+# 動態 h 求解狀態（solve_fin_height_dynamic 的 status / _size_designs 的 h_status）
+H_STATUS = {
+    0: "Converged",
+    1: "Not converged (max_iter)",
+    2: "Not iterated / invalid",
+}
+H_STATUS_CONVERGED = 0
+H_STATUS_MAX_ITER = 1
+H_STATUS_SKIPPED = 2   # TP 或 MDA ≤ 0 未進入迭代，或迭代中 FH ≤ 0 / 非有限值：結果確定，可快取
+
+
+def calc_h_value_dynamic(Gap, FH_mm):
+    """FH 相依的 h：h_conv × (FH_REF / max(FH, 20))^ALPHA_H；FH 未給或 ≤ 0 時以 FH_REF 計（= 常數模型）"""
+    Gap = np.asarray(Gap, dtype=float)
+    FH = np.asarray(FH_mm, dtype=float)
+    FH = np.where(FH > 0, FH, FH_REF)
+    fh_factor = (FH_REF / np.maximum(FH, 20.0)) ** ALPHA_H
+    h_conv = 6.4 * np.tanh(Gap / 7.0) * fh_factor
+    with np.errstate(invalid='ignore'):
+        h_rad = 2.4 * np.where(Gap >= 10.0, 1.0, np.sqrt(Gap / 10.0))
+    return h_conv + h_rad, h_conv, h_rad
+
+
+def calc_eta_fin(FH_mm, t_fin_mm, h_value, k_fin):
+    """直鰭片效率 tanh(mLc)/mLc，Lc = FH + t/2（角端修正）；輸入非正值時回傳 1.0"""
+    FH, t, h = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (FH_mm, t_fin_mm, h_value)))
+    ok = (FH > 0) & (t > 0) & (h > 0) & (k_fin > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.sqrt(2 * h / (k_fin * (t / 1000)))
+        mLc = m * ((FH + t / 2) / 1000)
+        eta = np.tanh(mLc) / mLc
+    return np.where(ok & (mLc >= 1e-6), eta, 1.0)
+
+
+def solve_fin_height_dynamic(Total_Power, Min_dT_Allowed, Gap, Fin_t, L_hsk, base_area_m2, num_fins,
+                             die_casting=False, FH0=None, method="fixed_point", warm_start=False,
+                             tol=FH_TOL, max_iter=FH_MAX_ITER):
+    """
+    向量化 FH 反推：所有掃描點同時迭代，FH = (1/(h(FH)·(MDA/TP)·eff(FH)) - A_base)·1e6 / (2·nf·L)
+    method="fixed_point"：與 index.html 相同的阻尼不動點（0.5 混合，|ΔFH| < tol 收斂），起點 FH0（預設 FH_REF）
+    method="newton"：對 r(FH) = F(FH) - FH 做 Newton（差分導數），失敗時退回阻尼步；收斂更快、更緊
+    warm_start=True：先解每隔數點的子集，再以相鄰點解內插作為其餘點的起點（點需依掃描順序排列）
+    回傳 dict：Fin_Height, h_value, h_conv, h_rad, eta_fin, eff, Area_req, status（見 H_STATUS）, iterations
+    """
+    if method not in ("fixed_point", "newton"):
+        raise ValueError(f"未知的 method: {method!r}")
+    TP, MDA, Gap, Fin_t, L_hsk, bam, nf = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (Total_Power, Min_dT_Allowed, Gap, Fin_t, L_hsk, base_area_m2, num_fins)))
+    shape = TP.shape
+    k_fin = K_FIN_DC if die_casting else K_FIN_EMBED
+    eta_process = ETA_PROCESS_DC if die_casting else ETA_PROCESS_EMBED
+    denom = 2 * nf * L_hsk
+
+    def fh_map(FH_prev, a):
+        """單步映射：以 FH_prev 計算 h、η_fin、所需面積與新 FH"""
+        h, hc, hr = calc_h_value_dynamic(Gap[a], FH_prev)
+        eta = calc_eta_fin(FH_prev, Fin_t[a], h, k_fin)
+        eff = eta * eta_process
+        with np.errstate(divide='ignore', invalid='ignore'):
+            area = 1 / (h * (MDA[a] / TP[a]) * eff)
+            FH_new = np.where(denom[a] > 0, ((area - bam[a]) * 1e6) / denom[a], 0.0)
+        return FH_new, (h, hc, hr, eta, eff, area)
+
+    # 未進入迭代的點（TP 或 MDA ≤ 0）：h 取 FH_REF、η_fin = 1
+    h, hc, hr = (np.broadcast_to(v, shape).copy() for v in calc_h_value_dynamic(Gap, FH_REF))
+    eta = np.ones(shape)
+    eff = np.full(shape, eta_process)
+    area = np.zeros(shape)
+    FH = np.zeros(shape)
+    iterations = np.zeros(shape, dtype=np.int64)
+    FH_prev = np.broadcast_to(np.asarray(FH_REF if FH0 is None else FH0, dtype=float), shape).copy()
+    FH_prev = np.where(FH_prev > 0, FH_prev, FH_REF)
+    active = (TP > 0) & (MDA > 0)
+    status = np.where(active, H_STATUS_MAX_ITER, H_STATUS_SKIPPED).astype(np.int8)
+
+    if warm_start and active.sum() > 8:
+        # 粗解每隔 stride 點，再內插作為其餘點的起點
+        flat = np.flatnonzero(active.ravel())
+        stride = max(int(np.sqrt(len(flat))), 2)
+        coarse = np.zeros(active.size, dtype=bool)
+        coarse[flat[::stride]] = True
+        coarse[flat[-1]] = True
+        sub = solve_fin_height_dynamic(TP.ravel()[coarse], MDA.ravel()[coarse], Gap.ravel()[coarse],
+                                       Fin_t.ravel()[coarse], L_hsk.ravel()[coarse], bam.ravel()[coarse],
+                                       nf.ravel()[coarse], die_casting=die_casting,
+                                       FH0=FH_prev.ravel()[coarse], method=method, tol=tol, max_iter=max_iter)
+        good = sub['Fin_Height'] > 0
+        if good.any():
+            pos = np.flatnonzero(coarse)[good]
+            guess = np.interp(np.arange(active.size), pos, sub['Fin_Height'][good])
+            FH_prev = np.where(active, guess.reshape(shape), FH_prev)
+        # 遙測：粗解點的迭代次數一併計入
+        iterations.ravel()[coarse] += sub['iterations']
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        a = np.nonzero(active)
+        fp = FH_prev[a]
+        FH_new, (h_a, hc_a, hr_a, eta_a, eff_a, area_a) = fh_map(fp, a)
+        h[a], hc[a], hr[a], eta[a], eff[a], area[a] = h_a, hc_a, hr_a, eta_a, eff_a, area_a
+        iterations[a] += 1
+
+        invalid = ~np.isfinite(FH_new) | (FH_new <= 0)
+        done = ~invalid & (np.abs(FH_new - fp) < tol)
+        if method == "newton":
+            # r(FH) = F(FH) - FH；導數以前向差分估計
+            step_h = 1e-4 * np.maximum(fp, 1.0)
+            FH_pert, _ = fh_map(fp + step_h, a)
+            slope = (FH_pert - FH_new) / step_h - 1.0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                nxt = fp - (FH_new - fp) / slope
+            damped = 0.5 * fp + 0.5 * FH_new
+            nxt = np.where(np.isfinite(nxt) & (nxt > 0), nxt, damped)
+        else:
+            nxt = 0.5 * fp + 0.5 * FH_new
+
+        FH[a] = np.where(invalid, 0.0, FH_new)
+        status[a] = np.where(done, H_STATUS_CONVERGED, np.where(invalid, H_STATUS_SKIPPED, H_STATUS_MAX_ITER))
+        FH_prev[a] = nxt
+        still = ~(invalid | done)
+        active[a] = still
+
+    return {
+        "Fin_Height": FH, "h_value": h, "h_conv": hc, "h_rad": hr,
+        "eta_fin": eta, "eff": eff, "Area_req": area,
+        "status": status, "iterations": iterations,
+    }
+
+
+# ==================================================
+# 解析掃描 (T_amb / Power Scale)
+# ==================================================
+ANALYTIC_SWEEP_VARS = ("T_amb", "power_scale")
+
+
+def lower_envelope(c, m, idx, lo, hi):
+    """
+    直線族 y_i = c_i + m_i·x 在 [lo, hi] 的下包絡線（convex hull trick）
+    回傳 (starts, ends, line)：每段區間與該段最小的直線 index；同一直線重複時取最小 index。
+    """
+    if len(idx) == 0:
+        return np.array([lo]), np.array([hi]), np.array([-1])
+    # 預先剔除在 [lo, hi] 上被兩端最小直線完全壓制者（直線在兩端都不低於某直線 ⇒ 全區間不低於）
+    y_lo, y_hi = c[idx] + m[idx] * lo, c[idx] + m[idx] * hi
+    a, b = np.argmin(y_lo), np.argmin(y_hi)
+    idx = idx[(y_lo <= y_lo[b]) & (y_hi <= y_hi[a])]
+    # 斜率遞減排序（x 越大，斜率越小的直線越可能成為最小）；同斜率取截距小、再取 index 小
+    order = idx[np.lexsort((idx, c[idx], -m[idx]))]
+    first = np.concatenate([[True], m[order][1:] != m[order][:-1]])
+    hull = []
+    for i in order[first]:
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            # i 與 a 的交點若不晚於 b 與 a 的交點，b 永遠不會是最小
+            if (c[i] - c[a]) * (m[a] - m[b]) <= (c[b] - c[a]) * (m[a] - m[i]):
+                hull.pop()
+            else:
+                break
+        hull.append(i)
+    hull = np.array(hull)
+    cross = (c[hull[1:]] - c[hull[:-1]]) / (m[hull[:-1]] - m[hull[1:]])
+    starts = np.concatenate([[-np.inf], cross])
+    ends = np.concatenate([cross, [np.inf]])
+    keep = (ends > lo) & (starts < hi)
+    starts, ends, hull = np.clip(starts[keep], lo, hi), np.clip(ends[keep], lo, hi), hull[keep]
+    if len(hull) == 0:
+        # 區間落在兩段交點上（lo == hi）
+        k = int(np.argmin(c[idx] + m[idx] * lo))
+        return np.array([lo]), np.array([hi]), np.array([idx[k]])
+    return starts, ends, hull
+
+
+class AnalyticSweep:
+    """
+    ThermalModel.analytic_sweep 的結果：整個掃描區間的分段精確解
+    segments: 每段 [x_start, x_end] 的瓶頸元件；clipped=True 表示 Allowed_dT 已被 clip 至 0
+    （此時依 argmin 取最小 index，與 compute_key_results 相同）。
+    """
+
+    def __init__(self, model, var, lo, hi, c, m, valid_idx, Area_fixed_m2=None):
+        self.model, self.var, self.lo, self.hi = model, var, lo, hi
+        self.Area_fixed_m2 = Area_fixed_m2
+        self._c, self._m = c, m
+        starts, ends, lines = lower_envelope(c, m, valid_idx, lo, hi)
+        if lines[0] < 0:
+            # 無發熱元件：全區間無瓶頸
+            self.seg_start, self.seg_end = np.array([lo]), np.array([hi])
+            self.seg_bottleneck, self.seg_clipped = np.array([-1]), np.array([False])
+            return
+
+        # 下包絡線（各斜率 ≤ 0，遞減）第一次 ≤ 0 的位置 → 之後進入 clip 區
+        x0 = np.inf
+        for xa, xb, j in zip(starts, ends, lines):
+            if j < 0:
+                break
+            if c[j] + m[j] * xa <= 0:
+                x0 = xa
+                break
+            if m[j] < 0 and -c[j] / m[j] <= xb:
+                x0 = -c[j] / m[j]
+                break
+
+        seg_start, seg_end, seg_line, seg_clip = [], [], [], []
+        for xa, xb, j in zip(starts, ends, lines):
+            if xa >= x0:
+                break
+            seg_start.append(xa); seg_end.append(min(xb, x0)); seg_line.append(j); seg_clip.append(False)
+        if x0 <= hi:
+            # clip 區：瓶頸 = Allowed_dT ≤ 0 的元件中 index 最小者；各元件的 0 點依序加入
+            with np.errstate(divide='ignore', invalid='ignore'):
+                roots = np.where(m[valid_idx] < 0, -c[valid_idx] / m[valid_idx],
+                                 np.where(c[valid_idx] <= 0, -np.inf, np.inf))
+            order = np.lexsort((valid_idx, roots))
+            roots, cand = roots[order], valid_idx[order]
+            cand = cand[roots <= hi]
+            roots = np.maximum(roots[:len(cand)], x0)
+            best = np.minimum.accumulate(cand)
+            # 同一位置加入多個元件時取最後（最小）值；best 改變處即為瓶頸切換點
+            last = np.concatenate([roots[1:] != roots[:-1], [True]])
+            roots, best = roots[last], best[last]
+            change = np.concatenate([[True], best[1:] != best[:-1]])
+            roots, best = roots[change], best[change]
+            seg_start.extend(roots)
+            seg_end.extend(np.append(roots[1:], hi))
+            seg_line.extend(best)
+            seg_clip.extend([True] * len(best))
+
+        self.seg_start = np.array(seg_start, dtype=float)
+        self.seg_end = np.array(seg_end, dtype=float)
+        self.seg_bottleneck = np.array(seg_line, dtype=np.int64)
+        self.seg_clipped = np.array(seg_clip, dtype=bool)
+
+    @property
+    def segments(self):
+        """分段表：x_start / x_end / bottleneck_index / bottleneck_name / clipped"""
+        return _pd().DataFrame({
+            "x_start": self.seg_start, "x_end": self.seg_end,
+            "bottleneck_index": self.seg_bottleneck,
+            "bottleneck_name": self.model.bottleneck_names(self.seg_bottleneck),
+            "clipped": self.seg_clipped,
+        })
+
+    def switches(self):
+        """瓶頸元件切換點：[(x, 前一個瓶頸名稱, 新瓶頸名稱), ...]"""
+        names = self.model.bottleneck_names(self.seg_bottleneck)
+        return [(self.seg_start[k], names[k - 1], names[k])
+                for k in range(1, len(names)) if self.seg_bottleneck[k] != self.seg_bottleneck[k - 1]]
+
+    def evaluate(self, x, margin_decimals=1):
+        """在任意 x（須在 [lo, hi] 內）計算精確結果，格式同 ThermalModel.evaluate"""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        if ((x < self.lo) | (x > self.hi)).any():
+            raise ValueError(f"x 超出解析掃描範圍 [{self.lo}, {self.hi}]")
+        seg = np.clip(np.searchsorted(self.seg_start, x, side='right') - 1, 0, len(self.seg_start) - 1)
+        return self._evaluate_segments(x, seg, margin_decimals)
+
+    def vertices(self):
+        """
+        Tj_Margin（未四捨五入）在各段端點的值；每段內 Tj_Margin 對 x 為線性，
+        依序連接即為整條精確曲線（瓶頸切換處左右各一點，可呈現跳階）。
+        """
+        seg = np.repeat(np.arange(len(self.seg_start)), 2)
+        x = np.column_stack([self.seg_start, self.seg_end]).ravel()
+        res = self._evaluate_segments(x, seg, margin_decimals=None)
+        return x, res["Bottleneck_Tj_Margin"], self.seg_bottleneck[seg]
+
+    def _evaluate_segments(self, x, seg, margin_decimals):
+        model = self.model
+        n_pts = len(x)
+        j = self.seg_bottleneck[seg]
+        has_bt = j >= 0
+        j = np.where(has_bt, j, 0)
+        p = dict(model.params)
+        scale = x if self.var == "power_scale" else 1.0
+        if self.var == "T_amb":
+            p['T_amb'] = x
+        if len(model.power):
+            Total_Power = np.nansum(model.power * model.comp['Qty']) * scale * p['Margin']
+            P_bt = model.power[j] * scale
+            Min_dT_Allowed = np.where(self.seg_clipped[seg], 0.0, self._c[j] + self._m[j] * x)
+            Min_dT_Allowed = np.where(has_bt, Min_dT_Allowed, 50.0)
+        else:
+            Total_Power, P_bt, Min_dT_Allowed = np.zeros(n_pts), np.zeros(n_pts), np.full(n_pts, 50.0)
+        return _size_designs(p, n_pts, model.comp, Total_Power, Min_dT_Allowed, j, has_bt, P_bt,
+                             self.Area_fixed_m2, margin_decimals=margin_decimals)
+
+
+# ==================================================
+# 結果快取 (content-addressed LRU)
+# ==================================================
+def _canonical(v):
+    """參數值正規化：數值一律轉 float（45 與 45.0 視為相同），其餘轉字串"""
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return float(v)
+    if isinstance(v, dict):
+        return {str(k): _canonical(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple, np.ndarray)):
+        return [_canonical(x) for x in v]
+    return str(v)
+
+
+def content_hash(global_params=None, df_components=None, Area_fixed_m2=None, **extra):
+    """
+    (全域參數, 元件表, Area_fixed_m2, 其他) 的穩定內容雜湊（sha256 hex）
+    與 dict 鍵順序、DataFrame 欄位順序與 index 無關；內容相同即得相同雜湊
+    """
+    h = hashlib.sha256()
+    head = {"params": _canonical(dict(global_params or {})),
+            "area": None if Area_fixed_m2 is None else _canonical(Area_fixed_m2),
+            "extra": _canonical(extra)}
+    h.update(json.dumps(head, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    if df_components is not None:
+        cols = sorted(map(str, df_components.columns))
+        h.update(json.dumps(cols, ensure_ascii=False).encode("utf-8"))
+        if len(df_components):
+            df = df_components.copy()
+            df.columns = df.columns.map(str)
+            h.update(_pd().util.hash_pandas_object(df[cols], index=False).values.tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    有上限的 LRU 結果快取：key 為內容雜湊，value 為單點結果 dict
+    version 改變時（set_version）整個清空，避免引擎更新後沿用舊結果
+    """
+
+    def __init__(self, max_size=4096, version=None):
+        self.max_size = int(max_size)
+        self.version = version
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def set_version(self, version):
+        """引擎版本變更時清空快取；回傳是否有清空"""
+        with self._lock:
+            if version == self.version:
+                return False
+            self.version = version
+            self._data.clear()
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def get(self, key):
+        """查詢並更新 LRU 順序；未命中回傳 None"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = dict(value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        """命中統計"""
+        total = self.hits + self.misses
+        return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "version": self.version}
+
+    def memoize(self, fn):
+        """包裝 compute_key_results(global_params, df_components, Area_fixed_m2=None)"""
+        @functools.wraps(fn)
+        def wrapper(global_params, df_components, Area_fixed_m2=None):
+            key = content_hash(global_params, df_components, Area_fixed_m2, fn=fn.__qualname__)
+            res = self.get(key)
+            if res is None:
+                res = fn(global_params, df_components, Area_fixed_m2=Area_fixed_m2)
+                self.put(key, res)
+            return res
+        wrapper.cache = self
+        return wrapper
+
+    def evaluate(self, model, design=None, power_scale=None, Area_fixed_m2=None, h_model="constant", h_solver=None):
+        """
+        ThermalModel.evaluate 的逐點快取版：每個設計點各自以 (模型內容, 點參數) 為 key，
+        只將未命中的點合併成一次批次計算；重疊的掃描點因此免重算
+        快取值須與同批有哪些點無關：h_solver 不接受 warm_start（以相鄰點解為起點），傳入時 raise ValueError，
+        動態 h 達迭代上限仍未收斂（h_status=H_STATUS_MAX_ITER）的點不寫入快取，每次重算並保留標記；
+        未迭代 / 無效的點（H_STATUS_SKIPPED）結果確定，照常快取
+        """
+        if h_solver and h_solver.get("warm_start"):
+            raise ValueError("逐點快取不支援 warm_start（結果會隨同批點而變）；請改用 ThermalModel.evaluate")
+        h_solver = {k: v for k, v in (h_solver or {}).items() if k != "warm_start"} or None
+        cols, n_pts = _design_columns(design)
+        n_pts, power_scale, Area_fixed_m2 = _n_points(n_pts, power_scale, Area_fixed_m2)
+        full = lambda v: None if v is None else np.broadcast_to(v, (n_pts,))
+        cols = {k: full(v) for k, v in cols.items()}
+        power_scale, Area_fixed_m2 = full(power_scale), full(Area_fixed_m2)
+        base = model.content_key
+        keys = [content_hash(extra={"model": base, "h_model": h_model, "h_solver": h_solver,
+                                    "point": {k: v[i] for k, v in cols.items()},
+                                    "power_scale": None if power_scale is None else power_scale[i],
+                                    "area": None if Area_fixed_m2 is None else Area_fixed_m2[i]})
+                for i in range(n_pts)]
+        rows = [self.get(k) for k in keys]
+        miss = [i for i, r in enumerate(rows) if r is None]
+        if miss:
+            sub = model.evaluate({k: v[miss] for k, v in cols.items()} or None,
+                                 power_scale=None if power_scale is None else power_scale[miss],
+                                 Area_fixed_m2=None if Area_fixed_m2 is None else Area_fixed_m2[miss],
+                                 h_model=h_model, h_solver=h_solver)
+            for j, i in enumerate(miss):
+                rows[i] = {k: v[j] for k, v in sub.items()}
+                if rows[i].get("h_status", H_STATUS_CONVERGED) != H_STATUS_MAX_ITER:
+                    self.put(keys[i], rows[i])
+        return {k: np.array([r[k] for r in rows]) for k in rows[0]} if rows else {}